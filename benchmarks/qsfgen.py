@@ -0,0 +1,86 @@
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict
+import copy
+import json
+import random
+
+__all__ = ['generate_qsf', 'DEFAULT_MIX', 'QUESTION_TYPES']
+
+TEMPLATE_PATH = Path(__file__).parent.parent / 'test' / 'test_data' / 'test_data.qsf'
+
+QUESTION_TYPES = ('MC', 'Matrix', 'SBS', 'RO', 'Slider', 'TE')
+DEFAULT_MIX = {'MC': 4, 'Matrix': 3, 'SBS': 1, 'RO': 1, 'Slider': 1, 'TE': 2}
+
+
+def _load_templates_(path):
+    with open(path, 'r', encoding='utf-8') as fh:
+        survey = json.load(fh, object_pairs_hook=OrderedDict)
+
+    templates = {key: [] for key in QUESTION_TYPES}
+    for element in survey['SurveyElements']:
+        if element['Element'] == 'SQ' and element['Payload']['QuestionType'] in templates:
+            templates[element['Payload']['QuestionType']].append(element)
+
+    return survey, templates
+
+
+def _suffix_tags_(tags, suffix):
+    # ChoiceDataExportTags is False when no custom tags exist, and a dict otherwise
+    return OrderedDict((key, f"{value}_{suffix}") for key, value in tags.items()) if tags else tags
+
+
+def _clone_question_(template, number):
+    question = copy.deepcopy(template)
+    qid = f"QID{number}"
+    payload = question['Payload']
+    payload['QuestionID'] = qid
+    payload['DataExportTag'] = f"{payload['DataExportTag']}_{number}"
+    payload['ChoiceDataExportTags'] = _suffix_tags_(payload.get('ChoiceDataExportTags'), number)
+    for column in payload.get('AdditionalQuestions', {}).values():
+        column['ChoiceDataExportTags'] = _suffix_tags_(column.get('ChoiceDataExportTags'), number)
+    question['PrimaryAttribute'] = qid
+
+    return question
+
+
+def generate_qsf(n_questions: int, mix: Dict[str, int] = None, seed=0, template_path=TEMPLATE_PATH) -> str:
+    """
+    generate_qsf(n_questions, mix=None, seed=0) -> str
+    Creates a synthetic QSF survey definition by cloning the questions of the test survey
+    :param n_questions: number of questions in the generated survey
+    :param mix: dict mapping question type (MC, Matrix, SBS, RO, Slider, TE) to its relative weight.
+    Default DEFAULT_MIX
+    :param seed: seed for the random selection of question types and templates. Default 0
+    :param template_path: path of the QSF whose questions are used as templates
+    :return: str containing the json QSF
+    """
+    mix = DEFAULT_MIX if mix is None else mix
+    unknown = set(mix) - set(QUESTION_TYPES)
+    if unknown:
+        raise ValueError(f"Unsupported question types in mix: {', '.join(sorted(unknown))}")
+
+    survey, templates = _load_templates_(template_path)
+    rng = random.Random(seed)
+    types = [key for key, weight in mix.items() if weight > 0]
+    weights = [mix[key] for key in types]
+
+    questions = [_clone_question_(rng.choice(templates[rng.choices(types, weights)[0]]), i)
+                 for i in range(1, n_questions + 1)]
+
+    block_id = 'BL_synthetic'
+    blocks = OrderedDict(SurveyID=survey['SurveyEntry']['SurveyID'], Element='BL', PrimaryAttribute='Survey Blocks',
+                         SecondaryAttribute=None, TertiaryAttribute=None,
+                         Payload=[OrderedDict(Type='Default', Description='Default Question Block', ID=block_id,
+                                              BlockElements=[OrderedDict(Type='Question',
+                                                                         QuestionID=q['Payload']['QuestionID'])
+                                                             for q in questions])])
+    flow = OrderedDict(SurveyID=survey['SurveyEntry']['SurveyID'], Element='FL', PrimaryAttribute='Survey Flow',
+                       SecondaryAttribute=None, TertiaryAttribute=None,
+                       Payload=OrderedDict(Flow=[OrderedDict(ID=block_id, Type='Block', FlowID='FL_2')],
+                                           Properties={'Count': 2}, FlowID='FL_1', Type='Root'))
+
+    others = [e for e in survey['SurveyElements'] if e['Element'] not in ('BL', 'FL', 'SQ')]
+    synthetic = OrderedDict(SurveyEntry=survey['SurveyEntry'], SurveyElements=[blocks, flow] + others + questions)
+
+    return json.dumps(synthetic)
@@ -0,0 +1,153 @@
+"""
+Benchmarks for survey decoding and SPSS syntax generation.
+
+Run from the repository root:
+    python -m benchmarks.run --questions 2000 --save       # record a local baseline
+    python -m benchmarks.run --questions 2000 --compare    # detect regressions against the baseline
+"""
+from benchmarks.qsfgen import generate_qsf, DEFAULT_MIX
+from collections import defaultdict
+from pathlib import Path
+from qsfdecode.jsondecode import Survey, translate_to_sps
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+BASELINE_PATH = Path(__file__).parent / 'baseline.json'
+
+
+def _best_of_(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _peak_memory_(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmarks(n_questions, mix=None, repeat=5, include_declarations=True):
+    """
+    run_benchmarks(n_questions, mix=None, repeat=5) -> dict
+    Times decoding, per-question-class code generation and end-to-end translation of a synthetic survey
+    :param n_questions: number of questions in the synthetic survey
+    :param mix: dict mapping question type to relative weight. See qsfgen.generate_qsf
+    :param repeat: number of times each timing is repeated. The best time is reported
+    :param include_declarations: whether generated syntax includes variable declarations. Default True
+    :return: dict mapping metric name to value. Times are in seconds and memory in bytes
+    """
+    data = generate_qsf(n_questions, mix)
+    kwargs = {'include_declarations': include_declarations}
+    results = {'bytes.qsf': len(data)}
+
+    results['time.decode'] = _best_of_(lambda: Survey.from_json(data), repeat)
+    results['memory.decode'] = _peak_memory_(lambda: Survey.from_json(data))
+
+    # Per-class timing of code generation, accumulated across every question of the class
+    questions = Survey.from_json(data).exported_questions()
+    by_class = defaultdict(list)
+    for q in questions:
+        by_class[type(q).__name__].append(q)
+
+    for name, members in sorted(by_class.items()):
+        def emit(qs=members):
+            for q in qs:
+                q.create_spss_code(**kwargs)
+        elapsed = _best_of_(emit, repeat)
+        results[f'time.create_spss_code.{name}'] = elapsed
+        results[f'time.create_spss_code.{name}.per_question'] = elapsed / len(members)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'out.sps'
+        results['time.translate_to_sps'] = _best_of_(lambda: translate_to_sps(data, path, **kwargs), repeat)
+        results['memory.translate_to_sps'] = _peak_memory_(lambda: translate_to_sps(data, path, **kwargs))
+        results['bytes.sps'] = os.path.getsize(path)
+
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    compare(results, baseline, tolerance) -> list[str]
+    Compares timing and memory metrics with a stored baseline
+    :param results: dict of metrics produced by run_benchmarks
+    :param baseline: dict of metrics previously produced by run_benchmarks
+    :param tolerance: fractional increase over the baseline above which a metric is considered a regression
+    :return: list of names of regressed metrics
+    """
+    regressions = []
+    for key, value in results.items():
+        old = baseline.get(key)
+        if old is None or key.startswith('bytes.') or old == 0:
+            continue
+        change = value / old - 1
+        flag = 'REGRESSION' if change > tolerance else ''
+        print(f"{key:<70} {old:>14.6g} {value:>14.6g} {change:>+8.1%} {flag}")
+        if flag:
+            regressions.append(key)
+
+    return regressions
+
+
+def _parse_mix_(text):
+    mix = {}
+    for item in text.split(','):
+        key, _, weight = item.partition('=')
+        mix[key.strip()] = int(weight)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=2000, help='number of questions in the synthetic survey')
+    parser.add_argument('--mix', type=_parse_mix_, default=DEFAULT_MIX,
+                        help='question type weights, e.g. MC=4,Matrix=3,SBS=1,RO=1,Slider=1,TE=2')
+    parser.add_argument('--repeat', type=int, default=5, help='repetitions per timing; the best is reported')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH, help='path of the baseline file')
+    parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--compare', action='store_true', help='compare the results with the stored baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='fractional slowdown tolerated before a metric is flagged. Default 0.2')
+    args = parser.parse_args(argv)
+
+    # BeautifulSoup warns about question text that resembles a file name, which is just noise here
+    warnings.filterwarnings('ignore')
+
+    results = run_benchmarks(args.questions, args.mix, args.repeat)
+    key = f"{args.questions}:{','.join(f'{k}={v}' for k, v in sorted(args.mix.items()))}"
+
+    stored = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    status = 0
+    if args.compare:
+        if key not in stored:
+            print(f"No baseline stored for {key}. Run with --save first.")
+            status = 2
+        else:
+            status = int(len(compare(results, stored[key], args.tolerance)) > 0)
+    else:
+        for name, value in results.items():
+            print(f"{name:<70} {value:>14.6g}")
+
+    if args.save:
+        stored[key] = results
+        args.baseline.write_text(json.dumps(stored, indent=2, sort_keys=True))
+        print(f"Baseline for {key} written to {args.baseline}")
+
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
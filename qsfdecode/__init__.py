@@ -1,4 +1,25 @@
-from qsfdecode.surveyexporter import SurveyExporter
-from qsfdecode.jsondecode import translate_to_sps
+import importlib
 
-__all__ = ['SurveyExporter', 'translate_to_sps']
\ No newline at end of file
+__all__ = ['SurveyExporter', 'translate_to_sps', 'translate_to_codebook', 'translate_to_syntax', 'Pipeline']
+
+# Names are imported from their modules on first access, so that a process which only translates local files does not
+# import requests, and one which only downloads surveys does not import BeautifulSoup
+_LAZY_ = {'SurveyExporter': 'qsfdecode.surveyexporter',
+          'translate_to_sps': 'qsfdecode.jsondecode',
+          'translate_to_codebook': 'qsfdecode.jsondecode',
+          'translate_to_syntax': 'qsfdecode.jsondecode',
+          'Pipeline': 'qsfdecode.pipeline'}
+
+
+def __getattr__(name):
+    module = _LAZY_.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -14,4 +14,15 @@ class ExportException(Exception):
 class JsonException(Exception):
 
     def __init__(self, msg):
-        super().__init__(msg)
\ No newline at end of file
+        super().__init__(msg)
+
+
+class TranslationException(Exception):
+
+    def __init__(self, msg, result):
+        super().__init__(msg)
+        self._result = result
+
+    @property
+    def result(self):
+        return self._result
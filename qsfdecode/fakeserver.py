@@ -0,0 +1,356 @@
+from .instrumentation import Stats
+from .scheduling import Priority, TokenBucket
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from typing import Dict, List, Mapping, Optional, Union
+from urllib.parse import parse_qs, urlsplit
+import json
+import random
+import re
+import threading
+import time
+
+__all__ = ['FakeQualtrics', 'LoadResult', 'load_test']
+
+_SURVEY_DEFINITION_RE = re.compile(r'^survey-definitions/(?P<survey>[^/]+)$')
+_EXPORT_RE = re.compile(r'^surveys/(?P<survey>[^/]+)/export-responses(?:/(?P<id>[^/]+)(?P<file>/file)?)?$')
+
+
+def _survey_name_(definition: Mapping, default: str) -> str:
+    entry = definition.get('result', definition).get('SurveyEntry') or {}
+    return entry.get('SurveyName', default)
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, which Nagle's algorithm would hold back for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.server.fake._handle_(self, 'GET')
+
+    def do_POST(self):
+        self.server.fake._handle_(self, 'POST')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+
+    daemon_threads = True
+    # Load tests open many connections at once, which the default backlog of 5 would refuse
+    request_queue_size = 128
+
+
+class FakeQualtrics(object):
+
+    def __init__(self, surveys: Mapping[str, Union[str, bytes, dict]] = None, responses: Mapping[str, bytes] = None,
+                 token: str = None, page_size=100, latency=0.0, failure_rate=0.0, rate_limit: float = None,
+                 burst: float = None, retry_after=1, export_polls=2, seed=None, host='127.0.0.1', port=0):
+        """
+        Creates a new FakeQualtrics, a local stand-in for the endpoints of the Qualtrics API used by SurveyExporter,
+        against which the exporter can be tested and benchmarked without credentials. The server is started by
+        start(), or by using it as a context manager, and SurveyExporter is pointed at it through base_url
+        :param surveys: mapping of survey ID to survey definition, as the text or bytes of a QSF or as a decoded QSF.
+        Default None (no surveys)
+        :param responses: mapping of survey ID to the content of the file of its exported responses.
+        Default None (every export is an empty file)
+        :param token: API token that requests must present. Default None (any token is accepted)
+        :param page_size: Number of surveys on each page of the list of surveys. Default 100
+        :param latency: Number of seconds by which every response is delayed. Default 0.0
+        :param failure_rate: Probability that a request is answered with 500 Internal Server Error. Default 0.0
+        :param rate_limit: Number of requests per second beyond which requests are answered with 429 Too Many
+        Requests. Default None (no limit)
+        :param burst: Number of requests allowed at once under the rate limit. Default None (rate_limit)
+        :param retry_after: Value of the Retry-After header of 429 responses, in seconds. Default 1
+        :param export_polls: Number of times the progress of an export is checked before it is complete. Default 2
+        :param seed: Seed of the random numbers by which failures are injected. Default None
+        :param host: Address on which to listen. Default '127.0.0.1'
+        :param port: Port on which to listen. Default 0 (any free port)
+        """
+        self._definitions: Dict[str, bytes] = {}
+        self._names: Dict[str, str] = {}
+        for survey_id, definition in (surveys or {}).items():
+            if not isinstance(definition, dict):
+                definition = json.loads(definition)
+            if 'result' not in definition:
+                definition = {'result': definition, 'meta': {'httpStatus': '200 - OK'}}
+            self._definitions[survey_id] = json.dumps(definition).encode('utf-8')
+            self._names[survey_id] = _survey_name_(definition, survey_id)
+
+        self._responses = dict(responses or {})
+        self._token = token
+        self._page_size = page_size
+        self._latency = latency
+        self._failure_rate = failure_rate
+        self._limit = TokenBucket(rate_limit, burst) if rate_limit is not None else None
+        self._retry_after = retry_after
+        self._export_polls = max(1, export_polls)
+        self._random = random.Random(seed)
+
+        # Exports in progress, by progress ID: survey ID and number of times progress has been checked
+        self._exports: Dict[str, list] = {}
+        self._export_ids = count(1)
+        self._lock = threading.Lock()
+        self._stats = Stats()
+
+        self._server = _Server((host, port), _Handler)
+        self._server.fake = self
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/API/v3/'
+
+    @property
+    def survey_ids(self) -> List[str]:
+        return list(self._definitions)
+
+    @property
+    def token(self) -> Optional[str]:
+        return self._token
+
+    @property
+    def stats(self) -> Stats:
+        """
+        Requests received, by endpoint, and the numbers of them which were throttled or failed
+        """
+        return self._stats
+
+    def start(self) -> 'FakeQualtrics':
+        """
+        f.start() -> FakeQualtrics
+        Starts serving requests in a background thread
+        :return: this FakeQualtrics
+        """
+        if self._thread is None:
+            # A short poll interval keeps stop() from waiting out the default half second
+            self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        f.stop() -> None
+        Stops serving requests and closes the socket of the server
+        :return: None
+        """
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def _count_(self, counter):
+        with self._lock:
+            self._stats.add(counter)
+
+    def _handle_(self, handler: BaseHTTPRequestHandler, method: str):
+        length = int(handler.headers.get('Content-Length') or 0)
+        body = handler.rfile.read(length) if length else b''
+
+        parts = urlsplit(handler.path)
+        path = parts.path.partition('/API/v3/')[2]
+        query = parse_qs(parts.query)
+
+        if self._latency:
+            time.sleep(self._latency)
+
+        if self._limit is not None and self._limit.try_acquire() > 0.0:
+            self._count_('throttled')
+            return self._send_(handler, 429, {'meta': {'httpStatus': '429 - Too Many Requests'}},
+                               {'Retry-After': str(self._retry_after)})
+
+        with self._lock:
+            failed = self._random.random() < self._failure_rate
+        if failed:
+            self._count_('failed')
+            return self._send_(handler, 500, {'meta': {'httpStatus': '500 - Internal Server Error'}})
+
+        if self._token is not None and handler.headers.get('x-api-token') != self._token:
+            self._count_('unauthorized')
+            return self._send_(handler, 401, {'meta': {'httpStatus': '401 - Unauthorized'}})
+
+        definition = _SURVEY_DEFINITION_RE.match(path)
+        export = _EXPORT_RE.match(path)
+        if method == 'GET' and path == 'surveys':
+            self._count_('surveys')
+            return self._surveys_(handler, int(query.get('offset', ['0'])[0]))
+        if method == 'GET' and definition is not None:
+            self._count_('survey-definitions')
+            return self._definition_(handler, definition.group('survey'))
+        if method == 'POST' and export is not None and export.group('id') is None:
+            self._count_('export-responses.start')
+            return self._start_export_(handler, export.group('survey'), body)
+        if method == 'GET' and export is not None and export.group('id') is not None:
+            if export.group('file'):
+                self._count_('export-responses.file')
+                return self._export_file_(handler, export.group('survey'), export.group('id'))
+            self._count_('export-responses.progress')
+            return self._export_progress_(handler, export.group('survey'), export.group('id'))
+
+        self._count_('not_found')
+        self._send_(handler, 404, {'meta': {'httpStatus': '404 - Not Found'}})
+
+    def _surveys_(self, handler, offset):
+        ids = list(self._definitions)
+        page = ids[offset:offset + self._page_size]
+        next_page = f'{self.base_url}surveys?offset={offset + self._page_size}' \
+            if offset + self._page_size < len(ids) else None
+        elements = [{'id': survey_id, 'name': self._names[survey_id], 'isActive': True} for survey_id in page]
+        self._send_(handler, 200, {'result': {'elements': elements, 'nextPage': next_page},
+                                   'meta': {'httpStatus': '200 - OK'}})
+
+    def _definition_(self, handler, survey_id):
+        definition = self._definitions.get(survey_id)
+        if definition is None:
+            return self._send_(handler, 404, {'meta': {'httpStatus': '404 - Not Found'}})
+        self._send_(handler, 200, definition)
+
+    def _start_export_(self, handler, survey_id, body):
+        if survey_id not in self._definitions:
+            return self._send_(handler, 404, {'meta': {'httpStatus': '404 - Not Found'}})
+        try:
+            json.loads(body or b'{}')
+        except ValueError:
+            return self._send_(handler, 400, {'meta': {'httpStatus': '400 - Bad Request'}})
+
+        with self._lock:
+            progress_id = f'ES_{next(self._export_ids)}'
+            self._exports[progress_id] = [survey_id, 0]
+        self._send_(handler, 200, {'result': {'progressId': progress_id, 'percentComplete': 0.0,
+                                              'status': 'inProgress'},
+                                   'meta': {'httpStatus': '200 - OK'}})
+
+    def _export_progress_(self, handler, survey_id, progress_id):
+        with self._lock:
+            export = self._exports.get(progress_id)
+            if export is not None and export[0] == survey_id:
+                export[1] += 1
+                polls = export[1]
+        if export is None or export[0] != survey_id:
+            return self._send_(handler, 404, {'meta': {'httpStatus': '404 - Not Found'}})
+
+        result = {'percentComplete': min(100.0, 100.0 * polls / self._export_polls), 'status': 'inProgress'}
+        if polls >= self._export_polls:
+            result.update(status='complete', fileId=f'{progress_id}-file')
+        self._send_(handler, 200, {'result': result, 'meta': {'httpStatus': '200 - OK'}})
+
+    def _export_file_(self, handler, survey_id, file_id):
+        progress_id = file_id[:-len('-file')] if file_id.endswith('-file') else None
+        with self._lock:
+            export = self._exports.get(progress_id)
+        if export is None or export[0] != survey_id or export[1] < self._export_polls:
+            return self._send_(handler, 404, {'meta': {'httpStatus': '404 - Not Found'}})
+        self._send_(handler, 200, self._responses.get(survey_id, b''), content_type='application/octet-stream')
+
+    @staticmethod
+    def _send_(handler, status, body: Union[dict, bytes], headers: Mapping[str, str] = None,
+               content_type='application/json'):
+        if isinstance(body, dict):
+            body = json.dumps(body).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+@dataclass
+class LoadResult(object):
+    path: str
+    requests: int
+    errors: int
+    elapsed: float
+    stats: Stats = field(default_factory=Stats)
+
+    @property
+    def throughput(self) -> float:
+        """
+        Number of calls completed per second
+        """
+        return self.requests / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        return (f"{self.path}: {self.requests} calls in {self.elapsed:.3f}s ({self.throughput:.1f}/s), "
+                f"{self.errors} errors")
+
+
+def load_test(server: FakeQualtrics, path='single', requests=100, workers=8, scheduler=None,
+              **kwargs) -> LoadResult:
+    """
+    load_test(server, path='single', requests=100, workers=8, scheduler=None, **kwargs) -> LoadResult
+    Measures the throughput of an exporter path against a FakeQualtrics server. Each worker thread has its own
+    SurveyExporter, and the statistics of the exporters are merged once they are done
+    :param server: a started FakeQualtrics, with at least one survey
+    :param path: the exporter path to be measured:
+    'single' exports survey definitions one call at a time from a single exporter, in the manner of an interactive user;
+    'bulk' exports survey definitions from workers threads at Priority.BULK;
+    'async' exports responses, which are started, polled and downloaded, from workers threads.
+    Default 'single'
+    :param requests: Number of calls to make. Default 100
+    :param workers: Number of threads for the 'bulk' and 'async' paths. Default 8
+    :param scheduler: RequestScheduler shared by the exporters. Default None
+    :param kwargs: keyword arguments passed to SurveyExporter, e.g. max_retries
+    :return: LoadResult
+    """
+    # The exporter imports requests, which a process that only serves does not need
+    from .surveyexporter import SurveyExporter
+
+    if path not in ('single', 'bulk', 'async'):
+        raise ValueError(f"Unknown exporter path '{path}'")
+
+    survey_ids = server.survey_ids
+    if not survey_ids:
+        raise ValueError("The server has no surveys to export")
+
+    local = threading.local()
+    collected = []
+    collected_lock = threading.Lock()
+
+    def exporter():
+        if not hasattr(local, 'exporter'):
+            stats = Stats()
+            local.exporter = SurveyExporter('local', server.token or 'token', stats=stats, scheduler=scheduler,
+                                            base_url=server.base_url, **kwargs)
+            with collected_lock:
+                collected.append(stats)
+        return local.exporter
+
+    def call(i):
+        survey_id = survey_ids[i % len(survey_ids)]
+        try:
+            if path == 'async':
+                exporter().export_responses(survey_id, update_every=0.0)
+            else:
+                exporter().export(survey_id, priority=Priority.BULK if path == 'bulk' else Priority.INTERACTIVE)
+        except Exception:
+            return False
+        return True
+
+    start = time.perf_counter()
+    if path == 'single':
+        results = [call(i) for i in range(requests)]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(call, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    stats = Stats()
+    for worker_stats in collected:
+        stats.merge(worker_stats)
+
+    return LoadResult(path, requests, results.count(False), elapsed, stats)
@@ -0,0 +1,135 @@
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+import logging
+import time
+
+__all__ = ['Stats', 'collecting', 'current', 'timed', 'count']
+
+
+_logger = logging.getLogger('exportclient')
+
+# Instrumentation is opt-in. When no Stats object is active, timed() hands back this shared no-op context manager,
+# so the cost of an instrumented call site is a single context variable lookup
+_active = ContextVar('qsfdecode_stats', default=None)
+_NULL_TIMER = nullcontext()
+
+
+class Stats(object):
+
+    def __init__(self, log=False):
+        """
+        Creates a new Stats object which accumulates stage timings and event counters
+        :param log: Whether to also emit each completed stage and counter update as a DEBUG event on the
+        'exportclient' logger. Default False
+        """
+        self._log = log
+        self.timings = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+
+    def __str__(self):
+        lines = [f"{stage}: {elapsed:.6f}s ({self.calls[stage]} calls)" for stage, elapsed in self.timings.items()]
+        lines.extend(f"{name}: {value}" for name, value in self.counters.items())
+        return "\n".join(lines)
+
+    @contextmanager
+    def timer(self, stage):
+        """
+        s.timer(stage) -> ContextManager
+        Adds the time spent in the managed block to the total for the specified stage
+        :param stage: name of the stage being timed
+        :return: context manager
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[stage] += elapsed
+            self.calls[stage] += 1
+            if self._log:
+                _logger.debug(f"{stage} completed in {elapsed:.6f}s", extra={'stage': stage, 'elapsed': elapsed})
+
+    def add(self, counter, n=1):
+        """
+        s.add(counter, n=1) -> None
+        Increments the specified counter
+        :param counter: name of the counter
+        :param n: amount by which to increment the counter. Default 1
+        :return: None
+        """
+        self.counters[counter] += n
+        if self._log:
+            _logger.debug(f"{counter} += {n}", extra={'counter': counter, 'value': n})
+
+    def merge(self, other: 'Stats'):
+        """
+        s.merge(other) -> Stats
+        Adds the timings, call counts and counters of other, e.g. those collected in a worker process, to this object
+        :param other: Stats to be merged
+        :return: this Stats
+        """
+        for stage, elapsed in other.timings.items():
+            self.timings[stage] += elapsed
+        for stage, calls in other.calls.items():
+            self.calls[stage] += calls
+        for counter, value in other.counters.items():
+            self.counters[counter] += value
+        return self
+
+    def as_dict(self):
+        """
+        s.as_dict() -> dict
+        Returns the timings (in seconds), call counts, and counters collected so far
+        :return: dict
+        """
+        return {'timings': dict(self.timings), 'calls': dict(self.calls), 'counters': dict(self.counters)}
+
+
+@contextmanager
+def collecting(stats):
+    """
+    collecting(stats) -> ContextManager
+    Makes stats the destination of instrumentation in the current context for the duration of the managed block
+    :param stats: Stats object, or None to disable instrumentation
+    :return: context manager
+    """
+    token = _active.set(stats)
+    try:
+        yield stats
+    finally:
+        _active.reset(token)
+
+
+def current():
+    """
+    current() -> Stats
+    Returns the Stats object active in the current context, or None if instrumentation is disabled
+    :return: Stats or None
+    """
+    return _active.get()
+
+
+def timed(stage):
+    """
+    timed(stage) -> ContextManager
+    Times the managed block as the specified stage if instrumentation is active in the current context
+    :param stage: name of the stage being timed
+    :return: context manager
+    """
+    stats = _active.get()
+    return _NULL_TIMER if stats is None else stats.timer(stage)
+
+
+def count(counter, n=1):
+    """
+    count(counter, n=1) -> None
+    Increments the specified counter if instrumentation is active in the current context
+    :param counter: name of the counter
+    :param n: amount by which to increment the counter. Default 1
+    :return: None
+    """
+    stats = _active.get()
+    if stats is not None:
+        stats.add(counter, n)
@@ -1,11 +1,46 @@
-import itertools
+from collections import deque
+from io import StringIO
 from itertools import chain
 from pathlib import Path
-from qsfdecode.jsondecode.surveyobjectdecoder import SurveyObjectDecoder
-from qsfdecode.jsondecode.abc import SurveyQuestion, SurveyObjectBase
-import json
+from qsfdecode.exceptions import TranslationException
+from qsfdecode.instrumentation import Stats, collecting, count, current, timed
+from qsfdecode.jsondecode.survey import Survey
+from qsfdecode.jsondecode.abc import SurveyQuestion
+from qsfdecode.jsondecode.naming import NamingContext
+from qsfdecode.jsondecode.piping import PipeResolver
+from qsfdecode.jsondecode.questions import MetadataQuestion
+from qsfdecode.jsondecode.result import QuestionFailure, TranslationResult
+from qsfdecode.jsondecode.utl import chunk
+from typing import Dict, Iterable, List, TextIO, Union
+import importlib
+import logging
 
-__all__ = ['translate_to_sps']
+__all__ = ['translate_to_sps', 'write_sps', 'write_sps_parallel', 'translate_to_codebook', 'write_codebook',
+           'translate_to_syntax', 'write_syntax', 'diff_surveys', 'SurveyDiff', 'load_survey', 'load_snapshot',
+           'save_snapshot', 'Survey', 'TranslationResult',
+           'QuestionFailure']
+
+_logger = logging.getLogger('exportclient')
+
+# Output formats other than SPSS syntax are imported from their modules on first access
+_LAZY_ = {'translate_to_codebook': 'codebook', 'write_codebook': 'codebook',
+          'translate_to_syntax': 'emitters', 'write_syntax': 'emitters',
+          'diff_surveys': 'diff', 'SurveyDiff': 'diff',
+          'load_survey': 'snapshot', 'load_snapshot': 'snapshot', 'save_snapshot': 'snapshot'}
+
+
+def __getattr__(name):
+    module = _LAZY_.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(f'{__name__}.{module}'), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
 
 
 def translate_to_sps(
@@ -13,99 +48,223 @@ def translate_to_sps(
         path: Path,
         include_declarations=False,
         lbl_include_question=False,
-        lbl_include_answer=False
-):
+        lbl_include_answer=False,
+        stats: Stats = None,
+        fail_fast=False,
+        workers=1,
+        chunk_size=200,
+        blocks: Iterable[str] = None,
+        branches: Iterable[str] = None,
+        questions: Iterable[str] = None,
+        languages: Iterable[str] = None,
+        combine_languages=False,
+        include_metadata=False,
+        responses: Path = None
+) -> Union[TranslationResult, Dict[str, TranslationResult]]:
     """
     Translates a QSF survey definition SPSS Syntax that defines the variables in a response dataset
-    :param data: text that contains json QSF to be translated
+    :param data: text that contains json QSF to be translated, or an already decoded Survey
     :param path: Path object through which to write output
     :param include_declarations: Whether to include variable declarations in the output. Default False
     :param lbl_include_question: Whether labels of matrix variables should include base question text. Default False
     :param lbl_include_answer: Whether labels of matrix variables should include answer text. Default False
-    :return: None
+    :param stats: Stats object in which to record stage timings and counters. Default None (no instrumentation)
+    :param fail_fast: Whether to stop at the first question whose syntax cannot be generated, raising a
+    TranslationException. Otherwise, failures are recorded and translation continues. Default False
+    :param workers: Number of processes among which chunks of questions are divided. Output retains the order of the
+    questions. Default 1 (syntax is generated in the current process)
+    :param chunk_size: Number of questions sent to a worker process at a time. Default 200
+    :param blocks: IDs of the blocks whose questions are to be translated. Default None (all blocks)
+    :param branches: FlowIDs of the flow elements whose questions are to be translated. Default None (entire flow)
+    :param questions: glob patterns, matched against the QuestionID and DataExportTag of each question, of the questions
+    to be translated. Default None (all questions)
+    :param languages: codes of the languages in which to write labels. Syntax for each language is written to a file
+    named for path and the language code, such as survey_ES.sps. Questions which have not been translated into a
+    language are labelled in the language in which the survey was written. Default None (only that language, to path)
+    :param combine_languages: Whether to write the syntax for every language to path, one after another, rather than
+    to a file per language. Default False
+    :param include_metadata: Whether to write the metadata columns of the survey (StartDate, ResponseId, ...) ahead of
+    the questions and the embedded data fields of its flow after them. Default False
+    :param responses: Path of a CSV, TSV or NDJSON response export, exported without useLabels, to the values of which
+    declarations are fitted. Requires include_declarations. Default None (declarations are sized from the questions)
+    :return: TranslationResult listing the emitted, skipped and failed questions,
+    or a dict mapping each language code to a TranslationResult if languages is specified
+    """
+    # When only part of the survey is to be translated, only the selected questions are constructed
+    lazy = blocks is not None or branches is not None or questions is not None
+
+    with collecting(stats):
+
+        # First step is to actually decode the JSON data into the various Question objects
+        with timed('decode'):
+            survey = data if isinstance(data, Survey) else Survey.from_json(data, lazy=lazy)
+
+        # QSF contain data for many things, not just questions.
+        # All we are interested in in the questions that are actually exported, so extract only those
+        with timed('flow'):
+            questions = survey.exported_questions(blocks=blocks, branches=branches, questions=questions,
+                                                  metadata=include_metadata)
+
+        # Question objects generate their own SPSS code upon request, so write those calls to the specified file
+        options = dict(include_declarations=include_declarations, lbl_include_question=lbl_include_question,
+                       lbl_include_answer=lbl_include_answer, fail_fast=fail_fast)
+
+        # Declarations can be narrowed further to the widest values actually recorded, in a pass over the responses
+        if responses is not None and include_declarations:
+            from qsfdecode.responses import measure_widths
+            with timed('measure'):
+                options.update(widths=measure_widths(responses, questions))
+        if workers > 1:
+            options.update(workers=workers, chunk_size=chunk_size)
+        write = write_sps_parallel if workers > 1 else write_sps
+
+        if languages is None:
+            with timed('emit'), path.open('w', encoding='utf-8') as out_file:
+                return write(questions, out_file, **options)
+
+        # The survey is decoded once. Each language reuses the choice and answer structures of its questions
+        results = {}
+        with timed('emit'):
+            if combine_languages:
+                with path.open('w', encoding='utf-8') as out_file:
+                    for language in languages:
+                        out_file.write(f"* Language: {language}.\n\n")
+                        results[language] = write(questions, out_file, language=language, **options)
+            else:
+                for language in languages:
+                    with path.with_name(f"{path.stem}_{language}{path.suffix}").open('w', encoding='utf-8') as out_file:
+                        results[language] = write(questions, out_file, language=language, **options)
+
+        return results
+
+
+def write_sps(questions: Iterable[SurveyQuestion], out_file: TextIO, fail_fast=False, language: str = None,
+              **kwargs) -> TranslationResult:
+    """
+    Writes the SPSS syntax of each question to an open text stream. Questions may be supplied lazily
+    :param questions: iterable of SurveyQuestion objects
+    :param out_file: text stream to which syntax is written
+    :param fail_fast: Whether to raise a TranslationException at the first question that fails. Default False
+    :param language: code of the language in which to write labels. Default None (the language of the survey)
+    :param kwargs: keyword arguments passed to SurveyQuestion.create_spss_code
+    :return: TranslationResult listing the emitted, skipped and failed questions
     """
+    stats = current()
+    result = TranslationResult()
+
+    for q in questions:  # type: SurveyQuestion
+        qid = q['Payload'].get('QuestionID')
+        try:
+            q = q.translated(language)
+            with timed(f'emit.{type(q).__name__}'):
+                code = q.create_spss_code(**kwargs) + "\n"
+            out_file.write(code)
+        except NotImplementedError:
+            # Question types without a translation produce no syntax by design
+            count('questions_skipped')
+            result.skipped.append(qid)
+        except Exception as err:
+            count('questions_failed')
+            failure = QuestionFailure.from_exception(q, err)
+            result.failed.append(failure)
+            if fail_fast:
+                raise TranslationException(f"Unable to write syntax for question {failure.export_tag}.",
+                                           result) from err
+            _logger.warning(f"Unable to write syntax for question {failure.export_tag}: "
+                            f"{failure.error_type}: {failure.message}")
+        else:
+            count('questions_emitted')
+            result.emitted.append(qid)
+            if stats is not None:
+                stats.add('bytes_written', len(code.encode('utf-8')))
+
+    return result
+
+
+class _WorkerSurvey(object):
+    # Questions decoded in a worker process belong to no Survey, but resolve their piped text against the survey's
+    def __init__(self, pipes: PipeResolver):
+        self.pipes = pipes
+        self.naming = NamingContext(MetadataQuestion.NAMES)
+
+
+_worker_survey_ = None
+
 
-    # First step is to actually decode the JSON data into the various Question objects
-    s = json.loads(data, cls=SurveyObjectDecoder)['result']
-
-    # Questions in the trash block need to be filtered out, so get the trash block and any questions it contains
-    blocks = next(filter(lambda x: x['Element'] == 'BL', s['SurveyElements']))
-    trash = pop_trash(blocks)
-    trash_questions = [x['QuestionID'] for x in trash['BlockElements'] if x['Type'] == 'Question']
-
-    # It is possible that questions/blocks can exist in a survey, but not be in the flow
-    # Questions that are not in the flow are not exported, even though they exist
-    # In order to ensure that these questions don't make it into the conversion, process the flow element
-    # to extract only blocks that are in the flow and the associated questions
-    survey_flow = next(filter(lambda x: x['Element'] == 'FL', s['SurveyElements']))
-    blocks_in_flow = extract_blocks(survey_flow['Payload']['Flow'])
-    block_payload = blocks['Payload'].items() if hasattr(blocks['Payload'], 'items') else enumerate(blocks['Payload'])
-    blocks_to_process = [entry for key, entry in block_payload
-                         if entry['Type'] in ('Standard', 'Block', 'Default') and entry['ID'] in blocks_in_flow]
-
-    questions_to_process = list(chain(*((x['QuestionID'] for x in block['BlockElements'] if x['Type'] == 'Question')
-                                   for block in blocks_to_process)))
-
-    # QSF contain data for many things, not just questions.
-    # All we are interested in in the questions, so extract only those
-    questions = list(
-        x for x in s['SurveyElements']
-        if x['Element'] == 'SQ'
-        and x['Payload']['QuestionID'] in questions_to_process
-        and x['Payload']['QuestionType'] != 'DB'
-    )
-
-    # Question objects generate their own SPSS code upon request, so write those calls to the specified file
-    with path.open('w', encoding='utf-8') as out_file:
-
-        for q in questions:  # type: SurveyQuestion
-            try:
-                out_file.write(q.create_spss_code(include_declarations=include_declarations,
-                                                  lbl_include_question=lbl_include_question,
-                                                  lbl_include_answer=lbl_include_answer) + "\n")
-            except NotImplementedError:
-                continue
-            except:
-                print(f"Unable to write syntax for question {q['Payload']['DataExportTag']}.")
-
-
-def get_all_block_questions(survey_blocks):
-
-    try:
-        items = survey_blocks['Payload'].items()
-    except AttributeError:
-        items = enumerate(survey_blocks['Payload'])
-
-    return chain(*((x['QuestionID'] for x in block['BlockElements'] if x['Type'] == 'Question') for i, block in items))
-
-
-def pop_trash(blocks: SurveyObjectBase) -> SurveyObjectBase:
+def _init_worker_(index):
+    global _worker_survey_
+    _worker_survey_ = _WorkerSurvey(PipeResolver(index)) if index is not None else None
+
+
+def _write_chunk_(questions: List[SurveyQuestion], collect_stats, kwargs):
+    # Failures are reported by the parent process, in question order
+    _logger.disabled = True
+
+    # Questions arrive with the structures computed when they were decoded and expanded, so nothing is decoded again
+    with collecting(Stats() if collect_stats else None) as stats:
+        for q in questions:
+            q.survey = _worker_survey_
+        out_file = StringIO()
+        result = write_sps(questions, out_file, **kwargs)
+
+    return out_file.getvalue(), result, stats
+
+
+def write_sps_parallel(questions: Iterable[SurveyQuestion], out_file: TextIO, workers: int, chunk_size=200,
+                       fail_fast=False, **kwargs) -> TranslationResult:
     """
-    Pops the trash block from the payload of blocks
-    :param blocks: Blocks element from a QSF survey
-    :return: Trash block element
+    Writes the SPSS syntax of each question to an open text stream, generating syntax for chunks of questions in a
+    pool of worker processes. Syntax is written in the order of the questions
+    :param questions: iterable of SurveyQuestion objects
+    :param out_file: text stream to which syntax is written
+    :param workers: Number of worker processes
+    :param chunk_size: Number of questions sent to a worker process at a time. Default 200
+    :param fail_fast: Whether to raise a TranslationException once the chunk containing the first failed question is
+    written. Default False
+    :param kwargs: keyword arguments passed to write_sps (language) and SurveyQuestion.create_spss_code
+    :return: TranslationResult listing the emitted, skipped and failed questions
     """
-    try:
-        items = blocks['Payload'].items()
-    except AttributeError:
-        items = enumerate(blocks['Payload'])
+    if workers < 1 or chunk_size < 1:
+        raise ValueError("workers and chunk_size must be positive integers")
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    stats = current()
+    result = TranslationResult()
+    # Piped text is resolved against the survey of the questions, whose referable parts are sent to each worker once
+    questions = iter(questions)
+    first = next(questions, None)
+    survey = first.survey if first is not None else None
+    index = survey.pipes.index() if survey is not None else None
 
-    for i, blk in items:
-        if blk['Type'] == 'Trash':
-            trash = blocks['Payload'].pop(i)
-            return trash
+    questions = chain((first,), questions) if first is not None else ()
+    chunks = (list(group) for group in chunk(questions, chunk_size))
+    pending = deque()
 
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker_, initargs=(index,)) as pool:
+        while True:
+            # Keep every worker busy, with one chunk queued behind each, without serializing the entire survey at once
+            while len(pending) < 2 * workers:
+                payloads = next(chunks, None)
+                if payloads is None:
+                    break
+                pending.append(pool.submit(_write_chunk_, payloads, stats is not None, kwargs))
 
-def extract_blocks(flow):
+            if len(pending) == 0:
+                break
 
-    BLOCK_TYPES = ['Standard', 'Block', 'Default']
-    FLOW_TYPES = ['Branch', 'Group']
-    blocks = []
+            code, chunk_result, chunk_stats = pending.popleft().result()
+            out_file.write(code)
+            result.extend(chunk_result)
+            if stats is not None:
+                stats.merge(chunk_stats)
 
-    for entry in flow:
-        if entry['Type'] in FLOW_TYPES:
-            blocks.extend(extract_blocks(entry['Flow']))
-        elif entry['Type'] in BLOCK_TYPES:
-            blocks.append(entry['ID'])
+            for failure in chunk_result.failed:
+                if fail_fast:
+                    for future in pending:
+                        future.cancel()
+                    raise TranslationException(f"Unable to write syntax for question {failure.export_tag}.", result)
+                _logger.warning(f"Unable to write syntax for question {failure.export_tag}: "
+                                f"{failure.error_type}: {failure.message}")
 
-    return blocks
+    return result
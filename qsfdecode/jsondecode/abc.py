@@ -1,25 +1,52 @@
-from bs4 import BeautifulSoup
 from collections import OrderedDict
-from qsfdecode.jsondecode.utl import tab
+from dataclasses import replace
+from qsfdecode.instrumentation import timed
+from qsfdecode.jsondecode.utl import html_text, tab
 from qsfdecode.jsondecode.decorator import comment_method
-from typing import Dict
+from qsfdecode.jsondecode.naming import MAX_NAME_LENGTH, NamingContext
+from qsfdecode.jsondecode.variables import NUMERIC, NUMERIC_WIDTH, Variable, VariableTable, numeric_format
+from typing import Dict, Iterable, Mapping, Tuple
 import re
 
 
+def _rebuild_(cls, items):
+    # Objects are rebuilt without calling __init__, so neither the decoder nor BeautifulSoup is run again
+    obj = cls.__new__(cls)
+    OrderedDict.update(obj, items)
+    return obj
+
+
 class SurveyObjectBase(OrderedDict):
 
-    _TEXT_PIPE_RE = re.compile(r"[$][{]q://(?P<qid>QID[0-9]+)/(?P<property>[a-zA-Z]+)[}]")
     _NON_ASCII_RE_ = re.compile(r'[^\x20-\x7E]')
 
+    # Attributes which refer to objects outside this one, and are therefore not pickled. They are restored by whatever
+    # takes ownership of the unpickled object, such as a Survey
+    _transient_: Tuple[str, ...] = ('_survey', '_naming')
+
     class AttributeNotFound(object):
         pass
 
-    __counter__ = 0
-
     def __init__(self, items, **kwargs):
         super().__init__(items, **kwargs)
         self._survey = None
 
+    def __reduce__(self):
+        # The state is pickled separately from the elements, so references back to this object within its state are
+        # resolved by pickle rather than recursed into
+        return _rebuild_, (type(self), list(self.items())), self.__getstate__()
+
+    def __getstate__(self) -> dict:
+        """
+        o.__getstate__() -> dict
+        Returns the computed attributes of the object, without those which refer to objects outside it
+        :return: dict
+        """
+        return {key: value for key, value in self.__dict__.items() if key not in self._transient_}
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(dict.fromkeys(self._transient_), **state)
+
     def __str__(self):
         return "{\n" + "\n".join(f"{key}: {value}" for key, value in self.items()) + "\n}"
 
@@ -31,17 +58,27 @@ class SurveyObjectBase(OrderedDict):
     def survey(self, value):
         self._survey = value
 
-    def some_func(self, text_value):
-
-        pipe = self._TEXT_PIPE_RE.match(text_value)
-        if pipe is None:
-            result = text_value
-        else:
-            qid = pipe['qid']
-            property = pipe['property']
-            result = self.survey.get_question(qid)[property]
-
-        return result
+    @property
+    def naming(self) -> NamingContext:
+        """
+        Context in which the variable names of this object are minted and de-duplicated. That of the survey to which
+        the object belongs, otherwise one of the object's own
+        """
+        naming = getattr(self._survey, 'naming', None)
+        if naming is None:
+            naming = self.__dict__.get('_naming')
+            if naming is None:
+                naming = self._naming = NamingContext()
+        return naming
+
+    def resolve_pipes(self, text: str) -> str:
+        """
+        o.resolve_pipes(text) -> str
+        Resolves the piped text in text against the survey to which this object belongs
+        :param text: str which may contain piped text
+        :return: str, unchanged if this object belongs to no survey
+        """
+        return text if self._survey is None else self._survey.pipes.resolve(text)
 
     @staticmethod
     def _multi_replace_(txt, repl, ignore_case=False, whole_word_only=False):
@@ -69,18 +106,22 @@ class SurveyObjectBase(OrderedDict):
         return replace_re.sub(lambda match: repl[match.group(0)], txt)
 
     @staticmethod
-    def _sanitize_for_spss_(dirty_str, sub=None):
+    def _sanitize_for_spss_(dirty_str, sub=None, naming: NamingContext = None, owner=None):
         """
-        _sanitize_for_spss_(str, subs={}) -> str
+        _sanitize_for_spss_(str, subs={}, naming=None, owner=None) -> str
         Sanitizes the provided string into an SPSS-Compatible identifier
         :param dirty_str: the string to be sanitized
         :param sub: A dictionary of substitutions to use in the santization process. Keys will be replaced with values
         in the sanitized string. Note that using unsanitary values will cause custom substitutions to themselves be sanitized.
         Default None
+        :param naming: NamingContext in which to mint a name for a string of which nothing valid remains.
+        Default None (a new context, so that the name is always VAR_1)
+        :param owner: hashable key of the thing being named, so that the same name is minted for it each time.
+        Default None
         :return: str
         """
         # SPSS has specifications on variable names. These will help ensure they are met
-        max_length = 64
+        max_length = MAX_NAME_LENGTH
         invalid_chars = re.compile(r"[^a-zA-Z0-9_.]")
         invalid_starts = re.compile(r"[^a-zA-Z]+")
         subs = {} if sub is None else sub
@@ -92,8 +133,7 @@ class SurveyObjectBase(OrderedDict):
         # Possible that the process of removing starting chars could create empty string,
         # so create valid var name in that case
         if len(new_var) == 0:
-            SurveyObjectBase.__counter__ += 1
-            new_var = "VAR_{0}".format(SurveyObjectBase.__counter__)
+            new_var = (naming if naming is not None else NamingContext()).generate(owner)
 
         # Trim off excess characters to fit into maximum allowable length
         new_var = new_var[:max_length] if len(new_var) > max_length else new_var
@@ -114,56 +154,315 @@ class SurveyQuestion(SurveyObjectBase):
     _content_types_ = {'ValidEmail': None, "ValidZip": "ValidZipType", "ValidDate": "ValidDateType",
                        "ValidTextOnly": None, "ValidUSState": None, "ValidPhone": None, "ValidNumber": "ValidNumber"}
 
-    _validation_types_ = {"MinChar": "MinChars", "TotalChar": "TotalChars",
+    _validation_types_ = {"MinChar": "MinChars", "TotalChar": "TotalChars", "CharRange": "TotalChars",
                           "None": None}
     CONTENT_TYPE = "ContentType"
 
+    # Widest response, in bytes, accepted by text entry validated by content type, or by content type and subtype
+    _content_widths_ = {'ValidEmail': 254, 'ValidZip': 10, ('ValidZip', 'ValidCAZip'): 7, 'ValidDate': 10,
+                        'ValidUSState': 20, 'ValidPhone': 20, 'ValidNumber': NUMERIC_WIDTH}
+
+    # Characters are counted by Qualtrics, but the widths of SPSS strings are in bytes of UTF-8
+    _CHAR_BYTES_ = 4
+
+    # Attributes which hold the choice and answer structures of a question, mapped to the section of a Language entry
+    # in which their Display text is translated
+    _translatable_: Dict[str, str] = {}
+
+    # Translated views are cheap to recreate from the structures they share with the question, so are not pickled
+    _transient_ = SurveyObjectBase._transient_ + ('_translations',)
+
     def __init__(self, items, **kwargs):
         super().__init__(items, **kwargs)
+        self._variable_table = None
+        self._translations = None
+        self._loop = ()
+        self._source = None
 
         # Qualtrics has a hard limit of 100 characters on the QuestionDescription attribute,
         # which is what is used to create value labels.
         # This causes truncation when the Configuration.QuestionDescriptionOption value is set to 'UseText'
         # Override this property with the QuestionText when QuestionDescriptionOption is 'UseText' and the two are NE
-        qdo = self['Payload']['Configuration']['QuestionDescriptionOption']
-        text = (BeautifulSoup(self['Payload']['QuestionText'], "lxml").get_text().replace("\n", " ").replace("'", "''"))
+        # Side-by-side columns carry their question attributes at the top level rather than in a Payload
+        payload = self.get('Payload', self)
+        qdo = payload['Configuration']['QuestionDescriptionOption']
+        text = self._label_text_(payload['QuestionText'])
 
-        # There are likely a lot of non-ascii characters in variable labels, and we need to strip them out
-        text = SurveyObjectBase._NON_ASCII_RE_.sub(r'', text)
-
-        desc = self['Payload']['QuestionDescription']
+        desc = payload['QuestionDescription']
         desc = SurveyObjectBase._NON_ASCII_RE_.sub(r'', desc)
         if qdo == 'UseText' and text != desc:
-            self['Payload']['QuestionDescription'] = text
+            payload['QuestionDescription'] = text
+
+    def expand(self, loop: Iterable[str] = (), source: Mapping = None):
+        """
+        q.expand(loop=(), source=None) -> None
+        Expands the variables of the question for Loop & Merge and for choices carried forward from another question.
+        Called by the Survey to which the question belongs, before its variable table is computed
+        :param loop: IDs of the iterations of the Loop & Merge block which contains the question, each of which prefixes
+        a copy of every variable. Default () (the question is not looped)
+        :param source: payload of the question from which choices are carried forward. Default None
+        :return: None
+        """
+        loop = tuple(loop)
+        carry = source is not None and self._source is None
+        if loop == self._loop and not carry:
+            return
+
+        # Choices are carried forward only once, however many times the question is expanded
+        self._loop = loop
+        if carry:
+            self._carry_forward_(source)
+            self._source = source
+        self._variable_table = None
+        self._translations = None
+
+    @property
+    def expansion(self) -> Tuple[Tuple[str, ...], Mapping]:
+        """
+        Arguments with which expand was called, from which an equivalent question can be expanded in another process
+        """
+        return self._loop, self._source
+
+    def _carry_forward_(self, source: Mapping):
+        """
+        Adds the choices of source to the choice structures of the question. Question types which support carried
+        forward choices override this method
+        :param source: payload of the question from which choices are carried forward
+        :return: None
+        """
+        pass
+
+    @staticmethod
+    def _label_text_(markup: str) -> str:
+        with timed('html'):
+            text = html_text(markup).replace("\n", " ").replace("'", "''")
+
+        # There are likely a lot of non-ascii characters in variable labels, and we need to strip them out
+        return SurveyObjectBase._NON_ASCII_RE_.sub(r'', text)
+
+    @staticmethod
+    def _translate_entries_(entries, translations: Mapping, relabel: bool):
+        """
+        Translates the Display text of choice or answer structures
+        :param entries: sequence of AnswerChoiceBase
+        :param translations: the Choices or Answers section of a Language entry, keyed like the payload
+        :param relabel: Whether labels derive from the Display text, rather than from VariableNaming
+        :return: sequence of the same type as entries
+        """
+        translated = []
+        for entry in entries:
+            display = (translations.get(str(entry.value)) or {}).get('Display')
+            if display is None:
+                translated.append(entry)
+                continue
+
+            display = str.replace(display.strip(), "'", "''")
+            changes = {'display': display.encode('ascii', errors='ignore').decode()}
+            if relabel:
+                changes.update({attr: display for attr in ('label', 'var_naming') if getattr(entry, attr, '')})
+            translated.append(replace(entry, **changes))
+
+        return type(entries)(translated)
+
+    def _view_(self) -> 'SurveyQuestion':
+        # A shallow copy which shares this question's elements and structures, but computes its own variable table
+        view = type(self).__new__(type(self))
+        OrderedDict.update(view, self)
+        view.__dict__.update(self.__dict__)
+        view._variable_table = None
+        view._translations = None
+        return view
+
+    def _translate_(self, translation: Mapping) -> 'SurveyQuestion':
+        """
+        Creates a view of this question whose labels are taken from an entry of the Language map of its payload
+        :param translation: Language entry, which may translate QuestionText, Choices and Answers
+        :return: SurveyQuestion
+        """
+        view = self._view_()
+        payload = self['Payload']
+        text = translation.get('QuestionText')
+        if text is not None and payload['Configuration']['QuestionDescriptionOption'] == 'UseText':
+            view['Payload'] = {**payload, 'QuestionDescription': self._label_text_(text)}
+
+        relabel = not payload.get('VariableNaming')
+        for attr, section in self._translatable_.items():
+            setattr(view, attr, self._translate_entries_(getattr(self, attr), translation.get(section) or {}, relabel))
+
+        return view
+
+    def languages(self) -> Tuple[str, ...]:
+        """
+        q.languages() -> tuple[str]
+        Returns the codes of the languages into which the question has been translated
+        :return: tuple
+        """
+        languages = self.get('Payload', self).get('Language')
+        return tuple(languages) if isinstance(languages, Mapping) else ()
+
+    def translated(self, language: str = None) -> 'SurveyQuestion':
+        """
+        q.translated(language) -> SurveyQuestion
+        Returns a view of the question whose labels are in the specified language. The view shares the choice and
+        answer structures of the question, and is created once per language
+        :param language: language code, such as ES. Default None (the question itself)
+        :return: SurveyQuestion, which is this question if it has not been translated into language
+        """
+        if language is None:
+            return self
+
+        if self._translations is None:
+            self._translations = {}
+
+        view = self._translations.get(language)
+        if view is None:
+            languages = self.get('Payload', self).get('Language')
+            translation = languages.get(language) if isinstance(languages, Mapping) else None
+            view = self._translate_(translation) if translation else self
+            self._translations[language] = view
+
+        return view
 
     @staticmethod
     def _labels_(labels: Dict[str, str]) -> str:
         return f"\n{tab(2)}".join(f"{key} '{value}'" for key, value in labels.items())
 
-    def create_spss_code(self, **kwargs):
+    def _variables_(self) -> Tuple[Iterable[Variable], Dict[str, Dict[int, str]]]:
+        """
+        Computes the variables of the question and the value label sets they refer to.
+        Question types which support translation override this method
+        :return: tuple of (iterable of Variable, dict mapping value label set ID to dict of value -> label)
+        """
         raise NotImplementedError()
 
-    @comment_method("Value Labels")
-    def create_spss_value_labels(self):
+    def variable_table(self, language: str = None) -> VariableTable:
+        """
+        q.variable_table(language=None) -> VariableTable
+        Returns the table of variables that correspond to this question. The table is computed on first access
+        :param language: code of the language of the labels. Default None (the language in which the survey was written)
+        :return: VariableTable
+        """
+        if language is not None:
+            return self.translated(language).variable_table()
+
+        if self._variable_table is None:
+            variables, value_label_sets = self._variables_()
+            variables = self._right_size_(variables, value_label_sets)
+            if len(self._loop) > 0:
+                variables = [self._looped_(v, prefix) for prefix in self._loop for v in variables]
+            if self._survey is not None:
+                variables, value_label_sets = self._resolve_labels_(variables, value_label_sets)
+            self._variable_table = VariableTable(variables, value_label_sets)
+
+        return self._variable_table
+
+    def _looped_(self, variable: Variable, prefix) -> Variable:
+        # Qualtrics exports the copy of a variable in each iteration of a loop as <prefix>_<name>, which is not a
+        # valid SPSS name when the prefix is a number, so it is named X<prefix>_<name> as in Qualtrics' SPSS exports
+        column = f"{prefix}_{variable.column}"
+        owner = ('Loop', self.get('Payload', self).get('QuestionID'), prefix, variable.name)
+        name = f"{prefix}_{variable.name}"
+        name = self._sanitize_for_spss_(name if name[:1].isalpha() else f"X{name}", naming=self.naming, owner=owner)
+        return replace(variable, name=self.naming.claim(name, owner), export_column=column)
+
+    @staticmethod
+    def _right_size_(variables: Iterable[Variable], value_label_sets: Dict[str, Dict[int, str]]):
+        # Numeric variables whose values are all labelled are only as wide as the widest of their labelled values.
+        # Variables sized by the question itself are left as they are
+        formats = {key: numeric_format(map(str, labels)) for key, labels in value_label_sets.items() if len(labels) > 0}
+        return [replace(v, width=formats[v.value_label_set][0], decimals=formats[v.value_label_set][1])
+                if v.type == NUMERIC and v.date_format is None and v.width == NUMERIC_WIDTH and v.decimals == 0 and
+                v.value_label_set in formats else v
+                for v in variables]
+
+    def _text_width_(self, settings: Mapping) -> int:
+        """
+        q._text_width_(settings) -> int
+        Returns the width, in bytes, of the widest response accepted by text entry with the validation settings
+        :param settings: Settings of the Validation of a question or of a choice
+        :return: int, or None if the length of the response is not limited
+        """
+        kind = settings.get('Type')
+        if self._validation_types_.get(kind) == 'TotalChars' and settings.get('TotalChars'):
+            return int(settings['TotalChars']) * self._CHAR_BYTES_
+
+        if kind == self.CONTENT_TYPE:
+            content = settings.get(self.CONTENT_TYPE)
+            subtype = settings.get(self._content_types_.get(content))
+            return self._content_widths_.get((content, subtype), self._content_widths_.get(content))
+
+        return None
+
+    def _resolve_labels_(self, variables: Iterable[Variable], value_label_sets: Dict[str, Dict[int, str]]):
+        resolve = self._survey.pipes.resolve
+        variables = [v if '${' not in v.label + v.stem + v.answer else
+                     replace(v, label=resolve(v.label), stem=resolve(v.stem), answer=resolve(v.answer))
+                     for v in variables]
+        value_label_sets = {key: {value: resolve(label) for value, label in labels.items()}
+                            for key, labels in value_label_sets.items()}
+        return variables, value_label_sets
+
+    def create_spss_code(self, **kwargs) -> str:
+        """
+        returns a string that contains the SPSS syntax which defines the variables associated with the question
+        :param include_declarations: kwarg whether to include statements to declare the variables. Default False
+        :param lbl_include_question: kwarg whether to include base question description in variable labels. Default False
+        :param lbl_include_answer: kwarg whether to include response labels in variable labels. Default False
+        :param widths: kwarg dict mapping export column to the (width, decimals) of the values observed in a response
+        export, to which declarations are fitted. Default None (declarations are sized from the question)
+        :return: str
+        """
+        include_declarations = kwargs.get('include_declarations', False)
+        lbl_include_question = kwargs.get('lbl_include_question', False)
+        lbl_include_answer = kwargs.get('lbl_include_answer', False)
+        widths = kwargs.get('widths')
+
+        defs = self.create_spss_variable_declarations(widths) if include_declarations else ''
+
+        defs += self.create_spss_variable_labels(lbl_include_question=lbl_include_question,
+                                                 lbl_include_answer=lbl_include_answer)
+
+        defs += self.create_spss_value_labels()
+
+        return defs
+
+    @comment_method("Variable Declarations")
+    def create_spss_variable_declarations(self, widths: Mapping[str, Tuple[int, int]] = None) -> str:
+        variables = self.variable_table()
+        if widths is not None:
+            variables = (v.fitted(*widths[v.column]) if v.column in widths else v for v in variables)
+        return "\n".join(f"{v.type} {v.name} ({v.format})." for v in variables) + "\n"
+
+    @comment_method("Variable Labels")
+    def create_spss_variable_labels(self, lbl_include_question=False, lbl_include_answer=False) -> str:
+        var_labels = self.variable_labels(include_question_text=lbl_include_question, include_answer=lbl_include_answer)
+        var_label_defs = f"\n{tab()}".join(f"{var_name} '{var_label}'" for var_name, var_label in var_labels.items())
+        return f"VARIABLE LABELS\n{tab()}{var_label_defs}.\n"
 
-        # Each choice corresponds to a variable, but all variables have the same value labels in RO question
+    def create_spss_value_labels(self) -> str:
+
+        # Text entry and slider variables, among others, have no value labels associated with them
+        if len(self.value_labels()) == 0:
+            return ''
+
+        return self._create_spss_value_labels_()
+
+    @comment_method("Value Labels")
+    def _create_spss_value_labels_(self) -> str:
         value_label_defs = f'\n{tab()}/'.join(
             f"{var_name}\n{tab(2)}{self._labels_(var_labels)}"
             for var_name, var_labels in self.value_labels().items()
         )
-        defs = f"VALUE LABELS\n{tab()}{value_label_defs}.\n"
-
-        return defs
+        return f"VALUE LABELS\n{tab()}{value_label_defs}.\n"
 
     def payload(self):
         return self.get('Payload')
 
-    def variable_labels(self):
-        raise NotImplementedError()
+    def variable_labels(self, include_question_text=False, include_answer=False) -> Mapping[str, str]:
+        return self.variable_table().labels(include_question_text, include_answer)
 
-    def value_labels(self):
-        raise NotImplementedError()
-
-    def variable_names(self):
-        raise NotImplementedError()
+    def value_labels(self) -> Mapping[str, Mapping[int, str]]:
+        return self.variable_table().value_labels
 
+    def variable_names(self) -> Tuple[str, ...]:
+        return self.variable_table().names
@@ -0,0 +1,165 @@
+from pathlib import Path
+from qsfdecode.exceptions import TranslationException
+from qsfdecode.instrumentation import Stats, collecting, count, timed
+from qsfdecode.jsondecode.abc import SurveyQuestion
+from qsfdecode.jsondecode.result import QuestionFailure, TranslationResult
+from qsfdecode.jsondecode.survey import Survey
+from qsfdecode.jsondecode.variables import raw_label
+from typing import Iterable, Iterator, Tuple
+import csv
+import json
+import logging
+
+__all__ = ['translate_to_codebook', 'write_codebook', 'codebook_rows', 'COLUMNS', 'FORMATS']
+
+_logger = logging.getLogger('exportclient')
+
+COLUMNS = ('question_id', 'export_tag', 'name', 'label', 'type', 'format', 'width', 'decimals',
+           'value_label_set', 'value_labels')
+
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.parquet': 'parquet'}
+
+
+def codebook_rows(questions: Iterable[SurveyQuestion], result: TranslationResult = None, fail_fast=False,
+                  include_question_text=False, include_answer=False) -> Iterator[Tuple]:
+    """
+    Generates one codebook row per variable, in dataset order. Rows are tuples whose fields correspond to COLUMNS.
+    Value labels are serialized as a JSON object so that every column holds a scalar
+    :param questions: iterable of SurveyQuestion objects
+    :param result: TranslationResult in which to record the emitted, skipped and failed questions. Default None
+    :param fail_fast: Whether to raise a TranslationException at the first question that fails. Default False
+    :param include_question_text: Whether labels of matrix variables should include base question text. Default False
+    :param include_answer: Whether labels of matrix variables should include answer text. Default False
+    :return: generator of tuples
+    """
+    result = result if result is not None else TranslationResult()
+
+    for q in questions:  # type: SurveyQuestion
+        payload = q['Payload']
+        qid = payload.get('QuestionID')
+        try:
+            table = q.variable_table()
+        except NotImplementedError:
+            count('questions_skipped')
+            result.skipped.append(qid)
+            continue
+        except Exception as err:
+            count('questions_failed')
+            failure = QuestionFailure.from_exception(q, err)
+            result.failed.append(failure)
+            if fail_fast:
+                raise TranslationException(f"Unable to describe variables of question {failure.export_tag}.",
+                                           result) from err
+            _logger.warning(f"Unable to describe variables of question {failure.export_tag}: "
+                            f"{failure.error_type}: {failure.message}")
+            continue
+
+        count('questions_emitted')
+        result.emitted.append(qid)
+
+        # Each value label set is usually shared by several variables, so it is serialized only once.
+        # Labels are written as they are, without the escaping of SPSS syntax
+        sets = {key: json.dumps({value: raw_label(label) for value, label in labels.items()})
+                for key, labels in table.value_label_sets.items()}
+        labels = table.labels(include_question_text, include_answer)
+        tag = payload.get('DataExportTag')
+        for v in table:
+            yield (qid, tag, v.name, raw_label(labels[v.name]), v.type, v.format, v.width, v.decimals, v.value_label_set,
+                   sets.get(v.value_label_set))
+
+
+def _write_csv_(rows, path: Path):
+    with path.open('w', encoding='utf-8', newline='') as out_file:
+        writer = csv.writer(out_file)
+        writer.writerow(COLUMNS)
+        writer.writerows(rows)
+
+
+def _write_jsonl_(rows, path: Path):
+    with path.open('w', encoding='utf-8') as out_file:
+        for row in rows:
+            # Value labels are already serialized, so they are spliced into the record as a nested object
+            *fields, value_labels = row
+            record = json.dumps(dict(zip(COLUMNS, fields)))
+            out_file.write(f'{record[:-1]}, "value_labels": {value_labels or "null"}}}\n')
+
+
+def _write_parquet_(rows, path: Path):
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as err:
+        raise ImportError("Writing a parquet codebook requires the pyarrow package") from err
+
+    columns = tuple([] for _ in COLUMNS)
+    for row in rows:
+        for column, value in zip(columns, row):
+            column.append(value)
+
+    pyarrow.parquet.write_table(pyarrow.table(dict(zip(COLUMNS, columns))), str(path))
+
+
+_WRITERS = {'csv': _write_csv_, 'jsonl': _write_jsonl_, 'parquet': _write_parquet_}
+
+
+def write_codebook(questions: Iterable[SurveyQuestion], path: Path, format=None, fail_fast=False,
+                   include_question_text=False, include_answer=False) -> TranslationResult:
+    """
+    Writes the variables of each question as a codebook with one row per variable. Questions may be supplied lazily
+    :param questions: iterable of SurveyQuestion objects
+    :param path: Path object through which to write output
+    :param format: One of 'csv', 'jsonl' or 'parquet'. Default None (inferred from the suffix of path)
+    :param fail_fast: Whether to raise a TranslationException at the first question that fails. Default False
+    :param include_question_text: Whether labels of matrix variables should include base question text. Default False
+    :param include_answer: Whether labels of matrix variables should include answer text. Default False
+    :return: TranslationResult listing the emitted, skipped and failed questions
+    """
+    path = Path(path)
+    format = format if format is not None else FORMATS.get(path.suffix.lower())
+    writer = _WRITERS.get(format)
+    if writer is None:
+        raise ValueError(f"Unable to write a codebook to '{path}'. Specify format as one of {', '.join(_WRITERS)}")
+
+    result = TranslationResult()
+    writer(codebook_rows(questions, result, fail_fast=fail_fast, include_question_text=include_question_text,
+                         include_answer=include_answer), path)
+
+    return result
+
+
+def translate_to_codebook(
+        data,
+        path: Path,
+        format=None,
+        lbl_include_question=False,
+        lbl_include_answer=False,
+        stats: Stats = None,
+        fail_fast=False,
+        include_metadata=False
+) -> TranslationResult:
+    """
+    Translates a QSF survey definition to a codebook that describes the variables in a response dataset
+    :param data: text that contains json QSF to be translated, or an already decoded Survey
+    :param path: Path object through which to write output
+    :param format: One of 'csv', 'jsonl' or 'parquet'. Default None (inferred from the suffix of path).
+    Parquet output requires pyarrow
+    :param lbl_include_question: Whether labels of matrix variables should include base question text. Default False
+    :param lbl_include_answer: Whether labels of matrix variables should include answer text. Default False
+    :param stats: Stats object in which to record stage timings and counters. Default None (no instrumentation)
+    :param fail_fast: Whether to stop at the first question whose variables cannot be described, raising a
+    TranslationException. Otherwise, failures are recorded and translation continues. Default False
+    :param include_metadata: Whether to describe the metadata columns of the survey (StartDate, ResponseId, ...) ahead
+    of the questions and the embedded data fields of its flow after them. Default False
+    :return: TranslationResult listing the emitted, skipped and failed questions
+    """
+    with collecting(stats):
+
+        with timed('decode'):
+            survey = data if isinstance(data, Survey) else Survey.from_json(data)
+
+        with timed('flow'):
+            questions = survey.exported_questions(metadata=include_metadata)
+
+        with timed('emit'):
+            return write_codebook(questions, path, format=format, fail_fast=fail_fast,
+                                  include_question_text=lbl_include_question, include_answer=lbl_include_answer)
@@ -0,0 +1,127 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from qsfdecode.jsondecode.abc import SurveyQuestion
+from qsfdecode.jsondecode.result import TranslationResult
+from qsfdecode.jsondecode.survey import Survey
+from qsfdecode.jsondecode.variables import VariableTable
+from typing import Dict, List
+import hashlib
+import json
+
+__all__ = ['SurveyDiff', 'diff_surveys', 'fingerprint']
+
+
+def fingerprint(question: SurveyQuestion) -> str:
+    """
+    Returns a SHA-1 digest of the payload of a question. Questions with equal payloads have equal fingerprints,
+    regardless of the order of their keys
+    :param question: SurveyQuestion
+    :return: str
+    """
+    text = json.dumps(question['Payload'], sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _table_(question: SurveyQuestion) -> VariableTable:
+    try:
+        return question.variable_table()
+    except NotImplementedError:
+        return VariableTable(())
+
+
+@dataclass
+class SurveyDiff:
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    added_variables: List[str] = field(default_factory=list)
+    removed_variables: List[str] = field(default_factory=list)
+    changed_variables: List[str] = field(default_factory=list)
+    survey: Survey = field(default=None, repr=False, compare=False)
+
+    @property
+    def empty(self) -> bool:
+        return len(self.added) + len(self.removed) + len(self.changed) == 0
+
+    @property
+    def affected_variables(self) -> List[str]:
+        return self.added_variables + self.changed_variables + self.removed_variables
+
+    def questions(self) -> List[SurveyQuestion]:
+        """
+        d.questions() -> list[SurveyQuestion]
+        Returns the added and changed questions of the new survey, in the order they appear in the new survey
+        :return: list
+        """
+        ids = set(self.added) | set(self.changed)
+        return [q for q in self.survey.exported_questions() if q['Payload']['QuestionID'] in ids]
+
+    def write_sps(self, path: Path, **kwargs) -> TranslationResult:
+        """
+        d.write_sps(path, **kwargs) -> TranslationResult
+        Writes SPSS syntax for only the added and changed questions. Variables that no longer exist are listed in a
+        comment at the end of the file
+        :param path: Path object through which to write output
+        :param kwargs: keyword arguments passed to write_sps
+        (fail_fast, include_declarations, lbl_include_question, lbl_include_answer)
+        :return: TranslationResult listing the emitted, skipped and failed questions
+        """
+        from qsfdecode.jsondecode import write_sps
+
+        with Path(path).open('w', encoding='utf-8') as out_file:
+            result = write_sps(self.questions(), out_file, **kwargs)
+            if len(self.removed_variables) > 0:
+                out_file.write(f"* Variables removed from the survey: {' '.join(self.removed_variables)}.\n")
+
+        return result
+
+
+def _variable_changes_(old: VariableTable, new: VariableTable, diff: SurveyDiff):
+    old_value_labels, new_value_labels = old.value_labels, new.value_labels
+    for v in new:
+        if v.name not in old:
+            diff.added_variables.append(v.name)
+        elif old[v.name] != v or old_value_labels.get(v.name) != new_value_labels.get(v.name):
+            diff.changed_variables.append(v.name)
+
+    diff.removed_variables.extend(v.name for v in old if v.name not in new)
+
+
+def diff_surveys(old, new) -> SurveyDiff:
+    """
+    Compares the exported questions of two versions of a survey, matching questions by QuestionID.
+    A question has changed when the fingerprint of its payload has changed. Only the variables of added, removed and
+    changed questions are computed, so the cost of a diff beyond decoding is proportional to the size of the change
+    :param old: text that contains json QSF of the earlier version, or an already decoded Survey
+    :param new: text that contains json QSF of the later version, or an already decoded Survey
+    :return: SurveyDiff
+    """
+    old = old if isinstance(old, Survey) else Survey.from_json(old)
+    new = new if isinstance(new, Survey) else Survey.from_json(new)
+    old_questions: Dict[str, SurveyQuestion] = {q['Payload']['QuestionID']: q for q in old.exported_questions()}
+    new_questions: Dict[str, SurveyQuestion] = {q['Payload']['QuestionID']: q for q in new.exported_questions()}
+
+    diff = SurveyDiff(survey=new)
+    empty = VariableTable(())
+    for qid, question in new_questions.items():
+        previous = old_questions.get(qid)
+        if previous is None:
+            diff.added.append(qid)
+            _variable_changes_(empty, _table_(question), diff)
+        elif fingerprint(previous) != fingerprint(question):
+            diff.changed.append(qid)
+            _variable_changes_(_table_(previous), _table_(question), diff)
+
+    for qid, question in old_questions.items():
+        if qid not in new_questions:
+            diff.removed.append(qid)
+            _variable_changes_(_table_(question), empty, diff)
+
+    # A variable which moved from one question to another has changed rather than been added and removed
+    moved = set(diff.added_variables) & set(diff.removed_variables)
+    if len(moved) > 0:
+        diff.changed_variables.extend(name for name in diff.added_variables if name in moved)
+        diff.added_variables = [name for name in diff.added_variables if name not in moved]
+        diff.removed_variables = [name for name in diff.removed_variables if name not in moved]
+
+    return diff
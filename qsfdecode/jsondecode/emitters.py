@@ -0,0 +1,359 @@
+from pathlib import Path
+from qsfdecode.exceptions import TranslationException
+from qsfdecode.instrumentation import Stats, collecting, count, timed
+from qsfdecode.jsondecode.abc import SurveyQuestion
+from qsfdecode.jsondecode.result import QuestionFailure, TranslationResult
+from qsfdecode.jsondecode.survey import Survey
+from qsfdecode.jsondecode.utl import tab
+from qsfdecode.jsondecode.variables import VariableTable, raw_label
+from typing import Dict, Iterable, Mapping, TextIO
+import logging
+import re
+
+__all__ = ['Emitter', 'SpssEmitter', 'StataEmitter', 'REmitter', 'SasEmitter', 'EMITTERS',
+           'write_syntax', 'translate_to_syntax']
+
+_logger = logging.getLogger('exportclient')
+
+_IDENTIFIER_RE = re.compile(r'[^A-Za-z0-9_]')
+
+
+def _identifier_(name: str, max_length=32) -> str:
+    """
+    Converts a variable name to an identifier valid in Stata and SAS,
+    in which characters other than letters, digits and underscores are replaced by underscores
+    """
+    name = _IDENTIFIER_RE.sub('_', name)
+    if name == '' or name[0].isdigit():
+        name = f"_{name}"
+    return name[:max_length]
+
+
+class _Identifiers(object):
+
+    def __init__(self, max_length=32):
+        self._max_length = max_length
+        self._names = {}
+        self._used = set()
+
+    def __call__(self, name: str, key=None) -> str:
+        """
+        Returns the identifier of name, which is unique among the identifiers issued.
+        Names that are identical once converted or truncated are told apart by a numeric suffix
+        :param name: name to be converted
+        :param key: key which identifies the object named. Default None (the name itself)
+        """
+        key = name if key is None else key
+        identifier = self._names.get(key)
+        if identifier is not None:
+            return identifier
+
+        base = _identifier_(name, self._max_length)
+        identifier, i = base, 1
+        while identifier in self._used:
+            suffix = f"_{i}"
+            identifier, i = f"{base[:self._max_length - len(suffix)]}{suffix}", i + 1
+
+        self._used.add(identifier)
+        self._names[key] = identifier
+        return identifier
+
+
+def _integer_(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(value) if value.is_integer() else None
+
+
+class Emitter(object):
+
+    name = None
+    suffix = None
+
+    def __init__(self, **kwargs):
+        """
+        Creates a new Emitter, which generates the syntax of one target language from the variable tables of questions
+        :param kwargs: Options of the translation. include_declarations, lbl_include_question, lbl_include_answer
+        """
+        self._options = kwargs
+
+    def _labels_(self, table: VariableTable) -> Mapping[str, str]:
+        return table.labels(self._options.get('lbl_include_question', False),
+                            self._options.get('lbl_include_answer', False))
+
+    def begin(self) -> str:
+        """
+        e.begin() -> str
+        Returns the syntax which precedes that of the first question
+        """
+        return ''
+
+    def emit(self, question: SurveyQuestion, table: VariableTable) -> str:
+        """
+        e.emit(question, table) -> str
+        Returns the syntax which defines the variables of a single question
+        :param question: SurveyQuestion being translated
+        :param table: the question's VariableTable
+        :return: str
+        """
+        raise NotImplementedError()
+
+    def end(self) -> str:
+        """
+        e.end() -> str
+        Returns the syntax which follows that of the last question
+        """
+        return ''
+
+
+class SpssEmitter(Emitter):
+
+    name = 'spss'
+    suffix = '.sps'
+
+    def emit(self, question: SurveyQuestion, table: VariableTable) -> str:
+        return question.create_spss_code(**self._options) + "\n"
+
+
+class StataEmitter(Emitter):
+
+    name = 'stata'
+    suffix = '.do'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._variable_names = _Identifiers()
+        self._label_names = _Identifiers()
+
+    @staticmethod
+    def _quote_(text: str) -> str:
+        # Compound double quotes allow labels to contain double quotes
+        return f"`\"{text}\"'"
+
+    def emit(self, question: SurveyQuestion, table: VariableTable) -> str:
+        lines = [f"* {question['Payload']['DataExportTag']}"]
+        lines.extend(f"label variable {self._variable_names(name)} {self._quote_(raw_label(label)[:80])}"
+                     for name, label in self._labels_(table).items())
+
+        # Stata attaches value labels to integers only
+        names = {}
+        for set_id, labels in table.value_label_sets.items():
+            values = [(_integer_(value), label) for value, label in labels.items()]
+            values = [(value, label) for value, label in values if value is not None]
+            if len(values) == 0:
+                continue
+            # Each set is defined once per question, so the same set ID in another question is a different label
+            names[set_id] = self._label_names(str(set_id), (question['Payload'].get('QuestionID'), set_id))
+            definitions = " ".join(f"{value} {self._quote_(raw_label(label))}" for value, label in values)
+            lines.append(f"label define {names[set_id]} {definitions}, replace")
+
+        lines.extend(f"label values {self._variable_names(v.name)} {names[v.value_label_set]}"
+                     for v in table if v.value_label_set in names)
+
+        return "\n".join(lines) + "\n\n"
+
+
+class REmitter(Emitter):
+
+    name = 'r'
+    suffix = '.R'
+
+    def __init__(self, dataset='data', **kwargs):
+        """
+        Creates a new REmitter, which labels the columns of a data frame with haven::labelled
+        :param dataset: Name of the data frame whose columns are labelled. Default 'data'
+        """
+        super().__init__(**kwargs)
+        self._dataset = dataset
+
+    @staticmethod
+    def _quote_(text: str) -> str:
+        text = text.replace('\\', '\\\\').replace('"', '\\"')
+        return f'"{text}"'
+
+    def emit(self, question: SurveyQuestion, table: VariableTable) -> str:
+        lines = [f"# {question['Payload']['DataExportTag']}"]
+        labels = self._labels_(table)
+        sets = {set_id: ", ".join(f"{self._quote_(raw_label(label))} = {value}"
+                                  for value, label in value_labels.items() if _integer_(value) is not None)
+                for set_id, value_labels in table.value_label_sets.items()}
+
+        for v in table:
+            column = f"{self._dataset}[[{self._quote_(v.name)}]]"
+            label = self._quote_(raw_label(labels[v.name]))
+            if sets.get(v.value_label_set):
+                lines.append(f"{column} <- haven::labelled({column}, labels = c({sets[v.value_label_set]}), "
+                             f"label = {label})")
+            else:
+                lines.append(f"attr({column}, \"label\") <- {label}")
+
+        return "\n".join(lines) + "\n\n"
+
+
+class SasEmitter(Emitter):
+
+    name = 'sas'
+    suffix = '.sas'
+
+    def __init__(self, dataset='responses', **kwargs):
+        """
+        Creates a new SasEmitter. Formats are defined as each question is emitted, and a single DATA step which
+        applies labels and formats to the dataset follows the last question
+        :param dataset: Name of the SAS dataset whose variables are labelled. Default 'responses'
+        """
+        super().__init__(**kwargs)
+        self._dataset = dataset
+        self._variable_names = _Identifiers()
+        self._label_statements = []
+        self._applied = []
+        self._formats = 0
+
+    @staticmethod
+    def _quote_(text: str) -> str:
+        text = text.replace("'", "''")
+        return f"'{text}'"
+
+    def emit(self, question: SurveyQuestion, table: VariableTable) -> str:
+        names = {}
+        values = []
+        for set_id, labels in table.value_label_sets.items():
+            pairs = [(_integer_(value), label) for value, label in labels.items()]
+            pairs = [f"{tab(2)}{value} = {self._quote_(raw_label(label))}" for value, label in pairs if value is not None]
+            if len(pairs) == 0:
+                continue
+
+            # Format names may not end in a digit
+            self._formats += 1
+            names[set_id] = f"QSF{self._formats}F"
+            values.append(f"{tab()}VALUE {names[set_id]}\n" + "\n".join(pairs) + ";")
+
+        # Labels and formats are applied by the DATA step written at the end, so only these short lines are kept
+        self._label_statements.extend(f"{tab(2)}{self._variable_names(name)} = {self._quote_(raw_label(label)[:256])}"
+                                      for name, label in self._labels_(table).items())
+        self._applied.extend(f"{tab(2)}{self._variable_names(v.name)} {names[v.value_label_set]}."
+                             for v in table if v.value_label_set in names)
+
+        if len(values) == 0:
+            return ''
+        return f"* {question['Payload']['DataExportTag']};\nPROC FORMAT;\n" + "\n".join(values) + "\nRUN;\n\n"
+
+    def end(self) -> str:
+        lines = [f"DATA {self._dataset};", f"{tab()}SET {self._dataset};"]
+        if len(self._label_statements) > 0:
+            lines.append(f"{tab()}LABEL\n" + "\n".join(self._label_statements) + ";")
+        if len(self._applied) > 0:
+            lines.append(f"{tab()}FORMAT\n" + "\n".join(self._applied) + ";")
+        lines.append("RUN;")
+        return "\n".join(lines) + "\n"
+
+
+EMITTERS = {emitter.name: emitter for emitter in (SpssEmitter, StataEmitter, REmitter, SasEmitter)}
+
+
+def write_syntax(questions: Iterable[SurveyQuestion], outputs: Mapping[Emitter, TextIO],
+                 fail_fast=False) -> Dict[str, TranslationResult]:
+    """
+    Writes the syntax of each question for every emitter in a single pass. Each question's variable table is computed
+    once and shared by all emitters. Questions may be supplied lazily
+    :param questions: iterable of SurveyQuestion objects
+    :param outputs: dict mapping Emitter to the text stream to which its syntax is written
+    :param fail_fast: Whether to raise a TranslationException at the first question that fails. Default False
+    :return: dict mapping the name of each emitter to a TranslationResult
+    """
+    results = {emitter.name: TranslationResult() for emitter in outputs}
+
+    def fail(emitter_names, q, err):
+        failure = QuestionFailure.from_exception(q, err)
+        for name in emitter_names:
+            count('questions_failed')
+            results[name].failed.append(failure)
+        if fail_fast:
+            raise TranslationException(f"Unable to write syntax for question {failure.export_tag}.",
+                                       results[emitter_names[0]]) from err
+        _logger.warning(f"Unable to write syntax for question {failure.export_tag}: "
+                        f"{failure.error_type}: {failure.message}")
+
+    for emitter, out_file in outputs.items():
+        out_file.write(emitter.begin())
+
+    for q in questions:  # type: SurveyQuestion
+        qid = q['Payload'].get('QuestionID')
+        try:
+            table = q.variable_table()
+        except NotImplementedError:
+            # Question types without a translation produce no syntax by design
+            for result in results.values():
+                count('questions_skipped')
+                result.skipped.append(qid)
+            continue
+        except Exception as err:
+            fail(list(results), q, err)
+            continue
+
+        for emitter, out_file in outputs.items():
+            try:
+                with timed(f'emit.{emitter.name}'):
+                    code = emitter.emit(q, table)
+                out_file.write(code)
+            except Exception as err:
+                fail([emitter.name], q, err)
+            else:
+                count('questions_emitted')
+                results[emitter.name].emitted.append(qid)
+
+    for emitter, out_file in outputs.items():
+        out_file.write(emitter.end())
+
+    return results
+
+
+def translate_to_syntax(
+        data,
+        paths: Mapping[str, Path],
+        include_declarations=False,
+        lbl_include_question=False,
+        lbl_include_answer=False,
+        stats: Stats = None,
+        fail_fast=False
+) -> Dict[str, TranslationResult]:
+    """
+    Translates a QSF survey definition to the syntax of several statistical packages at once.
+    The survey is decoded once and all targets are written in a single pass over its questions
+    :param data: text that contains json QSF to be translated, or an already decoded Survey
+    :param paths: dict mapping the name of an emitter (spss, stata, r, sas) to the Path through which to write output
+    :param include_declarations: Whether to include variable declarations in SPSS output. Default False
+    :param lbl_include_question: Whether labels of matrix variables should include base question text. Default False
+    :param lbl_include_answer: Whether labels of matrix variables should include answer text. Default False
+    :param stats: Stats object in which to record stage timings and counters. Default None (no instrumentation)
+    :param fail_fast: Whether to stop at the first question whose syntax cannot be generated, raising a
+    TranslationException. Otherwise, failures are recorded and translation continues. Default False
+    :return: dict mapping the name of each emitter to a TranslationResult
+    """
+    unknown = set(paths) - set(EMITTERS)
+    if len(unknown) > 0:
+        raise ValueError(f"Unknown syntax targets {', '.join(sorted(unknown))}. "
+                         f"Specify targets from {', '.join(EMITTERS)}")
+
+    options = dict(include_declarations=include_declarations, lbl_include_question=lbl_include_question,
+                   lbl_include_answer=lbl_include_answer)
+
+    with collecting(stats):
+
+        with timed('decode'):
+            survey = data if isinstance(data, Survey) else Survey.from_json(data)
+
+        with timed('flow'):
+            questions = survey.exported_questions()
+
+        files = {}
+        try:
+            for name, path in paths.items():
+                files[EMITTERS[name](**options)] = Path(path).open('w', encoding='utf-8')
+
+            with timed('emit'):
+                return write_syntax(questions, files, fail_fast=fail_fast)
+        finally:
+            for out_file in files.values():
+                out_file.close()
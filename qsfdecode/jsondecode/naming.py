@@ -0,0 +1,97 @@
+from typing import Dict, Hashable, Iterable
+import threading
+
+__all__ = ['NamingContext', 'MAX_NAME_LENGTH']
+
+# SPSS has a hard limit of 64 bytes on the length of a variable name
+MAX_NAME_LENGTH = 64
+
+
+class NamingContext(object):
+
+    def __init__(self, reserved: Iterable[str] = ()):
+        """
+        Creates a new NamingContext, which mints and de-duplicates the variable names of one translation.
+        Names are compared without regard to case, as they are by SPSS. Each name is claimed on behalf of an owner,
+        such as a question, so that naming the same thing again returns the same name rather than a new one.
+        A context may be shared among threads
+        :param reserved: names which are already taken, and which are never returned. Default ()
+        """
+        self._lock = threading.Lock()
+        self._taken: Dict[str, Hashable] = {name.casefold(): None for name in reserved}
+        self._claims: Dict[tuple, str] = {}
+
+        # Last suffix given to each name and the last generated number, so that neither is searched for from the start
+        self._suffixes: Dict[str, int] = {}
+        self._counter = 0
+
+    def __contains__(self, name: str):
+        return name.casefold() in self._taken
+
+    def __len__(self):
+        return len(self._taken)
+
+    def reserve(self, names: Iterable[str]):
+        """
+        c.reserve(names) -> None
+        Marks names, such as those of question variables, as taken, so that no name minted or claimed later collides
+        with them. Names which are already taken are left to their owners
+        :param names: valid SPSS variable names
+        :return: None
+        """
+        with self._lock:
+            for name in names:
+                self._taken.setdefault(name.casefold(), None)
+
+    def claim(self, name: str, owner: Hashable = None) -> str:
+        """
+        c.claim(name, owner=None) -> str
+        Claims a name. A name which is already taken is suffixed _2, _3, ... until it is unique
+        :param name: valid SPSS variable name
+        :param owner: hashable key of the thing being named. Default None (the name is claimed anew on every call)
+        :return: str, the name unless it was taken
+        """
+        with self._lock:
+            claimed = self._claims.get((owner, name)) if owner is not None else None
+            if claimed is None:
+                claimed = self._unique_(name, owner)
+                self._take_(claimed, (owner, name), owner)
+            return claimed
+
+    def generate(self, owner: Hashable = None, prefix='VAR') -> str:
+        """
+        c.generate(owner=None, prefix='VAR') -> str
+        Mints a new name, VAR_1, VAR_2, ..., for something which has no usable name of its own
+        :param owner: hashable key of the thing being named. Default None (a new name is minted on every call)
+        :param prefix: prefix of the minted name. Default 'VAR'
+        :return: str
+        """
+        with self._lock:
+            claimed = self._claims.get((owner, None)) if owner is not None else None
+            if claimed is None:
+                self._counter += 1
+                while f"{prefix}_{self._counter}".casefold() in self._taken:
+                    self._counter += 1
+                claimed = f"{prefix}_{self._counter}"
+                self._take_(claimed, (owner, None), owner)
+            return claimed
+
+    def _take_(self, name, key, owner):
+        self._taken[name.casefold()] = owner
+        if owner is not None:
+            self._claims[key] = name
+
+    def _unique_(self, name: str, owner) -> str:
+        # A name is not taken from the owner that already holds it, such as a name generated for that owner
+        base = name.casefold()
+        if base not in self._taken or (owner is not None and self._taken[base] == owner):
+            return name
+
+        n = self._suffixes.get(base, 1)
+        while True:
+            n += 1
+            suffix = f"_{n}"
+            candidate = name[:MAX_NAME_LENGTH - len(suffix)] + suffix
+            if candidate.casefold() not in self._taken:
+                self._suffixes[base] = n
+                return candidate
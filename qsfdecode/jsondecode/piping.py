@@ -0,0 +1,119 @@
+from qsfdecode.jsondecode.utl import html_text
+from typing import Dict, Iterable, Mapping
+import re
+
+__all__ = ['PipeResolver', 'PIPE_RE', 'pipe_index']
+
+# ${q://QID1/QuestionText}, ${q://QID1/ChoiceDescription/2}, ${e://Field/name}, ...
+PIPE_RE = re.compile(r"[$][{](?P<scope>[a-z]+)://(?P<target>[^/}]*)(?:/(?P<property>[^}]*))?[}]")
+_NON_ASCII_RE_ = re.compile(r'[^\x20-\x7E]')
+
+
+def _clean_(text: str) -> str:
+    # Text is cleaned the same way as question text in labels: no markup, line breaks or non-ascii, quotes escaped
+    return _NON_ASCII_RE_.sub('', html_text(text).replace("\n", " ").replace("'", "''"))
+
+
+def pipe_index(questions: Iterable[Mapping]) -> Dict[str, dict]:
+    """
+    Extracts the parts of each question element to which piped text can refer, so that questions can be resolved
+    against a survey in a process to which the survey is not sent
+    :param questions: iterable of question elements
+    :return: dict mapping QuestionID to a reduced question element
+    """
+    index = {}
+    for question in questions:
+        payload = question['Payload']
+        choices = payload.get('Choices') or {}
+        choices = {key: {'Display': value.get('Display', '')} for key, value in choices.items()} \
+            if hasattr(choices, 'items') else {}
+        index[payload['QuestionID']] = {'Payload': {'QuestionText': payload.get('QuestionText', ''),
+                                                    'DataExportTag': payload.get('DataExportTag'),
+                                                    'Choices': choices}}
+    return index
+
+
+class PipeResolver(object):
+
+    def __init__(self, questions: Mapping[str, Mapping]):
+        """
+        Creates a new PipeResolver, which replaces the piped text in labels with the text it refers to.
+        Pipes to the text of a question or of one of its choices are replaced by that text. Pipes to a response or to
+        an embedded data field, whose values are unknown until the survey is taken, are replaced by the export tag of
+        the question or the name of the field, in brackets. Pipes which cannot be resolved are left as they are
+        :param questions: mapping of QuestionID to question element, such as that of a Survey
+        """
+        self._questions = questions
+        self._resolved: Dict[str, str] = {}
+        self._texts: Dict[tuple, str] = {}
+
+        # Texts being resolved, and the number of references back to them that have been encountered
+        self._active = set()
+        self._cycles = 0
+
+    def resolve(self, text: str) -> str:
+        """
+        r.resolve(text) -> str
+        Resolves every pipe in text. Resolved strings are memoized, so each distinct label is scanned once
+        :param text: label, which may contain piped text
+        :return: str
+        """
+        if '${' not in text:
+            return text
+
+        resolved = self._resolved.get(text)
+        if resolved is None:
+            resolved = PIPE_RE.sub(self._substitute_, text)
+            self._resolved[text] = resolved
+
+        return resolved
+
+    def index(self) -> Dict[str, dict]:
+        """
+        r.index() -> dict
+        Returns the parts of the questions to which piped text can refer, from which an equivalent PipeResolver can be
+        created in another process
+        :return: dict mapping QuestionID to a reduced question element
+        """
+        return pipe_index(self._questions.values())
+
+    def _substitute_(self, match) -> str:
+        scope, target, prop = match.group('scope', 'target', 'property')
+        if scope == 'e' and prop:
+            return f"[{prop}]"
+        if scope != 'q' or target not in self._questions:
+            return match.group(0)
+
+        payload = self._questions[target]['Payload']
+        if prop == 'QuestionText':
+            return self._text_((target,), payload.get('QuestionText', ''), match.group(0))
+
+        kind, _, choice = (prop or '').partition('/')
+        choices = payload.get('Choices') or {}
+        if kind in ('ChoiceDescription', 'ChoiceText') and hasattr(choices, 'items') and choice in choices:
+            return self._text_((target, choice), choices[choice].get('Display', ''), match.group(0))
+
+        return f"[{payload.get('DataExportTag', target)}]"
+
+    def _text_(self, key: tuple, text: str, pipe: str) -> str:
+        resolved = self._texts.get(key)
+        if resolved is not None:
+            return resolved
+
+        # A text which pipes itself, directly or through other questions, keeps the pipe which closes the cycle
+        if key in self._active:
+            self._cycles += 1
+            return pipe
+
+        self._active.add(key)
+        cycles = self._cycles
+        try:
+            resolved = PIPE_RE.sub(self._substitute_, _clean_(text))
+        finally:
+            self._active.remove(key)
+
+        # A text resolved within a cycle depends on where the cycle was entered, so only acyclic texts are memoized
+        if self._cycles == cycles:
+            self._texts[key] = resolved
+
+        return resolved
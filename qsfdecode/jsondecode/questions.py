@@ -1,11 +1,11 @@
-from qsfdecode.jsondecode.decorator import comment_method
 from qsfdecode.jsondecode.abc import SurveyQuestion
-from qsfdecode.jsondecode.utl import tab
+from qsfdecode.jsondecode.variables import STRING_WIDTH, Variable, VariableTable, numeric_format
 from dataclasses import dataclass, field
-from typing import Dict, List, Tuple
+from typing import Dict
 
 __all__ = ['MatrixQuestion', 'MultiAnswerMatrixQuestion', 'MultiChoiceQuestion', 'MultiAnswerMultiChoiceQuestion',
-           'RankOrderQuestion', 'SideBySideQuestion', 'SliderQuestion', 'TextEntryQuestion']
+           'RankOrderQuestion', 'SideBySideQuestion', 'SliderQuestion', 'TextEntryQuestion', 'MetadataQuestion',
+           'EmbeddedDataQuestion']
 
 
 @dataclass(order=True)
@@ -47,6 +47,7 @@ class MCChoice(ChoiceBase):
     recode_value: int = None
     label: str = ''
     var_naming: str = ''
+    carried: bool = False
 
     def __post_init__(self):
         super().__post_init__()
@@ -56,6 +57,8 @@ class MCChoice(ChoiceBase):
 
 class MatrixQuestion(SurveyQuestion):
 
+    _translatable_ = {'_statements': 'Choices', '_answers': 'Answers'}
+
     def __init__(self, items, **kwargs):
         super().__init__(items, **kwargs)
 
@@ -109,53 +112,34 @@ class MatrixQuestion(SurveyQuestion):
                          label=str.replace(answer_labels.get(key), "'", "''")) for key, value in answers.items())
         self._answers = tuple(sorted_answers)
 
-    def create_spss_code(self, **kwargs) -> str:
-
-        include_declarations = kwargs.get('include_declarations', False)
-        lbl_include_question = kwargs.get('lbl_include_question', False)
-
-        defs = self.create_spss_variable_declarations() if include_declarations else ''
-
-        defs += self.create_spss_variable_labels(lbl_include_question=lbl_include_question)
-
-        defs += self.create_spss_value_labels()
-
-        return defs
-
-    @comment_method("Variable Labels")
-    def create_spss_variable_labels(self, lbl_include_question=False):
-        defs = f"VARIABLE LABELS\n{tab()}" + \
-               f"\n{tab()}".join(f"{var_name} '{label}'"
-                            for var_name, label in self.variable_labels(lbl_include_question).items()) + ".\n"
-
-        return defs
-
-    @comment_method("Variable Declarations")
-    def create_spss_variable_declarations(self):
-
-        defs = '\n'.join(f"NUMERIC {s.export_tag} (F40.0)." for s in self._statements) + "\n"
-        defs += "\n".join(f"STRING {s.export_tag}_TEXT (A2000)."
-                          for s in self._statements
-                          if s.has_text_entry) + "\n"
-
-        return defs
-
-    def value_labels(self) -> Dict[str, Dict[int, str]]:
-        value_labels = {a.recode_value: a.label for a in self._answers}
-        labels = {s.export_tag: value_labels for s in self._statements}
+    def _carry_forward_(self, source):
+        # Statements carried forward from another question are exported as x<choice> of this question,
+        # ahead of the statements of this question
+        payload = self['Payload']
+        export_tags = payload.get('ChoiceDataExportTags') or {}
+        carried = tuple(
+            MatrixChoice(value=int(key),
+                         display=str.replace(entry.get('Display'), "'", "''").encode('ascii', errors='ignore').decode(),
+                         choice_order=-1, has_text_entry=False,
+                         export_tag=export_tags.get(f"x{key}") or f"{payload['DataExportTag']}_x{key}")
+            for key, entry in (source.get('Choices') or {}).items())
+        self._statements = carried + tuple(self._statements)
 
-        return labels
+    def _variables_(self):
+        payload = self['Payload']
+        stem = payload['QuestionDescription']
 
-    def variable_labels(self, include_question_text=False) -> Dict[str, str]:
-        stub = f"{self['Payload']['QuestionDescription']} - " if include_question_text else ''
-        labels = {s.export_tag: f'{stub}{s.display}' for s in self._statements}
-        labels.update({f"{s.export_tag}_TEXT": f"{stub}{s.display} - Text"
-                       for s in self._statements if s.has_text_entry})
+        # Every statement shares the same set of value labels, which are defined by the answers
+        label_set = payload['DataExportTag']
+        value_label_sets = {label_set: {a.recode_value: a.label for a in self._answers}}
 
-        return labels
+        # Each statement has its own numeric variable.
+        # Each statement that has text entry has an additional string variable
+        variables = [Variable.numeric(s.export_tag, s.display, label_set, stem=stem) for s in self._statements]
+        variables.extend(Variable.string(f"{s.export_tag}_TEXT", f"{s.display} - Text", stem=stem)
+                         for s in self._statements if s.has_text_entry)
 
-    def variable_names(self) -> List[str]:
-        return [s.export_tag for s in self._statements]
+        return variables, value_label_sets
 
 
 class MultiAnswerMatrixQuestion(MatrixQuestion):
@@ -163,92 +147,35 @@ class MultiAnswerMatrixQuestion(MatrixQuestion):
     def __init__(self, items, **kwargs):
         super().__init__(items, **kwargs)
 
-    def create_spss_code(self, **kwargs) -> str:
-        """
-        returns a string that contains the SPSS syntax which defines the variables associated with the matrix question
-        :param include_declarations: kwarg whether to include statements to declare the variables. Default False
-        :param lbl_include_question: kwarg whether to include base question description in variable labels. Default False
-        :param lbl_include_answer: kwarg whether to include response labels in variable labels. Default False
-        :return: str
-        """
-        include_declarations = kwargs.get('include_declarations', False)
-        lbl_include_question = kwargs.get('lbl_include_question', False)
-        lbl_include_answer = kwargs.get('lbl_include_answer', False)
-
-        # Each cell in the matrix has its own numeric variable which needs to be declared.
-        # Each statement that has text entry has an additional string variable that needs to be declared
-        defs = self.create_spss_variable_declarations() if include_declarations else ''
-
-        # After the variables are declared, they need to be labeled
-        defs += self.create_spss_variable_labels(lbl_include_question=lbl_include_question,
-                                                 lbl_include_answer=lbl_include_answer)
-
-        # Finally add the value labels
-        defs += self.create_spss_value_labels()
-
-        return defs
-
-    @comment_method("Value Labels")
-    def create_spss_variable_labels(self, lbl_include_question=False, lbl_include_answer=False):
-
-        var_labels = self.variable_labels(include_question_text=lbl_include_question, include_answer=lbl_include_answer)
-        var_label_defs = f'\n{tab()}'.join(f"{var_name} '{var_label}'" for var_name, var_label in var_labels.items())
-        defs = f'VARIABLE LABELS\n{tab()}{var_label_defs}.\n'
-        return defs
-
-    @comment_method("Variable Declarations")
-    def create_spss_variable_declarations(self):
-        defs = '\n'.join(f"NUMERIC {s.export_tag}_{a.recode_value} (F40.0)."
-                         for s in self._statements for a in self._answers) + '\n'
-        defs += '\n'.join(f'STRING {s.export_tag}_TEXT (A2000).'
-                          for s in self._statements if s.has_text_entry) + '\n'
-
-        return defs
-
-    def value_labels(self) -> Dict[str, Dict[int, str]]:
+    def _variables_(self):
+        payload = self['Payload']
+        stem = payload['QuestionDescription']
+        name_base = payload['DataExportTag']
 
         # For multi answer matrix questions, each variable has exactly one value label
         # This value label corresponds to the value label of the answer to which the variable corresponds
         # The value for this is always 1
-        value_labels = {f'{s.export_tag}_{a.recode_value}': {1: a.label}
-                        for a in self._answers for s in self._statements}
-
-        return value_labels
-
-    def variable_labels(self, include_question_text=False, include_answer=False) -> Dict[str, str]:
-        var_labels = {}
-
-        # for multi choice matrix questions, value labels are created from
-        # <QuestionDescription> - <Choice.Display> <[VariableNaming|Answer.Display]>
-        # Statements can have text entry, which has its own labeled variable as well
-        for statement in self._statements:  # type: MatrixChoice
-            trunk = f"{self['Payload']['QuestionDescription']} - " if include_question_text else ''
-            var_labels.update({f'{statement.export_tag}_{a.recode_value}':
-                               f'{trunk}{statement.display}{" " + a.label if include_answer else ""}'
-                               for a in self._answers})
-            if statement.has_text_entry:
-                var_labels.update({f'{statement.export_tag}_TEXT': f''})
-
-        return var_labels
-
-    def variable_names(self) -> List[str]:
-        var_names = []
+        value_label_sets = {f'{name_base}_{a.recode_value}': {1: a.label} for a in self._answers}
 
         # For multi choice matrix questions, each cell (combo of question and response) has its own variable
         # Statements can also have a text entry option, which will have its own variable as well
         # variable names are the combination of a statements export tag and the recode value of a response
+        # labels are created from <QuestionDescription> - <Choice.Display> <[VariableNaming|Answer.Display]>
+        variables = []
         for statement in self._statements:  # type: MatrixChoice
-            names = [f'{statement.export_tag}_{a.recode_value}' for a in self._answers]
+            variables.extend(Variable.numeric(f'{statement.export_tag}_{a.recode_value}', statement.display,
+                                              f'{name_base}_{a.recode_value}', stem=stem, answer=a.label)
+                             for a in self._answers)
             if statement.has_text_entry:
-                names.append(f'{statement.export_tag}_TEXT')
-
-            var_names.extend(names)
+                variables.append(Variable.string(f'{statement.export_tag}_TEXT', ''))
 
-        return var_names
+        return variables, value_label_sets
 
 
 class MultiChoiceQuestion(SurveyQuestion):
 
+    _translatable_ = {'_choices': 'Choices'}
+
     def __init__(self, items, **kwargs):
 
         super().__init__(items, **kwargs)
@@ -257,6 +184,8 @@ class MultiChoiceQuestion(SurveyQuestion):
         choices = payload.get('Choices')
         choice_order = payload['ChoiceOrder']
         if len(choices) == 0:
+            self._choices = ()
+            self._has_text_entry = False
             return
 
         # Value recodes, if they exist, are stored in the RecodeValues entry.
@@ -288,64 +217,36 @@ class MultiChoiceQuestion(SurveyQuestion):
 
         self._has_text_entry = any(c.has_text_entry for c in self._choices)
 
-    def create_spss_code(self, **kwargs) -> str:
-        """
-        Emits SPSS code that defines the SPSS variables corresponding to the current instance
-        :param kwargs: keyword arguments. Valid args are include_declarations (bool)
-        :return: str
-        """
-
-        include_declarations = kwargs.get('include_declarations', False)
-
-        # If declarations of variables are desired, include them
-        defs = self.create_spss_variable_declarations() if include_declarations else ''
-
-        defs += self.create_spss_variable_labels()
-
-        defs += self.create_spss_value_labels()
-
-        return defs
-
-    @comment_method("Variable Declarations")
-    def create_spss_variable_declarations(self):
+    def _carry_forward_(self, source):
+        # Choices carried forward from another question are keyed x<choice> in the RecodeValues and VariableNaming of
+        # this question, if they are recoded at all. Otherwise they keep the recode values and text of the source
         payload = self['Payload']
-        name_base = payload['DataExportTag']
-        var_names = f"NUMERIC {name_base} (F40.0).\n"
-        var_names += "\n".join(f"STRING {name_base}_{c.recode_value}_TEXT (A2000)." for c in self._choices
-                               if c.has_text_entry) + '\n'
-
-        return var_names
-
-    @comment_method("Variable labels")
-    def create_spss_variable_labels(self):
-        # add in the variable labels
-        defs = f"VARIABLE LABELS\n{tab()}" + \
-               f"\n{tab()}".join(f"{name} '{label}'" for name, label in self.variable_labels().items()) + '.\n'
-
-        return defs
-
-    def variable_labels(self) -> dict[str, str]:
+        recodes = payload.get('RecodeValues') or {}
+        labels = payload.get('VariableNaming') or {}
+        source_recodes = source.get('RecodeValues') or {}
+        carried = []
+        for key, entry in (source.get('Choices') or {}).items():
+            display = str.replace(entry.get('Display'), "'", "''")
+            carried.append(MCChoice(int(key), display.encode('ascii', errors='ignore').decode(), -1, False,
+                                    int(recodes.get(f"x{key}", source_recodes.get(key, key))),
+                                    str.replace(labels.get(f"x{key}", display), "'", "''") if f"x{key}" in labels
+                                    else display, carried=True))
+        self._choices = tuple(carried) + tuple(self._choices)
+
+    def _variables_(self):
         payload = self['Payload']
         selected_choice = ' - SelectedChoice' if self.has_text_entry else ''
         te_choice = ' - TextEntryChoice - Text' if self.has_text_entry else ''
         label_base = payload['QuestionDescription']
         name_base = payload['DataExportTag']
-        labels = {name_base: f'{label_base}{selected_choice}'}
-        labels.update({f'{name_base}_{c.recode_value}_TEXT': f'{label_base}{te_choice}'
-                       for c in self._choices if c.has_text_entry})
-
-        return labels
 
-    def variable_names(self) -> list[str]:
-        payload = self['Payload']
-        name_base = payload['DataExportTag']
-        variable_names = [name_base] + \
-                         [f'{name_base}_{x.recode_value}_TEXT' for x in self._choices if x.has_text_entry]
-        return variable_names
+        # A single answer MC question has a single numeric variable, plus a string variable for each text entry choice
+        value_label_sets = {name_base: {c.recode_value: c.label for c in self._choices}}
+        variables = [Variable.numeric(name_base, f'{label_base}{selected_choice}', name_base)]
+        variables.extend(Variable.string(f'{name_base}_{c.recode_value}_TEXT', f'{label_base}{te_choice}')
+                         for c in self._choices if c.has_text_entry)
 
-    def value_labels(self) -> Dict[str, Dict[int, str]]:
-        payload = self['Payload']
-        return {payload['DataExportTag']: {c.recode_value: c.label for c in self._choices}}
+        return variables, value_label_sets
 
     @property
     def has_text_entry(self):
@@ -357,52 +258,31 @@ class MultiAnswerMultiChoiceQuestion(MultiChoiceQuestion):
     def __init__(self, items, **kwargs):
         super().__init__(items, **kwargs)
 
-    @comment_method("Variable Declarations")
-    def create_spss_variable_declarations(self) -> str:
-        name_base = self['Payload']['DataExportTag']
-        defs = "\n".join(f"NUMERIC {name_base}_{c.recode_value} (F40.0)." for c in self._choices) + "\n"
-
-        defs += "\n".join(f"STRING {name_base}_{c.recode_value}_TEXT (A2000)."
-                          for c in self._choices if c.has_text_entry) + "\n"
-
-        return defs
-
-    def value_labels(self) -> Dict[str, Dict[int, str]]:
-        payload = self['Payload']
-        name_base = payload['DataExportTag']
-
-        # For multi-answer MC questions, each choice becomes its own variable, and has exactly 1 value label
-        # value label is 1: <choice[variableNaming|display}]>
-        labels = {f'{name_base}_{c.recode_value}': {1: c.label} for c in self._choices}
-
-        return labels
-
-    def variable_labels(self) -> Dict[str, str]:
+    def _variables_(self):
         payload = self['Payload']
         selected_choice = ' - SelectedChoice' if self.has_text_entry else ''
         te_choice = ' - TextEntryChoice - Text' if self.has_text_entry else ''
         label_base = payload['QuestionDescription']
         name_base = payload['DataExportTag']
-        labels = {f'{name_base}_{c.recode_value}': f'{label_base}{selected_choice} {c.label}' for c in self._choices}
-        labels.update({f'{name_base}_{c.recode_value}_TEXT': f'{label_base}{te_choice}'
-                       for c in self._choices if c.has_text_entry})
 
-        return labels
-
-    def variable_names(self) -> List[str]:
-        payload = self['Payload']
-        name_base = payload['DataExportTag']
-        variable_names = []
-        for choice in self._choices:
-            variable_names.append(f'{name_base}_{choice.recode_value}')
+        # For multi-answer MC questions, each choice becomes its own variable, and has exactly 1 value label
+        # value label is 1: <choice[variableNaming|display}]>
+        # Choices carried forward from another question are named for the choice, rather than its recode value
+        names = [f'{name_base}_x{c.value}' if c.carried else f'{name_base}_{c.recode_value}' for c in self._choices]
+        value_label_sets = {name: {1: c.label} for name, c in zip(names, self._choices)}
+        variables = []
+        for name, choice in zip(names, self._choices):
+            variables.append(Variable.numeric(name, f'{label_base}{selected_choice} {choice.label}', name))
             if choice.has_text_entry:
-                variable_names.append(f'{name_base}_{choice.recode_value}_TEXT')
+                variables.append(Variable.string(f'{name_base}_{choice.recode_value}_TEXT', f'{label_base}{te_choice}'))
 
-        return variable_names
+        return variables, value_label_sets
 
 
 class RankOrderQuestion(SurveyQuestion):
 
+    _translatable_ = {'_choices': 'Choices'}
+
     def __init__(self, items, **kwargs):
         super().__init__(items, **kwargs)
 
@@ -423,52 +303,23 @@ class RankOrderQuestion(SurveyQuestion):
                      choice_order=i, has_text_entry=False, recode_value=recodes[key],
                      var_naming=var_naming[key]) for i, key in enumerate(choice_order)]
 
-    def create_spss_code(self, **kwargs) -> str:
-
-        include_declarations = kwargs.get('include_declarations', False)
-        lbl_include_question = kwargs.get('lbl_include_question', False)
-
-        # If declarations are desired, include for both numeric and text questions if they exist
-        defs = self.create_spss_variable_declarations() if include_declarations else ''
-
-        # Construct the syntax for variable labels
-        defs += self.create_spss_variable_labels(lbl_include_question)
-
-        # add value label syntax
-        defs += self.create_spss_value_labels()
-
-        return defs
-
-    @comment_method("Variable Declarations")
-    def create_spss_variable_declarations(self):
-        return '\n'.join(f"NUMERIC {n} (F40.0)." for n in self.variable_names()) + '\n'
-
-    @comment_method("Variable Labels")
-    def create_spss_variable_labels(self, lbl_include_question=False):
-
-        # Each choice in a RO question has a variable label that should be defined
-        var_label_defs = "\n{tab()}".join(
-            f"{name} '{label}'" for name, label in self.variable_labels(lbl_include_question).items()
-        )
-        defs = f"VARIABLE LABELS\n{tab()}{var_label_defs}.\n"
-        return defs
-
-    def value_labels(self) -> Dict[str, Dict[int, str]]:
-        export_tag = self["Payload"]["DataExportTag"]
-        return {f'{export_tag}_{c.recode_value}': {c2.value: str(c2.value) for c2 in self._choices}
-                for c in self._choices}
+    def _variables_(self):
+        payload = self['Payload']
+        export_tag = payload['DataExportTag']
 
-    def variable_names(self) -> List[str]:
-        export_tag = self["Payload"]["DataExportTag"]
-        return [f'{export_tag}_{c.recode_value}' for c in self._choices]
+        # Each choice corresponds to a variable, but all variables have the same value labels in RO question
+        value_label_sets = {export_tag: {c.value: str(c.value) for c in self._choices}}
+        variables = [Variable.numeric(f'{export_tag}_{c.recode_value}', c.var_naming, export_tag,
+                                      stem=payload['QuestionDescription'])
+                     for c in self._choices]
 
-    def variable_labels(self, include_question_text=False) -> Dict[str, str]:
-        stub = f"{self['Payload']['QuestionDescription']} - " if include_question_text else ''
-        return {f'{self["Payload"]["DataExportTag"]}_{c.recode_value}': f"{stub}{c.var_naming}" for c in self._choices}
+        return variables, value_label_sets
 
 
 class SideBySideColumn(SurveyQuestion):
 
+    _translatable_ = {'_choices': 'Choices', '_answers': 'Answers'}
+
     def __init__(self, parent, entry_key, items, **kwargs):
         super().__init__(items, **kwargs)
 
@@ -477,6 +328,7 @@ class SideBySideColumn(SurveyQuestion):
         # Statements are stored in the Choices attribute, other aspects stored in related attributes
         self['Payload'] = {'DataExportTag': f"{parent['Payload']['DataExportTag']}_{entry_key}"}
         p_payload = parent['Payload']
+        self._description = self['QuestionDescription']
         self['QuestionDescription'] = f"{p_payload['QuestionDescription']} - {self['QuestionDescription']}"
         choices = self['Choices']  # type: dict
         choice_order = {c: i for i, c in enumerate(p_payload['ChoiceOrder'])}
@@ -512,73 +364,40 @@ class SideBySideColumn(SurveyQuestion):
             recode_value=recodes[key],
             label=str.replace(labels[key].strip(), "'", "''")) for key, entry in answers.items())
 
-    def _var_declaration_data_(self):
-        return [(c.export_tag, c.has_text_entry,) for c in self._choices]
-
-    def create_spss_code(self, **kwargs) -> str:
-
-        include_declarations = kwargs.get('include_declarations', False)
-        lbl_include_question = kwargs.get('lbl_include_question', False)
-
-        # If declarations are desired, include for both numeric and text questions if they exist
-        defs = self.create_spss_variable_declarations() if include_declarations else ''
-
-        # Construct the syntax for variable labels
-        defs += self.create_spss_variable_labels(lbl_include_question)
-
-        # TextEntry columns have no value labels associated with them
-        defs += self.create_spss_value_labels()
-
-        return defs
-
-    @comment_method("Value Labels")
-    def create_spss_value_labels(self):
-
-        # TextEntry columns have no value labels associated with them
-        if self['Selector'] != 'TE':
-            # Construct the syntax for value labels
-            value_labels = f"\n{tab()}/".join(
-                f"{var_name} {' '.join(f'{value} {chr(39)}{label}{chr(39)}' for value, label in labels.items())}"
-                for var_name, labels in self.value_labels().items()
-            )
-
-            declarations = f"VALUE LABELS\n{tab()}{value_labels}.\n"
-        else:
-            declarations = ''
-
-        return declarations
-
-    @comment_method("Variable Declarations")
-    def create_spss_variable_declarations(self) -> str:
-        var_data = self._var_declaration_data_()
-        type = 'STRING' if self['Selector'] == 'TE' else 'NUMERIC'
-        format = 'A2000' if self['Selector'] == 'TE' else "F40.0"
-        declarations = "\n".join(f"{type} {tag} ({format})." +
-                                 f"{f'{chr(10)}STRING {tag}_TEXT (A2000).' if has_text else ''}"
-                                 for tag, has_text in var_data) + "\n"
-
-        return declarations
-
-    def create_spss_variable_labels(self, lbl_include_question=False):
+    def _translate_column_(self, translation, description) -> 'SideBySideColumn':
+        """
+        Creates a view of this column whose labels are translated
+        :param translation: entry for this column of the Language map of the side-by-side question, which may translate
+        QuestionText, Choices and Answers
+        :param description: translated QuestionDescription of the side-by-side question
+        :return: SideBySideColumn
+        """
+        view = self._view_()
+        text = translation.get('QuestionText')
+        column = self._label_text_(text) \
+            if text is not None and self['Configuration']['QuestionDescriptionOption'] == 'UseText' else self._description
+        view['QuestionDescription'] = f"{description} - {column}"
 
-        # Construct the syntax for variable labels
-        var_labels = f"\n{tab()}".join(f"{var_name} '{var_label}'"
-                                 for var_name, var_label in self.variable_labels(lbl_include_question).items())
-        defs = f"VARIABLE LABELS\n{tab()}{var_labels}.\n"
+        relabel = len(self['VariableNaming']) == 0
+        for attr, section in self._translatable_.items():
+            setattr(view, attr, self._translate_entries_(getattr(self, attr), translation.get(section) or {}, relabel))
 
-        return defs
+        return view
 
-    def value_labels(self) -> Dict[str, Dict[int, str]]:
-        labels = {c.export_tag: {a.recode_value: a.label for a in self._answers} for c in self._choices}
-        return labels
+    def _variables_(self):
+        stem = self['QuestionDescription']
 
-    def variable_labels(self, include_question_text=False):
-        stub = f"{self['QuestionDescription']} - " if include_question_text else ''
-        labels = {c.export_tag: f"{stub}{c.display}" for c in self._choices}
-        return labels
+        # Single answer SBS columns have a single variable per statement, which share the value labels of the column
+        # Plus an additional variable for each statement with text entry option
+        label_set = self['Payload']['DataExportTag']
+        value_label_sets = {label_set: {a.recode_value: a.label for a in self._answers}}
+        variables = []
+        for choice in self._choices:  # type: MatrixChoice
+            variables.append(Variable.numeric(choice.export_tag, choice.display, label_set, stem=stem))
+            if choice.has_text_entry:
+                variables.append(Variable.string(f"{choice.export_tag}_TEXT", f"{choice.display} - Text", stem=stem))
 
-    def variable_names(self) -> List[str]:
-        pass
+        return variables, value_label_sets
 
 
 class MultiAnswerSideBySideColumn(SideBySideColumn):
@@ -586,48 +405,25 @@ class MultiAnswerSideBySideColumn(SideBySideColumn):
     def __init__(self, parent, entry_key, items, **kwargs):
         super().__init__(parent, entry_key, items, **kwargs)
 
-    def _var_declaration_data_(self):
-        return [(f"{c.export_tag}_{a.recode_value}", c.has_text_entry,) for a in self._answers for c in self._choices]
+    def _variables_(self):
+        stem = self['QuestionDescription']
+        column_tag = self['Payload']['DataExportTag']
 
-    def value_labels(self) -> Dict[str, Dict[int, str]]:
-
-        # Text Entry SBS have no value labels associated with them
-        if self['Selector'] == 'TE':
-            labels = {}
-        else:
-            labels = {f"{c.export_tag}_{a.recode_value}": {1: a.label} for a in self._answers for c in self._choices}
-        return labels
-
-    def variable_labels(self, include_question_text=False, include_answer=False) -> Dict[str, str]:
-        var_labels = {}
-
-        # for multi choice matrix questions, value labels are created from
-        # <QuestionDescription> - <Choice.Display> <[VariableNaming|Answer.Display]>
-        # Statements can have text entry, which has its own labeled variable as well
+        # Each cell of a multi answer column has its own variable with exactly 1 value label.
+        # Text Entry SBS columns have string variables with no value labels associated with them
+        is_text = self['Selector'] == 'TE'
+        value_label_sets = {} if is_text else {f"{column_tag}_{a.recode_value}": {1: a.label} for a in self._answers}
+        variables = []
         for choice in self._choices:  # type: MatrixChoice
-            trunk = f"{self['QuestionDescription']} - " if include_question_text else ''
-            var_labels.update({f'{choice.export_tag}_{a.recode_value}':
-                                f'{trunk}{choice.display}{" " + a.label if include_answer else ""}'
-                               for a in self._answers})
+            for a in self._answers:
+                name = f'{choice.export_tag}_{a.recode_value}'
+                variables.append(Variable.string(name, choice.display, stem=stem, answer=a.label) if is_text else
+                                 Variable.numeric(name, choice.display, f"{column_tag}_{a.recode_value}",
+                                                  stem=stem, answer=a.label))
             if choice.has_text_entry:
-                var_labels.update({f'{choice.export_tag}_TEXT': f''})
-
-        return var_labels
+                variables.append(Variable.string(f'{choice.export_tag}_TEXT', ''))
 
-    def variable_names(self) -> List[str]:
-        var_names = []
-
-        # For multi choice matrix questions, each cell (combo of question and response) has its own variable
-        # Statements can also have a text entry option, which will have its own variable as well
-        # variable names are the combination of a statements export tag and the recode value of a response
-        for choice in self._choices:  # type: MatrixChoice
-            names = [f'{choice.export_tag}_{a.recode_value}' for a in self._answers]
-            if choice.has_text_entry:
-                names.append(f'{choice.export_tag}_TEXT')
-
-            var_names.extend(names)
-
-        return var_names
+        return variables, value_label_sets
 
 
 class SideBySideQuestion(SurveyQuestion):
@@ -641,30 +437,21 @@ class SideBySideQuestion(SurveyQuestion):
             else SideBySideColumn(self, key, items=(), **value)
         for key, value in self['Payload']['AdditionalQuestions'].items()}
 
-    def value_labels(self) -> Dict[str, Dict[int, str]]:
-        labels = {}
-        for key, column in self._columns.items():
-            labels.update(column.value_labels())
-
-        return labels
-
-    def create_spss_code(self, **kwargs) -> str:
-        return "\n\n".join(column.create_spss_code(**kwargs)
-                           for key, column in self._columns.items())
+    def _translate_(self, translation):
+        view = super()._translate_(translation)
 
-    def variable_labels(self, include_question_text=False) -> Dict[str, str]:
-        labels = {}
-        for key, column in self._columns.items():
-            labels.update(column.variable_labels(include_question_text=include_question_text))
+        # Statements are translated for the question as a whole, and column headers and answers for each column
+        columns = translation.get('AdditionalQuestions') or {}
+        statements = translation.get('Choices') or {}
+        description = view['Payload']['QuestionDescription']
+        view._columns = {key: column._translate_column_({'Choices': statements, **(columns.get(key) or {})}, description)
+                         for key, column in self._columns.items()}
 
-        return labels
+        return view
 
-    def variable_names(self) -> List[str]:
-        names = []
-        for key, column in self._columns.items():
-            names.extend(column.variable_names())
-
-        return names
+    def _variables_(self):
+        table = VariableTable.concat(column.variable_table() for column in self._columns.values())
+        return table.variables, table.value_label_sets
 
 
 class SliderQuestion(SurveyQuestion):
@@ -672,44 +459,38 @@ class SliderQuestion(SurveyQuestion):
     def __init__(self, items, **kwargs):
         super().__init__(items, **kwargs)
 
-    def create_spss_code(self, **kwargs):
-
-        include_declarations = kwargs.get('include_declarations', False)
-
-        defs = self.create_spss_variable_declarations() if include_declarations else ''
-
-        defs += self.create_spss_variable_labels()
+    def _translate_(self, translation):
+        view = super()._translate_(translation)
 
-        defs += self.create_spss_value_labels()
+        # Slider labels are read from the Choices of the payload rather than from choice structures
+        choices = translation.get('Choices')
+        if choices:
+            payload = view['Payload']
+            view['Payload'] = {**payload, 'Choices': {key: {**value, **(choices.get(key) or {})}
+                                                      for key, value in payload['Choices'].items()}}
 
-        return defs
+        return view
 
-    def create_spss_value_labels(self) -> str:
-        return ''
-
-    @comment_method("Variable Declarations")
-    def create_spss_variable_declarations(self) -> str:
-        var_decs = "\n".join(f"NUMERIC {vn} (F40.0)." for vn in self.variable_names()) + "\n"
-        return var_decs
-
-    @comment_method("Variable Labels")
-    def create_spss_variable_labels(self, lbl_include_question=False) -> str:
-        label_decs = f"\n{tab()}".join(f"{key} '{value}'" for key, value in self.variable_labels(lbl_include_question).items())
-        return f"VARIABLE LABELS\n{tab()}{label_decs}.\n"
+    def _format_(self):
+        # Values of a slider lie between its minimum and maximum, to the number of decimals it is configured with
+        config = self['Payload'].get('Configuration') or {}
+        if config.get('CSSliderMin') is None or config.get('CSSliderMax') is None:
+            return {}
+        decimals = int(config.get('NumDecimals') or 0)
+        width, decimals = numeric_format(f"{float(config[key]):.{decimals}f}" for key in ('CSSliderMin', 'CSSliderMax'))
+        return {'width': width, 'decimals': decimals}
 
-    def value_labels(self) -> Dict[str, Dict[int, str]]:
-        return {}
-
-    def variable_labels(self, include_question_text=False) -> Dict[str, str]:
+    def _variables_(self):
         payload = self['Payload']
-        choices = payload['Choices']
-        stub = f"{payload['QuestionDescription']} - " if include_question_text else ''
-        return {f"{payload['DataExportTag']}_{key}":  f"{stub}{value['Display']}" for key, value in choices.items()}
+        stem = payload['QuestionDescription']
+        size = self._format_()
 
-    def variable_names(self):
-        payload = self['Payload']
-        choices = payload['Choices']
-        return [f"{payload['DataExportTag']}_{key}" for key, value in choices.items()]
+        # Each slider has its own numeric variable, none of which have value labels
+        variables = [Variable.numeric(f"{payload['DataExportTag']}_{key}", str.replace(value['Display'], "'", "''"),
+                                      stem=stem, **size)
+                     for key, value in payload['Choices'].items()]
+
+        return variables, {}
 
 
 class TextEntryQuestion(SurveyQuestion):
@@ -720,39 +501,89 @@ class TextEntryQuestion(SurveyQuestion):
     def value_label_declarations(self):
         return ''
 
-    def value_labels(self) -> Dict[str, Dict[int, str]]:
-        return {}
-
-    def create_spss_code(self, **kwargs):
-
-        include_declarations = kwargs.get('include_declarations', False)
-
-        defs = self.create_spss_variable_declarations() if include_declarations else ''
-
-        defs += self.create_spss_variable_labels()
-
-        defs += self.create_spss_value_labels()
+    def _variables_(self):
+        payload = self['Payload']
+        settings = (payload.get('Validation') or {}).get('Settings') or {}
+        width = self._text_width_(settings) or STRING_WIDTH
+        return [Variable.string(payload['DataExportTag'], payload['QuestionDescription'], width=width)], {}
+
+
+class MetadataQuestion(SurveyQuestion):
+
+    # Columns which Qualtrics records for every response, in the order they appear in a response export
+    _columns_ = (Variable.date('StartDate', 'Start Date'),
+                 Variable.date('EndDate', 'End Date'),
+                 Variable.numeric('Status', 'Response Type', 'Status', width=2),
+                 Variable.string('IPAddress', 'IP Address', width=45),
+                 Variable.numeric('Progress', 'Progress', width=3),
+                 Variable.numeric('Duration__in_seconds_', 'Duration (in seconds)', width=10,
+                                  export_column='Duration (in seconds)'),
+                 Variable.numeric('Finished', 'Finished', 'Finished', width=1),
+                 Variable.date('RecordedDate', 'Recorded Date'),
+                 Variable.string('ResponseId', 'Response ID', width=17),
+                 Variable.string('RecipientLastName', 'Recipient Last Name', width=255),
+                 Variable.string('RecipientFirstName', 'Recipient First Name', width=255),
+                 Variable.string('RecipientEmail', 'Recipient Email', width=255),
+                 Variable.string('ExternalReference', 'External Data Reference', width=255),
+                 Variable.numeric('LocationLatitude', 'Location Latitude', width=11, decimals=6),
+                 Variable.numeric('LocationLongitude', 'Location Longitude', width=11, decimals=6),
+                 Variable.string('DistributionChannel', 'Distribution Channel', width=20),
+                 Variable.string('UserLanguage', 'User Language', width=10))
+
+    _value_labels_ = {'Status': {0: 'IP Address', 1: 'Survey Preview', 2: 'Survey Test', 4: 'Imported', 8: 'Spam',
+                                 9: 'Survey Preview Spam', 12: 'Imported Spam', 16: 'Offline',
+                                 17: 'Offline Survey Preview'},
+                      'Finished': {0: 'False', 1: 'True'}}
+
+    NAMES = frozenset(v.name for v in _columns_)
 
-        return defs
+    def __init__(self, items, **kwargs):
+        super().__init__(items, **kwargs)
 
-    def create_spss_value_labels(self) -> str:
-        return ''
+    def _variables_(self):
+        return list(self._columns_), self._value_labels_
 
-    @comment_method("Variable Declarations")
-    def create_spss_variable_declarations(self) -> str:
-        return "\n".join(f"STRING {vn} (A2000)." for vn in self.variable_names()) + "\n"
 
-    @comment_method("Variable Labels")
-    def create_spss_variable_labels(self):
-        labels = f"\n{tab()}".join(f"{key} '{value}'" for key, value in self.variable_labels().items())
-        return f"VARIABLE LABELS\n{tab()}{labels}.\n"
+class EmbeddedDataQuestion(SurveyQuestion):
 
-    @comment_method("Variable Declarations")
-    def create_spss_variable_declarations(self):
-        return f"STRING {self['Payload']['DataExportTag']} (A2000).\n"
+    # VariableTypes of embedded data fields whose values are numbers or dates. Values of all other types are text
+    _numeric_types_ = ('Scale', 'Number', 'Numeric')
+    _date_types_ = ('Date',)
 
-    def variable_labels(self) -> Dict[str, str]:
-        return {self['Payload']['DataExportTag']: self['Payload']['QuestionDescription']}
+    def __init__(self, items, **kwargs):
+        super().__init__(items, **kwargs)
 
-    def variable_names(self):
-        return [self['Payload']['DataExportTag']]
+    def _variables_(self):
+        naming = self.naming
+        # Fields which set a metadata column, such as RecipientEmail, are recorded in that column
+        fields = [embedded for embedded in self['Payload'].get('EmbeddedData', [])
+                  if embedded['Field'] not in MetadataQuestion.NAMES]
+
+        # Fields whose names are valid are named first, so that they keep their names rather than lose them to fields
+        # which sanitize to the same name. Those are then given distinct names
+        names = {}
+        sanitized = {embedded['Field']: self._sanitize_for_spss_(embedded['Field'], naming=naming,
+                                                                 owner=('EmbeddedData', embedded['Field']))
+                     for embedded in fields}
+        for valid in (True, False):
+            for field, name in sanitized.items():
+                if (name == field) == valid:
+                    names[field] = naming.claim(name, ('EmbeddedData', field))
+
+        variables = []
+        for embedded in fields:
+            field = embedded['Field']
+            name = names[field]
+            # Responses are exported under the name of the field, whatever it is named in SPSS
+            column = field if name != field else None
+
+            label = str.replace(embedded['Field'], "'", "''")
+            kind = embedded.get('VariableType')
+            if kind in self._date_types_:
+                variables.append(Variable.date(name, label, 'SDATE', 10, export_column=column))
+            elif kind in self._numeric_types_:
+                variables.append(Variable.numeric(name, label, export_column=column))
+            else:
+                variables.append(Variable.string(name, label, export_column=column))
+
+        return variables, {}
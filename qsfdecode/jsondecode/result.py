@@ -0,0 +1,68 @@
+from dataclasses import dataclass, field
+from typing import Iterable, List
+import traceback
+
+__all__ = ['QuestionFailure', 'TranslationResult']
+
+
+@dataclass(frozen=True)
+class QuestionFailure:
+    question_id: str
+    export_tag: str
+    error_type: str
+    message: str
+    traceback: str = ''
+
+    @classmethod
+    def from_exception(cls, question, err: BaseException):
+        """
+        QuestionFailure.from_exception(question, err) -> QuestionFailure
+        Records the failure of a question as plain strings, so that it can be pickled and sent between processes
+        :param question: the SurveyQuestion that failed
+        :param err: the exception raised by the question
+        :return: QuestionFailure
+        """
+        payload = question['Payload']
+        return cls(question_id=payload.get('QuestionID'), export_tag=payload.get('DataExportTag'),
+                   error_type=type(err).__name__, message=str(err),
+                   traceback=''.join(traceback.format_exception(type(err), err, err.__traceback__)))
+
+
+@dataclass
+class TranslationResult:
+    emitted: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    failed: List[QuestionFailure] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return len(self.failed) == 0
+
+    @property
+    def failed_ids(self) -> List[str]:
+        return [f.question_id for f in self.failed]
+
+    def extend(self, other: 'TranslationResult') -> 'TranslationResult':
+        """
+        r.extend(other) -> TranslationResult
+        Appends the questions recorded in other to this result
+        :param other: TranslationResult to be appended
+        :return: this TranslationResult
+        """
+        self.emitted.extend(other.emitted)
+        self.skipped.extend(other.skipped)
+        self.failed.extend(other.failed)
+        return self
+
+    @classmethod
+    def combine(cls, results: Iterable['TranslationResult']) -> 'TranslationResult':
+        """
+        TranslationResult.combine(results) -> TranslationResult
+        Aggregates the results of several translations, e.g. those of a batch of surveys run in parallel
+        :param results: iterable of TranslationResult
+        :return: new TranslationResult
+        """
+        combined = cls()
+        for result in results:
+            combined.extend(result)
+        return combined
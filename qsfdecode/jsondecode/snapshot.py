@@ -0,0 +1,103 @@
+from pathlib import Path
+from qsfdecode.jsondecode.survey import Survey
+from typing import Optional, Union
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+
+__all__ = ['save_snapshot', 'load_snapshot', 'load_survey', 'source_hash', 'SNAPSHOT_VERSION']
+
+# Snapshots hold the computed state of question objects, so the version must be incremented whenever that state
+# changes shape. Snapshots of any other version are treated as stale
+SNAPSHOT_VERSION = 1
+
+_MAGIC = b'QSFSNAP\x00'
+_HEADER = struct.Struct('<8sI20sQ')
+
+
+def source_hash(source: Union[str, bytes, Path]) -> bytes:
+    """
+    Returns the SHA-1 digest of the text of a QSF survey definition
+    :param source: text or bytes of the QSF, or the Path of a .qsf file
+    :return: bytes
+    """
+    if isinstance(source, Path):
+        source = source.read_bytes()
+    elif isinstance(source, str):
+        source = source.encode('utf-8')
+    return hashlib.sha1(source).digest()
+
+
+def save_snapshot(survey: Survey, path: Path, source: Union[str, bytes, Path]):
+    """
+    Writes a binary snapshot of a decoded survey, including the computed variable tables of its exported questions
+    :param survey: Survey to be saved
+    :param path: Path through which to write the snapshot
+    :param source: text or bytes of the QSF from which survey was decoded, or the Path of the .qsf file
+    :return: None
+    """
+    for q in survey.exported_questions():
+        try:
+            q.variable_table()
+        except NotImplementedError:
+            pass
+
+    # Questions pickle only their elements and computed structures. The Survey restores their references to itself
+    payload = pickle.dumps(survey._data, protocol=pickle.HIGHEST_PROTOCOL)
+
+    # Write to a temporary file and move it into place, so that readers never see a partial snapshot
+    path = Path(path)
+    temp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with temp.open('wb') as out_file:
+        out_file.write(_HEADER.pack(_MAGIC, SNAPSHOT_VERSION, source_hash(source), len(payload)))
+        out_file.write(payload)
+    os.replace(temp, path)
+
+
+def load_snapshot(path: Path, source: Union[str, bytes, Path] = None) -> Optional[Survey]:
+    """
+    Loads a survey from a snapshot written by save_snapshot. The snapshot is memory-mapped rather than read
+    :param path: Path of the snapshot
+    :param source: text or bytes of the QSF, or the Path of the .qsf file, that the snapshot must have been taken
+    from. Default None (the source is not checked)
+    :return: Survey, or None if the snapshot does not exist, is of another version, or was taken from another source
+    """
+    path = Path(path)
+    if not path.exists() or path.stat().st_size < _HEADER.size:
+        return None
+
+    with path.open('rb') as in_file, mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        magic, version, digest, length = _HEADER.unpack_from(mapped)
+        if magic != _MAGIC:
+            raise ValueError(f"'{path}' is not a survey snapshot")
+        if version != SNAPSHOT_VERSION or (source is not None and digest != source_hash(source)):
+            return None
+
+        with memoryview(mapped) as view:
+            data = pickle.loads(view[_HEADER.size:_HEADER.size + length])
+
+    return Survey(data)
+
+
+def load_survey(source: Union[str, bytes, Path], snapshot_path: Path) -> Survey:
+    """
+    Loads a survey from its snapshot when the snapshot is current, otherwise decodes the QSF and saves a new snapshot
+    :param source: text or bytes of the QSF, or the Path of the .qsf file
+    :param snapshot_path: Path of the snapshot
+    :return: Survey
+    """
+    if isinstance(source, Path):
+        source = source.read_bytes()
+
+    try:
+        survey = load_snapshot(snapshot_path, source)
+    except (ValueError, pickle.UnpicklingError, EOFError):
+        survey = None
+
+    if survey is None:
+        survey = Survey.from_json(source)
+        save_snapshot(survey, snapshot_path, source)
+
+    return survey
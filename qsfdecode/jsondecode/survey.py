@@ -0,0 +1,364 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from qsfdecode.jsondecode.surveyobjectdecoder import SurveyObjectDecoder
+from qsfdecode.jsondecode.abc import SurveyObjectBase, SurveyQuestion
+from qsfdecode.jsondecode.naming import NamingContext
+from qsfdecode.jsondecode.questions import EmbeddedDataQuestion, MetadataQuestion
+from qsfdecode.jsondecode.piping import PipeResolver
+from typing import Iterable, Iterator, List, Mapping, Tuple, Union
+import fnmatch
+import json
+import re
+
+__all__ = ['Survey', 'EmbeddedField', 'FlowBlock', 'extract_blocks', 'flow_blocks', 'flow_fields', 'walk_flow']
+
+
+@dataclass(frozen=True)
+class FlowBlock:
+    """
+    A block which appears in a survey flow, with the FlowIDs of the flow elements which contain it, outermost first
+    """
+    id: str
+    flow_id: str = None
+    path: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class EmbeddedField:
+    """
+    An embedded data field set in a survey flow, with its VariableType (String, Scale, Date, ...) and the FlowID of
+    the EmbeddedData element which first sets it
+    """
+    name: str
+    type: str = 'String'
+    flow_id: str = None
+
+
+def walk_flow(flow) -> Iterator[Tuple[Mapping, Tuple[str, ...]]]:
+    """
+    Walks a survey flow depth first, in the order the flow is presented, without recursion. Every element which contains
+    a nested flow is descended into, whatever its type (Branch, Group, Randomizer, BlockRandomizer, EmbeddedData, ...)
+    :param flow: list of flow elements
+    :return: iterator of (flow element, FlowIDs of the flow elements which contain it, outermost first)
+    """
+    stack = [(iter(flow), ())]
+    while len(stack) > 0:
+        entries, path = stack[-1]
+        entry = next(entries, None)
+        if entry is None:
+            stack.pop()
+            continue
+
+        yield entry, path
+        nested = entry.get('Flow')
+        if nested:
+            stack.append((iter(nested), path + (entry.get('FlowID'),)))
+
+
+def _flow_items_(flow, branches=None) -> Iterator[Union[FlowBlock, EmbeddedField]]:
+    # Blocks and embedded data fields are extracted in the same traversal of the flow. Embedded data is recorded for
+    # every respondent, whichever branch sets it, so only blocks are restricted to branches
+    seen = set()
+    branches = set(branches) if branches is not None else None
+    for entry, path in walk_flow(flow):
+        kind = entry.get('Type')
+        if kind == 'EmbeddedData':
+            for element in entry.get('EmbeddedData') or ():
+                name = element.get('Field') or element.get('Description')
+                if name and ('ED', name) not in seen:
+                    seen.add(('ED', name))
+                    yield EmbeddedField(name, element.get('VariableType') or 'String', entry.get('FlowID'))
+            continue
+
+        if kind not in Survey.BLOCK_TYPES or entry['ID'] in seen:
+            continue
+        if branches is not None and entry.get('FlowID') not in branches and branches.isdisjoint(path):
+            continue
+
+        seen.add(entry['ID'])
+        yield FlowBlock(entry['ID'], entry.get('FlowID'), path)
+
+
+def flow_blocks(flow, branches=None) -> Iterator[FlowBlock]:
+    """
+    Extracts the blocks which appear in a survey flow, in the order they first appear. A block which appears more than
+    once (for example beneath several branches) is extracted once, with the path of its first appearance
+    :param flow: list of flow elements
+    :param branches: FlowIDs of the flow elements whose blocks are to be extracted. A block is extracted if it, or any
+    flow element which contains it, is among branches. Default None (every block in the flow)
+    :return: iterator of FlowBlock
+    """
+    return (item for item in _flow_items_(flow, branches) if isinstance(item, FlowBlock))
+
+
+def flow_fields(flow) -> Iterator[EmbeddedField]:
+    """
+    Extracts the embedded data fields which are set in a survey flow, in the order they are first set
+    :param flow: list of flow elements
+    :return: iterator of EmbeddedField
+    """
+    return (item for item in _flow_items_(flow) if isinstance(item, EmbeddedField))
+
+
+def extract_blocks(flow, branches=None) -> List[str]:
+    """
+    Extracts the IDs of the blocks which appear in a survey flow, in the order they first appear
+    :param flow: list of flow elements
+    :param branches: FlowIDs of the flow elements whose blocks are to be extracted. Default None (every block)
+    :return: list of block IDs
+    """
+    return [block.id for block in flow_blocks(flow, branches)]
+
+
+# Locator of the question from which choices are carried forward, such as q://QID1/ChoiceGroup/SelectedChoices
+_LOCATOR_RE_ = re.compile(r"q://(?P<qid>QID[0-9]+)/")
+
+
+def _pattern_(patterns: Iterable[str]):
+    # Patterns are combined into a single expression, so that each question is matched only once.
+    # No patterns match nothing, as no blocks do, rather than the empty expression that matches everything
+    patterns = list(patterns)
+    if len(patterns) == 0:
+        return re.compile(r'(?!)')
+    return re.compile('|'.join(f'(?:{fnmatch.translate(p)})' for p in patterns))
+
+
+class Survey(object):
+
+    BLOCK_TYPES = ('Standard', 'Block', 'Default')
+
+    def __init__(self, data, naming: NamingContext = None):
+        """
+        Creates a new Survey from a decoded QSF survey definition
+        :param data: QSF data decoded by SurveyObjectDecoder. Data wrapped in the 'result' element of an API response
+        is unwrapped automatically
+        :param naming: NamingContext in which the variable names of the survey are minted and de-duplicated.
+        Default None (a context of the survey's own, in which the metadata columns are reserved)
+        """
+        self._data = data['result'] if 'result' in data else data
+        elements = self._data['SurveyElements']
+
+        self._blocks = next(filter(lambda x: x['Element'] == 'BL', elements))
+        self._flow = next(filter(lambda x: x['Element'] == 'FL', elements))
+        self._questions = OrderedDict((x['Payload']['QuestionID'], x) for x in elements if x['Element'] == 'SQ')
+        self._positions = {x['Payload']['QuestionID']: i for i, x in enumerate(elements) if x['Element'] == 'SQ'}
+        self._pipes = None
+        self._naming = naming if naming is not None else NamingContext(MetadataQuestion.NAMES)
+        self._reserved = False
+
+        blocks = self._blocks['Payload']
+        self._loops = {}
+        for block in (blocks.values() if hasattr(blocks, 'values') else blocks):
+            prefixes = self._loop_prefixes_(block)
+            if len(prefixes) > 0:
+                self._loops.update((x['QuestionID'], prefixes) for x in block.get('BlockElements', [])
+                                   if x['Type'] == 'Question')
+
+        for question in self._questions.values():
+            question.survey = self
+
+        for question in self._questions.values():
+            if isinstance(question, SurveyQuestion):
+                self._expand_(question)
+
+    @classmethod
+    def from_json(cls, data, lazy=False, naming: NamingContext = None):
+        """
+        Survey.from_json(data, lazy=False, naming=None) -> Survey
+        Decodes the text of a QSF survey definition into a new Survey
+        :param data: text that contains json QSF
+        :param lazy: Whether to construct each question only once it is requested, rather than while decoding.
+        Default False
+        :param naming: NamingContext in which the variable names of the survey are minted and de-duplicated.
+        Default None (a context of the survey's own)
+        :return: Survey
+        """
+        return cls(json.loads(data, cls=SurveyObjectDecoder, lazy=lazy), naming=naming)
+
+    def _construct_(self, qid) -> SurveyQuestion:
+        question = self._questions[qid]
+        if isinstance(question, SurveyQuestion):
+            return question
+
+        # The constructed question replaces the element in the survey definition as well
+        question = SurveyObjectDecoder.construct(question)
+        question.survey = self
+        self._expand_(question)
+        self._questions[qid] = question
+        self._data['SurveyElements'][self._positions[qid]] = question
+
+        return question
+
+    def _loop_prefixes_(self, block) -> Tuple[str, ...]:
+        # Loop & Merge blocks repeat their questions once for each row of a static table, or for each choice of a
+        # question. Each repetition is exported with the ID of its row or choice as a prefix
+        options = block.get('Options') or {}
+        settings = options.get('LoopingOptions') or {}
+        if options.get('Looping') == 'Static':
+            return tuple(settings.get('Static') or {})
+        if options.get('Looping') == 'Question':
+            source = self._questions.get(settings.get('QID'))
+            return tuple(source['Payload'].get('Choices') or {}) if source is not None else ()
+        return ()
+
+    def _expand_(self, question: SurveyQuestion):
+        source = None
+        dynamic = question['Payload'].get('DynamicChoices')
+        if isinstance(dynamic, Mapping):
+            locator = _LOCATOR_RE_.match(dynamic.get('Locator', ''))
+            element = self._questions.get(locator['qid']) if locator is not None else None
+            source = element['Payload'] if element is not None else None
+
+        question.expand(self._loops.get(question['Payload']['QuestionID'], ()), source)
+
+    @property
+    def blocks(self) -> SurveyObjectBase:
+        return self._blocks
+
+    @property
+    def flow(self) -> SurveyObjectBase:
+        return self._flow
+
+    @property
+    def naming(self) -> NamingContext:
+        """
+        Context in which the variable names of this survey are minted and de-duplicated
+        """
+        return self._naming
+
+    @property
+    def pipes(self) -> PipeResolver:
+        """
+        Resolver of the piped text in the labels of this survey's questions. Created on first access
+        """
+        if self._pipes is None:
+            self._pipes = PipeResolver(self._questions)
+        return self._pipes
+
+    @property
+    def entry(self) -> SurveyObjectBase:
+        return self._data.get('SurveyEntry')
+
+    def flow_blocks(self) -> List[FlowBlock]:
+        """
+        s.flow_blocks() -> list[FlowBlock]
+        Returns the blocks which appear in the survey flow, in the order they first appear, with their flow paths
+        :return: list
+        """
+        return list(flow_blocks(self._flow['Payload']['Flow']))
+
+    def embedded_fields(self) -> List[EmbeddedField]:
+        """
+        s.embedded_fields() -> list[EmbeddedField]
+        Returns the embedded data fields which are set in the survey flow, in the order they are first set
+        :return: list
+        """
+        return list(flow_fields(self._flow['Payload']['Flow']))
+
+    def _pseudo_question_(self, question_cls, export_tag, text, **payload) -> SurveyQuestion:
+        # Columns which belong to no question are represented by a question of their own, so that they are written by
+        # every output format, and sent to worker processes, in the same way as any other question.
+        # Its QuestionType is one which Qualtrics never uses, so that it cannot be mistaken for a real question
+        question_type = f"_{export_tag}"
+        element = {'SurveyID': self._data.get('SurveyEntry', {}).get('SurveyID'), 'Element': 'SQ',
+                   'PrimaryAttribute': export_tag, 'SecondaryAttribute': text,
+                   'Payload': dict(QuestionID=export_tag, DataExportTag=export_tag, QuestionType=question_type,
+                                   Selector=question_type, QuestionText=text, QuestionDescription=text,
+                                   Configuration={'QuestionDescriptionOption': 'UseText'}, **payload)}
+        question = SurveyObjectDecoder.construct(element, question_cls)
+        question.survey = self
+        return question
+
+    def reserve_question_names(self):
+        """
+        s.reserve_question_names() -> None
+        Reserves the variable names of every exported question in the survey's NamingContext, so that names minted for
+        columns which belong to no question, such as embedded data fields, never take the name of a question variable.
+        Names are reserved only once
+        :return: None
+        """
+        if self._reserved:
+            return
+        self._reserved = True
+
+        for q in self.exported_questions():
+            try:
+                names = q.variable_names()
+            except Exception:
+                # Questions which cannot be described are reported when they are emitted
+                continue
+            self._naming.reserve(names)
+
+    def metadata_question(self) -> SurveyQuestion:
+        """
+        s.metadata_question() -> MetadataQuestion
+        Returns a question whose variables are the columns, such as StartDate and ResponseId, that Qualtrics records
+        for every response ahead of the responses to questions
+        :return: MetadataQuestion
+        """
+        return self._pseudo_question_(MetadataQuestion, 'Metadata', 'Survey metadata')
+
+    def embedded_data_question(self, fields: Iterable[EmbeddedField] = None) -> SurveyQuestion:
+        """
+        s.embedded_data_question(fields=None) -> EmbeddedDataQuestion
+        Returns a question whose variables are the embedded data fields of the survey, which Qualtrics records for
+        every response after the responses to questions
+        :param fields: EmbeddedFields of the question. Default None (the embedded data fields of the survey flow)
+        :return: EmbeddedDataQuestion
+        """
+        fields = self.embedded_fields() if fields is None else fields
+        question = self._pseudo_question_(EmbeddedDataQuestion, 'EmbeddedData', 'Embedded data',
+                                          EmbeddedData=[{'Field': f.name, 'VariableType': f.type} for f in fields])
+
+        # Fields are named once the names of the questions are known, and before the question can be sent to a worker
+        # process, whose NamingContext knows none of them
+        self.reserve_question_names()
+        question.variable_table()
+        return question
+
+    def get_question(self, qid) -> SurveyQuestion:
+        return self._construct_(qid)
+
+    def exported_questions(self, blocks: Iterable[str] = None, branches: Iterable[str] = None,
+                           questions: Iterable[str] = None, metadata=False) -> List[SurveyQuestion]:
+        """
+        s.exported_questions(blocks=None, branches=None, questions=None, metadata=False) -> list[SurveyQuestion]
+        Returns the questions whose responses appear in a response export, in the order they appear in the QSF.
+        Questions are selected before they are constructed, so that a survey decoded with lazy=True constructs only the
+        questions that are returned
+        :param blocks: IDs of the blocks to which to restrict the questions. Default None (all blocks)
+        :param branches: FlowIDs of the flow elements to which to restrict the questions. Default None (entire flow)
+        :param questions: glob patterns, matched against the QuestionID and DataExportTag of each question, to which to
+        restrict the questions. Default None (all questions)
+        :param metadata: Whether to include the metadata columns of the survey, as a MetadataQuestion ahead of the
+        questions, and the embedded data fields of its flow, as an EmbeddedDataQuestion after them. Default False
+        :return: list
+        """
+        # It is possible that questions/blocks can exist in a survey, but not be in the flow
+        # Questions that are not in the flow are not exported, even though they exist
+        # In order to ensure that these questions don't make it into the conversion, process the flow element
+        # to extract only blocks that are in the flow and the associated questions.
+        # Questions in the trash block are excluded by virtue of the trash block never appearing in the flow
+        items = list(_flow_items_(self._flow['Payload']['Flow'], branches))
+        blocks_in_flow = {item.id for item in items if isinstance(item, FlowBlock)}
+        if blocks is not None:
+            blocks_in_flow.intersection_update(blocks)
+
+        payload = self._blocks['Payload']
+        block_payload = payload.values() if hasattr(payload, 'values') else payload
+        questions_in_flow = {x['QuestionID'] for block in block_payload
+                             if block['Type'] in self.BLOCK_TYPES and block['ID'] in blocks_in_flow
+                             for x in block['BlockElements'] if x['Type'] == 'Question'}
+
+        match = _pattern_(questions).match if questions is not None else None
+
+        # Display blocks (QuestionType DB) have no response data associated with them
+        exported = [self._construct_(qid) for qid, q in self._questions.items()
+                    if qid in questions_in_flow and q['Payload']['QuestionType'] != 'DB' and
+                    (match is None or match(qid) or match(q['Payload'].get('DataExportTag', '')))]
+
+        if metadata:
+            fields = [item for item in items if isinstance(item, EmbeddedField)]
+            exported = [self.metadata_question(), *exported, self.embedded_data_question(fields)]
+
+        return exported
@@ -1,6 +1,7 @@
 from qsfdecode.jsondecode.questions import *
 from qsfdecode.jsondecode.abc import SurveyObjectBase, SurveyQuestion
 from collections import OrderedDict
+from qsfdecode.instrumentation import current
 import json
 
 
@@ -17,8 +18,14 @@ class SurveyObjectDecoder(json.JSONDecoder):
     _survey_keys_ = ('SurveyEntry', 'SurveyElements',)
     _multi_answer_selectors = ['MAVR', 'MAHR', 'MACOL', 'MSB', 'MultipleAnswer']
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, lazy=False, **kwargs):
+        """
+        Creates a new SurveyObjectDecoder
+        :param lazy: Whether to leave question elements as SurveyObjectBase, to be constructed by
+        SurveyObjectDecoder.construct once they are needed. Default False
+        """
         hook = self.object_hook if 'object_hook' not in kwargs else kwargs.pop('object_hook')
+        self._lazy = lazy
 
         super().__init__(object_hook=hook, *args, **kwargs)
 
@@ -31,30 +38,59 @@ class SurveyObjectDecoder(json.JSONDecoder):
     def _is_survey_(self, data):
         return all(itm in data for itm in self._survey_keys_)
 
+    @classmethod
+    def question_class(cls, data) -> type:
+        """
+        SurveyObjectDecoder.question_class(data) -> type
+        Determines the class of SurveyQuestion which represents a question element
+        :param data: question element of a QSF survey definition
+        :return: subclass of SurveyQuestion
+        """
+        question_type = data['Payload']['QuestionType']
+        possible_cls = cls._question_map_.get(question_type, SurveyQuestion)
+        if question_type == 'MC':
+            idx = int(data['Payload']['Selector'] in cls._multi_answer_selectors)
+            return possible_cls[idx]
+        elif question_type == 'Matrix':
+            try:
+                idx = int(data['Payload']['SubSelector'] in cls._multi_answer_selectors or
+                          data['Payload']['Selector'] == 'TE')
+            except KeyError:
+                idx = 0
+            return possible_cls[idx]
+
+        return possible_cls
+
+    @classmethod
+    def construct(cls, data, question_cls: type = None) -> SurveyQuestion:
+        """
+        SurveyObjectDecoder.construct(data, question_cls=None) -> SurveyQuestion
+        Constructs the SurveyQuestion which represents a question element
+        :param data: question element of a QSF survey definition
+        :param question_cls: subclass of SurveyQuestion to construct, for elements synthesized rather than read from a
+        QSF. Default None (determined by SurveyObjectDecoder.question_class)
+        :return: SurveyQuestion
+        """
+        question_cls = cls.question_class(data) if question_cls is None else question_cls
+
+        stats = current()
+        if stats is None:
+            return question_cls(data)
+
+        with stats.timer(f'construct.{question_cls.__name__}'):
+            question = question_cls(data)
+        stats.add('questions_decoded')
+
+        return question
+
     def object_hook(self, data):
 
         if self._is_survey_(data):
-            cls = OrderedDict
-        elif self._is_question_(data):
-            question_type = data['Payload']['QuestionType']
-            possible_cls = self._question_map_.get(question_type, SurveyQuestion)
-            if question_type == 'MC':
-                idx = int(data['Payload']['Selector'] in self._multi_answer_selectors)
-                cls = possible_cls[idx]
-            elif question_type == 'Matrix':
-                try:
-                    idx = int(data['Payload']['SubSelector'] in self._multi_answer_selectors or
-                              data['Payload']['Selector'] == 'TE')
-                except KeyError:
-                    idx = 0
-                cls = possible_cls[idx]
-            else:
-                cls = possible_cls
-
-        else:
-            cls = SurveyObjectBase
-        
-        return cls(data)
+            return OrderedDict(data)
+        elif self._is_question_(data) and not self._lazy:
+            return self.construct(data)
+
+        return SurveyObjectBase(data)
 
     def object_pairs_hook(self, data):
         return OrderedDict(data)
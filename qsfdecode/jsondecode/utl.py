@@ -1,7 +1,7 @@
 from itertools import zip_longest
 from typing import Iterable
 
-__all__ = ['chunk']
+__all__ = ['chunk', 'html_text']
 
 
 def chunk(it: Iterable, n: int) -> Iterable:
@@ -14,3 +14,13 @@ def chunk(it: Iterable, n: int) -> Iterable:
 
 def tab(n: int = 1) -> str:
     return "    " * n
+
+
+def html_text(markup: str) -> str:
+    """
+    Extracts the text from HTML markup. BeautifulSoup is imported on first use rather than when the package is imported
+    :param markup: str of HTML
+    :return: str
+    """
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(markup, "lxml").get_text()
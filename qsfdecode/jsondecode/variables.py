@@ -0,0 +1,177 @@
+from dataclasses import dataclass, replace
+from types import MappingProxyType
+from typing import Dict, Iterable, Iterator, Mapping, Tuple
+
+__all__ = ['Variable', 'VariableTable', 'NUMERIC', 'STRING', 'numeric_format', 'raw_label']
+
+NUMERIC = 'NUMERIC'
+STRING = 'STRING'
+
+# Widths of variables about whose values nothing is known
+NUMERIC_WIDTH = 40
+STRING_WIDTH = 2000
+
+
+def raw_label(label: str) -> str:
+    """
+    Returns a label of the variable model as it was written, for outputs other than SPSS syntax. Labels in the model
+    are escaped for SPSS syntax, in which a quote is written as two quotes
+    :param label: label of a variable or of a value
+    :return: str
+    """
+    return label.replace("''", "'")
+
+
+def numeric_format(values: Iterable[str]) -> Tuple[int, int]:
+    """
+    Returns the narrowest width and number of decimals of an F format in which every one of values can be displayed
+    :param values: text of each value, as it is written in a response export, such as '-1' or '2.50'
+    :return: tuple of (width, decimals)
+    """
+    digits, decimals = 1, 0
+    for value in values:
+        whole, _, fraction = value.strip().partition('.')
+        digits = max(digits, len(whole))
+        decimals = max(decimals, len(fraction))
+
+    return digits + (decimals + 1 if decimals > 0 else 0), decimals
+
+
+@dataclass(frozen=True)
+class Variable:
+    name: str
+    label: str
+    value_label_set: str = None
+    type: str = NUMERIC
+    width: int = NUMERIC_WIDTH
+    decimals: int = 0
+    stem: str = ''
+    answer: str = ''
+    date_format: str = None
+    # Name of the column of the variable in a response export, where it is not a valid SPSS name
+    export_column: str = None
+
+    @classmethod
+    def numeric(cls, name, label, value_label_set=None, **kwargs) -> 'Variable':
+        return cls(name, label, value_label_set, NUMERIC, **kwargs)
+
+    @classmethod
+    def string(cls, name, label, width=STRING_WIDTH, **kwargs) -> 'Variable':
+        return cls(name, label, None, STRING, width, **kwargs)
+
+    @classmethod
+    def date(cls, name, label, date_format='DATETIME', width=20, **kwargs) -> 'Variable':
+        # Dates are numeric in SPSS, and differ from other numeric variables only in their format
+        return cls(name, label, None, NUMERIC, width, date_format=date_format, **kwargs)
+
+    def fitted(self, width: int, decimals=0) -> 'Variable':
+        """
+        v.fitted(width, decimals=0) -> Variable
+        Returns a copy of the variable with the width and decimals of the values that it actually holds
+        :param width: width of the widest value, in bytes for strings. 0 if the variable holds no values
+        :param decimals: greatest number of decimals of any value. Ignored for strings
+        :return: Variable, or this variable if it holds no values or is a date
+        """
+        if width < 1 or self.date_format is not None:
+            return self
+        if self.type == STRING:
+            return replace(self, width=width)
+        return replace(self, width=width, decimals=decimals)
+
+    @property
+    def column(self) -> str:
+        return self.export_column if self.export_column is not None else self.name
+
+    @property
+    def format(self) -> str:
+        if self.date_format is not None:
+            return f"{self.date_format}{self.width}"
+        return f"A{self.width}" if self.type == STRING else f"F{self.width}.{self.decimals}"
+
+    def full_label(self, include_question_text=False, include_answer=False) -> str:
+        """
+        v.full_label(include_question_text=False, include_answer=False) -> str
+        Returns the label of the variable, optionally qualified by the question text and the answer text.
+        Variables whose labels are never qualified have an empty stem and answer
+        :param include_question_text: Whether to prefix the label with the question text. Default False
+        :param include_answer: Whether to suffix the label with the answer text. Default False
+        :return: str
+        """
+        stem = f"{self.stem} - " if include_question_text and self.stem else ''
+        answer = f" {self.answer}" if include_answer and self.answer else ''
+        return f"{stem}{self.label}{answer}"
+
+
+class VariableTable(object):
+
+    def __init__(self, variables: Iterable[Variable], value_label_sets: Dict[str, Dict[int, str]] = None):
+        """
+        Creates a new, immutable table of the variables that correspond to a question
+        :param variables: Variables in the order in which they appear in a response dataset
+        :param value_label_sets: dict mapping the ID of a value label set to a dict of value -> label
+        """
+        self._variables = tuple(variables)
+        self._sets = MappingProxyType({key: MappingProxyType(dict(labels))
+                                       for key, labels in (value_label_sets or {}).items()})
+        self._index = {v.name: v for v in self._variables}
+        if len(self._index) < len(self._variables):
+            seen = set()
+            duplicates = sorted({v.name for v in self._variables if v.name in seen or seen.add(v.name)})
+            raise ValueError(f"Variable names must be unique, but {', '.join(duplicates)} occur more than once")
+        self._names = tuple(self._index)
+        self._value_labels = MappingProxyType({v.name: self._sets[v.value_label_set] for v in self._variables
+                                               if v.value_label_set is not None})
+        self._labels = {}
+
+    def __reduce__(self):
+        return VariableTable, (self._variables, {key: dict(labels) for key, labels in self._sets.items()})
+
+    def __iter__(self) -> Iterator[Variable]:
+        return iter(self._variables)
+
+    def __len__(self):
+        return len(self._variables)
+
+    def __getitem__(self, name) -> Variable:
+        return self._index[name]
+
+    def __contains__(self, name):
+        return name in self._index
+
+    @classmethod
+    def concat(cls, tables: Iterable['VariableTable']) -> 'VariableTable':
+        tables = list(tables)
+        sets = {key: labels for table in tables for key, labels in table.value_label_sets.items()}
+        return cls((v for table in tables for v in table), sets)
+
+    @property
+    def variables(self) -> Tuple[Variable, ...]:
+        return self._variables
+
+    @property
+    def names(self) -> Tuple[str, ...]:
+        return self._names
+
+    @property
+    def value_label_sets(self) -> Mapping[str, Mapping[int, str]]:
+        return self._sets
+
+    @property
+    def value_labels(self) -> Mapping[str, Mapping[int, str]]:
+        return self._value_labels
+
+    def labels(self, include_question_text=False, include_answer=False) -> Mapping[str, str]:
+        """
+        t.labels(include_question_text=False, include_answer=False) -> Mapping[str, str]
+        Returns a read-only mapping of variable name to label. Each combination of options is computed only once
+        :param include_question_text: Whether labels include the question text. Default False
+        :param include_answer: Whether labels include the answer text. Default False
+        :return: Mapping
+        """
+        key = (bool(include_question_text), bool(include_answer))
+        labels = self._labels.get(key)
+        if labels is None:
+            labels = MappingProxyType({v.name: v.full_label(*key) for v in self._variables})
+            self._labels[key] = labels
+
+        return labels
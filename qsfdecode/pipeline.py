@@ -0,0 +1,135 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from qsfdecode.jsondecode import Survey, TranslationResult, write_sps
+from typing import Callable, Dict, Iterable, Iterator, Union
+import time
+
+__all__ = ['Pipeline', 'PipelineResult', 'replace']
+
+
+Transform = Callable[[Iterable[str]], Iterable[str]]
+
+
+def replace(old: str, new: str) -> Transform:
+    """
+    Creates a pre-decode transform that replaces every occurrence of old with new in a stream of text chunks.
+    Occurrences that span the boundary between two chunks are replaced as well
+    :param old: substring to be replaced
+    :param new: replacement for old
+    :return: callable which accepts an iterable of str chunks and returns a generator of transformed chunks
+    """
+    keep = len(old) - 1
+
+    def transform(chunks: Iterable[str]) -> Iterator[str]:
+        carry = ''
+        for chunk in chunks:
+            # Every complete occurrence in the buffer is replaced, but the trailing characters that follow the
+            # final occurrence could be the start of an occurrence completed by the next chunk, so hold them back
+            *done, tail = (carry + chunk).split(old)
+            split = max(len(tail) - keep, 0)
+            carry = tail[split:]
+            text = new.join(done + [tail[:split]])
+            if text:
+                yield text
+
+        if carry:
+            yield carry
+
+    return transform
+
+
+@dataclass
+class PipelineResult:
+    survey_id: str
+    path: Path
+    timings: Dict[str, float] = field(default_factory=dict)
+    translation: TranslationResult = None
+
+
+class Pipeline(object):
+
+    def __init__(self, exporter, transforms: Iterable[Transform] = None, prefetch=1, **kwargs):
+        """
+        Creates a new Pipeline which exports survey definitions, decodes them, and writes their SPSS syntax
+        :param exporter: SurveyExporter (or any object with a compatible export_stream method) used to fetch surveys
+        :param transforms: iterable of pre-decode transforms applied, in order, to the text stream of each survey
+        :param prefetch: Number of surveys to fetch ahead of the survey currently being translated. Default 1
+        :param kwargs: keyword arguments passed to write_sps
+        (fail_fast, include_declarations, lbl_include_question, lbl_include_answer)
+        """
+        if prefetch < 0:
+            raise ValueError("prefetch must be a non-negative integer")
+
+        self._exporter = exporter
+        self._transforms = list(transforms) if transforms is not None else []
+        self._prefetch = prefetch
+        self._options = kwargs
+
+    def add_transform(self, transform: Transform):
+        """
+        p.add_transform(transform) -> Pipeline
+        Registers a pre-decode transform to be applied after any transforms already registered
+        :param transform: callable which accepts an iterable of str chunks and returns an iterable of str chunks
+        :return: this Pipeline, so that calls may be chained
+        """
+        self._transforms.append(transform)
+        return self
+
+    def _fetch_(self, survey_id):
+        start = time.perf_counter()
+        chunks = self._exporter.export_stream(survey_id)
+        for transform in self._transforms:
+            chunks = transform(chunks)
+
+        # The stdlib decoder requires the complete document, so this is the only point at which the text is joined
+        text = ''.join(chunks)
+
+        return text, time.perf_counter() - start
+
+    def run(self, survey_ids: Iterable[str], destination: Union[Path, Callable[[str], Path]]) -> Iterator[PipelineResult]:
+        """
+        p.run(survey_ids, destination) -> Iterator[PipelineResult]
+        Translates each survey to SPSS syntax. Surveys are fetched in a background thread while the preceding survey is
+        decoded and translated.
+        :param survey_ids: iterable of IDs of the surveys to be translated
+        :param destination: Directory in which <survey_id>.sps files are to be written,
+        or a callable which returns the output Path for a survey ID
+        :return: generator which yields a PipelineResult as each survey is completed
+        """
+        path_for = destination if callable(destination) else lambda sid: Path(destination) / f"{sid}.sps"
+        ids = iter(survey_ids)
+        pending = deque()
+
+        with ThreadPoolExecutor(max_workers=self._prefetch + 1) as pool:
+            while True:
+                # Keep up to prefetch surveys in flight in addition to the one about to be translated
+                while len(pending) < self._prefetch + 1:
+                    survey_id = next(ids, None)
+                    if survey_id is None:
+                        break
+                    pending.append((survey_id, pool.submit(self._fetch_, survey_id)))
+
+                if len(pending) == 0:
+                    break
+
+                survey_id, future = pending.popleft()
+                start = time.perf_counter()
+                text, fetch_time = future.result()
+                timings = {'fetch': fetch_time, 'wait': time.perf_counter() - start}
+
+                start = time.perf_counter()
+                survey = Survey.from_json(text)
+                del text
+                questions = survey.exported_questions()
+                timings['decode'] = time.perf_counter() - start
+
+                start = time.perf_counter()
+                path = path_for(survey_id)
+                with path.open('w', encoding='utf-8') as out_file:
+                    translation = write_sps(questions, out_file, **self._options)
+                timings['emit'] = time.perf_counter() - start
+                timings['total'] = timings['wait'] + timings['decode'] + timings['emit']
+
+                yield PipelineResult(survey_id, path, timings, translation)
@@ -0,0 +1,345 @@
+from array import array
+from itertools import chain, islice
+from pathlib import Path
+from qsfdecode import constants
+from qsfdecode.jsondecode import Survey
+from qsfdecode.jsondecode.abc import SurveyQuestion
+from qsfdecode.jsondecode.variables import NUMERIC, numeric_format, raw_label
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple, Union
+import csv
+import importlib.util
+import json
+
+__all__ = ['ResponseReader', 'label_responses', 'measure_widths', 'value_label_map']
+
+DELIMITERS = {constants.Format.CSV: ',', constants.Format.TSV: '\t'}
+SUFFIXES = {'.csv': constants.Format.CSV, '.tsv': constants.Format.TSV,
+            '.ndjson': constants.Format.NDJSON, '.jsonl': constants.Format.NDJSON}
+
+# Current Qualtrics exports carry the variable name, question text and ImportId of each column ahead of the first
+# response. Legacy exports carry only the first two
+HEADER_ROWS = 3
+LEGACY_HEADER_ROWS = 2
+_IMPORT_ID = '{"ImportId"'
+_NAN = float('nan')
+
+
+def _is_import_id_row_(row: List[str]) -> bool:
+    return any(cell.startswith(_IMPORT_ID) for cell in row)
+
+
+def _split_header_(records: Iterator[List[str]], header_rows=None):
+    """
+    Reads the header rows from an iterator of delimited records
+    :param records: iterator of records, positioned at the start of a file
+    :param header_rows: Number of header rows. Default None (detected from the ImportId row)
+    :return: tuple of (list of header rows, iterator of the remaining records)
+    """
+    if header_rows is not None:
+        return list(islice(records, header_rows)), records
+
+    peeked = list(islice(records, HEADER_ROWS))
+    header_rows = next((i + 1 for i, row in enumerate(peeked) if i > 0 and _is_import_id_row_(row)),
+                       min(LEGACY_HEADER_ROWS, len(peeked)))
+
+    return peeked[:header_rows], chain(peeked[header_rows:], records)
+
+
+def _numeric_names_(survey: Union[Survey, Iterable[SurveyQuestion]]) -> set:
+    questions = survey.exported_questions() if isinstance(survey, Survey) else (survey or ())
+    numeric = set()
+    for q in questions:
+        try:
+            table = q.variable_table()
+        except NotImplementedError:
+            continue
+        # Dates are stored as numbers in SPSS but exported by Qualtrics as text, so are read as str
+        numeric.update(v.column for v in table if v.type == NUMERIC and v.date_format is None)
+
+    return numeric
+
+
+def _format_(path: Path, format, supported):
+    format = constants.Format(format) if format is not None else SUFFIXES.get(path.suffix.lower())
+    if format not in supported:
+        raise ValueError(f"Unable to read responses from '{path}'. Specify format as one of "
+                         f"{', '.join(str(f) for f in supported)}")
+    return format
+
+
+class ResponseReader(object):
+
+    def __init__(self, path: Path, survey: Union[Survey, Iterable[SurveyQuestion]] = None, format=None,
+                 batch_size=10000, header_rows=None):
+        """
+        Creates a new ResponseReader, which reads a response export in batches of columns.
+        Variables declared NUMERIC by the survey are read into arrays of floats, in which missing values are NaN.
+        All other columns are read as lists of str
+        :param path: Path of a CSV, TSV or NDJSON response export
+        :param survey: decoded Survey, or an iterable of SurveyQuestion objects, whose variable tables determine the
+        type of each column. Default None (every column is read as str)
+        :param format: constants.Format.CSV, TSV or NDJSON. Default None (inferred from the suffix of path)
+        :param batch_size: Number of responses in each batch. Default 10000
+        :param header_rows: Number of rows which precede the first response in a CSV or TSV export.
+        Default None (3 if the export contains a row of ImportIds, otherwise 2)
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be a positive integer")
+
+        self._path = Path(path)
+        self._format = _format_(self._path, format, (*DELIMITERS, constants.Format.NDJSON))
+        self._batch_size = batch_size
+        self._header_rows = header_rows
+        self._headers = None
+        self._columns = None
+
+        self._numeric = _numeric_names_(survey)
+
+    @property
+    def columns(self) -> List[str]:
+        """
+        Names of the columns in each batch. Available once the first batch has been read
+        """
+        return self._columns
+
+    @property
+    def headers(self) -> List[List[str]]:
+        """
+        Header rows of a CSV or TSV export. Available once the first batch has been read
+        """
+        return self._headers
+
+    def is_numeric(self, name) -> bool:
+        return name in self._numeric
+
+    def __iter__(self) -> Iterator[Dict[str, Sequence]]:
+        if self._format == constants.Format.NDJSON:
+            return self._read_ndjson_()
+        return self._read_delimited_()
+
+    def _parse_(self, name, values: Iterable[str]) -> Sequence:
+        if name not in self._numeric:
+            return list(values)
+
+        try:
+            return array('d', (float(value) if value != '' else _NAN for value in values))
+        except ValueError as err:
+            raise ValueError(f"Column {name} of '{self._path}' is declared NUMERIC but contains {err}") from err
+
+    def _records_(self, records: Iterator[Sequence[str]]) -> Iterator[Sequence[str]]:
+        # Blank lines are skipped, and records cut short are padded with missing values, so that transposing a batch
+        # never truncates it to its shortest record
+        width = len(self._columns)
+        for i, record in enumerate(records, 1):
+            if len(record) == 0:
+                continue
+            if len(record) < width:
+                record = list(record) + [''] * (width - len(record))
+            elif len(record) > width:
+                raise ValueError(f"Response {i} of '{self._path}' has {len(record)} values, but there are {width} "
+                                 "columns")
+            yield record
+
+    def _batches_(self, records: Iterator[Sequence[str]]) -> Iterator[Dict[str, Sequence]]:
+        records = self._records_(records)
+        while True:
+            chunk = list(islice(records, self._batch_size))
+            if len(chunk) == 0:
+                return
+
+            # Transpose the chunk so that each column is converted as a whole
+            data = zip(*chunk)
+            yield {name: self._parse_(name, values) for name, values in zip(self._columns, data)}
+
+    def _read_delimited_(self):
+        delimiter = DELIMITERS[self._format]
+        with self._path.open(encoding='utf-8-sig', newline='') as reader:
+            self._headers, records = _split_header_(csv.reader(reader, delimiter=delimiter), self._header_rows)
+            self._columns = self._headers[0] if len(self._headers) > 0 else []
+            yield from self._batches_(records)
+
+    def _responses_(self) -> Iterator[dict]:
+        with self._path.open(encoding='utf-8-sig') as reader:
+            responses = (json.loads(line) for line in reader if line.strip() != '')
+            # Qualtrics nests the recorded values of a response beneath 'values'
+            yield from (response.get('values', response) for response in responses)
+
+    def _read_ndjson_(self):
+        self._headers = []
+
+        # Qualtrics omits the values of unanswered questions, so the columns are the keys of every response, in the
+        # order in which they first appear, and must be collected before the first batch
+        columns = {}
+        for response in self._responses_():
+            columns.update(dict.fromkeys(response))
+        self._columns = list(columns)
+
+        records = (tuple(self._cell_(response.get(name)) for name in self._columns) for response in self._responses_())
+        yield from self._batches_(records)
+
+    @staticmethod
+    def _cell_(value) -> str:
+        if value is None:
+            return ''
+        if isinstance(value, str):
+            return value
+        return json.dumps(value) if isinstance(value, (list, dict)) else str(value)
+
+
+def measure_widths(path: Path, survey: Union[Survey, Iterable[SurveyQuestion]] = None, format=None, batch_size=10000,
+                   header_rows=None) -> Dict[str, Tuple[int, int]]:
+    """
+    Measures the widest value of each column of a response export, to which the declared widths of variables can be
+    fitted with Variable.fitted. Values are measured as text, so no column is converted
+    :param path: Path of a CSV, TSV or NDJSON response export, exported without useLabels
+    :param survey: decoded Survey, or an iterable of SurveyQuestion objects, whose variable tables determine which
+    columns are numeric. Default None (every column is measured as a string)
+    :param format: constants.Format.CSV, TSV or NDJSON. Default None (inferred from the suffix of path)
+    :param batch_size: Number of responses to read at a time. Default 10000
+    :param header_rows: Number of rows which precede the first response in a CSV or TSV export.
+    Default None (3 if the export contains a row of ImportIds, otherwise 2)
+    :return: dict mapping column name to (width, decimals). The width of a string is in bytes of UTF-8, and is 0 for a
+    column with no values
+    """
+    numeric = _numeric_names_(survey)
+    widths: Dict[str, int] = {}
+    # The integer digits and decimals of a numeric column may be widest in different batches, so are kept apart
+    digits: Dict[str, Tuple[int, int]] = {}
+    for batch in ResponseReader(path, format=format, batch_size=batch_size, header_rows=header_rows):
+        for name, values in batch.items():
+            if name in numeric:
+                present = [value for value in values if value != '']
+                if len(present) > 0:
+                    width, decimals = numeric_format(present)
+                    whole, fraction = digits.get(name, (0, 0))
+                    digits[name] = max(whole, width - (decimals + 1 if decimals > 0 else 0)), max(fraction, decimals)
+                widths.setdefault(name, 0)
+            else:
+                widths[name] = max(widths.get(name, 0), max((len(value.encode('utf-8')) for value in values), default=0))
+
+    for name, (whole, fraction) in digits.items():
+        widths[name] = whole + (fraction + 1 if fraction > 0 else 0)
+
+    return {name: (width, digits.get(name, (0, 0))[1]) for name, width in widths.items()}
+
+
+def value_label_map(questions: Iterable[SurveyQuestion]) -> Dict[str, Dict[str, str]]:
+    """
+    Collects the value labels of each variable, keyed by the values as they appear in a delimited response file
+    :param questions: iterable of SurveyQuestion objects
+    :return: dict mapping the column of each variable in a response file to dict of raw value -> label
+    """
+    mapping = {}
+    for q in questions:
+        try:
+            table = q.variable_table()
+        except NotImplementedError:
+            continue
+
+        # Questions share a single value label set among many variables, so convert each set only once
+        converted = {}
+        value_labels = table.value_labels
+        for v in table:
+            labels = value_labels.get(v.name)
+            if labels is None:
+                continue
+            key = id(labels)
+            if key not in converted:
+                converted[key] = {str(value): raw_label(label) for value, label in labels.items()}
+            mapping[v.column] = converted[key]
+
+    return mapping
+
+
+def _label_pandas_(path: Path, format, header_rows, mappings, out_file, chunk_size):
+    import numpy
+    import pandas
+
+    delimiter = DELIMITERS[format]
+    with path.open(encoding='utf-8-sig', newline='') as reader:
+        headers, _ = _split_header_(csv.reader(reader, delimiter=delimiter), header_rows)
+
+    rows = 0
+    csv.writer(out_file, delimiter=delimiter).writerows(headers)
+    header = headers[0] if len(headers) > 0 else []
+
+    with path.open(encoding='utf-8-sig', newline='') as reader:
+        # Header cells may contain line breaks, so the header is skipped by record rather than by line
+        for _ in islice(csv.reader(reader, delimiter=delimiter), len(headers)):
+            pass
+
+        chunks = pandas.read_csv(reader, sep=delimiter, header=None, names=header, dtype=str, keep_default_na=False,
+                                 chunksize=chunk_size)
+        for chunk in chunks:
+            for name, labels in mappings.items():
+                if name not in chunk:
+                    continue
+                # Each distinct value in a column is looked up only once, then labels are gathered for the column
+                codes, uniques = pandas.factorize(chunk[name])
+                categories = numpy.array([labels.get(value, value) for value in uniques], dtype=object)
+                chunk[name] = categories[codes]
+
+            # Records end as those written by csv.writer do, so that header rows and responses are alike
+            chunk.to_csv(out_file, sep=delimiter, header=False, index=False, lineterminator='\r\n')
+            rows += len(chunk)
+
+    return rows
+
+
+def _label_python_(path: Path, format, header_rows, mappings, out_file, chunk_size):
+    rows = 0
+    reader = ResponseReader(path, format=format, batch_size=chunk_size, header_rows=header_rows)
+    writer = csv.writer(out_file, delimiter=DELIMITERS[format])
+
+    batches = iter(reader)
+    first = next(batches, None)
+    writer.writerows(reader.headers)
+    for batch in chain((first,), batches) if first is not None else ():
+        for name, labels in mappings.items():
+            if name in batch:
+                get = labels.get
+                batch[name] = [get(value, value) for value in batch[name]]
+
+        writer.writerows(zip(*batch.values()))
+        rows += len(next(iter(batch.values()), ()))
+
+    return rows
+
+
+def label_responses(
+        survey: Union[Survey, Iterable[SurveyQuestion]],
+        in_path: Path,
+        out_path: Path,
+        format=None,
+        header_rows=None,
+        chunk_size=10000,
+        engine=None
+) -> int:
+    """
+    Replaces the recode values in a delimited response export with the value labels of the survey's questions.
+    Header rows are copied unchanged, and values which have no label are left as they are
+    :param survey: decoded Survey, or an iterable of the SurveyQuestion objects whose variables are to be labelled
+    :param in_path: Path of a CSV or TSV response export, exported without useLabels
+    :param out_path: Path through which to write the labelled responses
+    :param format: constants.Format.CSV or constants.Format.TSV. Default None (inferred from the suffix of in_path)
+    :param header_rows: Number of rows which precede the first response. The first of these must contain the
+    variable names. Default None (3 if the export contains a row of ImportIds, otherwise 2)
+    :param chunk_size: Number of responses to label at a time. Default 10000
+    :param engine: 'pandas' to label columns with pandas, 'python' to label columns with the standard library.
+    Default None (pandas if it is installed, otherwise python)
+    :return: number of responses labelled
+    """
+    in_path, out_path = Path(in_path), Path(out_path)
+    format = _format_(in_path, format, DELIMITERS)
+    questions = survey.exported_questions() if isinstance(survey, Survey) else survey
+    mappings = value_label_map(questions)
+
+    if engine is None:
+        engine = 'pandas' if importlib.util.find_spec('pandas') is not None else 'python'
+
+    label = {'pandas': _label_pandas_, 'python': _label_python_}.get(engine)
+    if label is None:
+        raise ValueError(f"Unknown engine '{engine}'. Specify engine as one of pandas, python")
+
+    with out_path.open('w', encoding='utf-8', newline='') as out_file:
+        return label(in_path, format, header_rows, mappings, out_file, chunk_size)
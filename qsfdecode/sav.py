@@ -0,0 +1,448 @@
+from datetime import datetime
+from itertools import chain
+from pathlib import Path
+from qsfdecode.jsondecode import Survey
+from qsfdecode.jsondecode.variables import Variable, NUMERIC, raw_label
+from qsfdecode.responses import ResponseReader, measure_widths
+from typing import BinaryIO, Dict, Iterable, List, Mapping, Sequence
+import math
+import re
+import struct
+import zlib
+
+__all__ = ['SavWriter', 'translate_to_sav', 'UNCOMPRESSED', 'BYTECODE', 'ZLIB']
+
+UNCOMPRESSED = None
+BYTECODE = 'bytecode'
+ZLIB = 'zlib'
+_COMPRESSION_CODES = {UNCOMPRESSED: 0, BYTECODE: 1, ZLIB: 2}
+
+_BIAS = 100
+_SYSMIS = -1.7976931348623157e308
+_HIGHEST = 1.7976931348623157e308
+_LOWEST = struct.unpack('<d', bytes.fromhex('feffffffffffefff'))[0]
+
+# Strings wider than 255 bytes are stored as a run of 255 byte segments, each of which carries 255 bytes of the value
+# but is counted as holding only 252 when the number of segments is computed
+_MAX_SHORT_STRING = 255
+_EFFECTIVE_SEGMENT = 252
+_MAX_LABEL = 255
+_MAX_VALUE_LABEL = 120
+_ZLIB_BLOCK = 0x3ff000
+
+_FMT_A = 1
+_FMT_F = 5
+_NCASES_OFFSET = 80
+_SHORT_NAME_RE = re.compile(r'[^A-Z0-9]')
+
+
+def _truncate_(text: str, size: int) -> bytes:
+    # Truncating by bytes may split a multi-byte character, which is then dropped
+    return text.encode('utf-8')[:size].decode('utf-8', errors='ignore').encode('utf-8')
+
+
+def _pad_(data: bytes, size: int, fill=b' ') -> bytes:
+    return data + fill * (size - len(data))
+
+
+def _segments_(width: int) -> List[int]:
+    """
+    Returns the declared width of each segment of a string variable of the specified width
+    """
+    if width <= _MAX_SHORT_STRING:
+        return [width]
+
+    n = (width + _EFFECTIVE_SEGMENT - 1) // _EFFECTIVE_SEGMENT
+    return [_MAX_SHORT_STRING] * (n - 1) + [width - (n - 1) * _EFFECTIVE_SEGMENT]
+
+
+def _slots_(width: int) -> int:
+    return (width + 7) // 8
+
+
+class _Column(object):
+
+    def __init__(self, variable: Variable, short_names: List[str]):
+        self.variable = variable
+        self.numeric = variable.type == NUMERIC
+        self.width = 8 if self.numeric else min(variable.width, 32767)
+        self.segments = [8] if self.numeric else _segments_(self.width)
+        self.short_names = short_names
+        # Bytes that each segment holds, and bytes that each segment occupies in a case
+        self.used = [min(w, _MAX_SHORT_STRING) for w in self.segments]
+        self.storage = [_slots_(w) * 8 for w in self.segments]
+
+    def encode_string(self, value) -> bytes:
+        data = _truncate_('' if value is None else str(value), self.width)
+        if len(self.segments) == 1:
+            return _pad_(data, self.storage[0])
+
+        parts, offset = [], 0
+        for used, storage in zip(self.used, self.storage):
+            parts.append(_pad_(data[offset:offset + used], storage))
+            offset += used
+        return b''.join(parts)
+
+
+class _BytecodeCompressor(object):
+
+    def __init__(self, write):
+        self._write = write
+        self._commands = bytearray()
+        self._data = bytearray()
+
+    def _emit_(self, command, data=b''):
+        self._commands.append(command)
+        self._data += data
+        if len(self._commands) == 8:
+            self._write(bytes(self._commands) + bytes(self._data))
+            self._commands.clear()
+            self._data.clear()
+
+    def number(self, value):
+        if value is None or math.isnan(value):
+            self._emit_(255)
+        elif value.is_integer() and -_BIAS < value < 252 - _BIAS:
+            self._emit_(int(value) + _BIAS)
+        else:
+            self._emit_(253, struct.pack('<d', value))
+
+    def _spaces_(self, n):
+        while n > 0:
+            take = min(n, 8 - len(self._commands))
+            self._commands += b'\xfe' * take
+            n -= take
+            if len(self._commands) == 8:
+                self._write(bytes(self._commands) + bytes(self._data))
+                self._commands.clear()
+                self._data.clear()
+
+    def string(self, data: bytes):
+        # Text entry variables are wide and mostly blank, so trailing blank slots are emitted as a run
+        content = _slots_(len(data.rstrip(b' ')))
+        for i in range(0, content * 8, 8):
+            chunk = data[i:i + 8]
+            if chunk == b'        ':
+                self._emit_(254)
+            else:
+                self._emit_(253, chunk)
+        self._spaces_(len(data) // 8 - content)
+
+    def flush(self):
+        if len(self._commands) > 0:
+            self._write(bytes(self._commands).ljust(8, b'\x00') + bytes(self._data))
+            self._commands.clear()
+            self._data.clear()
+
+
+class _ZlibBlocks(object):
+
+    def __init__(self, out_file: BinaryIO):
+        self._out = out_file
+        self._buffer = bytearray()
+        self._blocks = []
+        self._uncompressed_ofs = 0
+
+    def write(self, data: bytes):
+        self._buffer += data
+        while len(self._buffer) >= _ZLIB_BLOCK:
+            self._compress_(bytes(self._buffer[:_ZLIB_BLOCK]))
+            del self._buffer[:_ZLIB_BLOCK]
+
+    def _compress_(self, block: bytes):
+        compressed = zlib.compress(block)
+        self._blocks.append((self._uncompressed_ofs, self._out.tell(), len(block), len(compressed)))
+        self._uncompressed_ofs += len(block)
+        self._out.write(compressed)
+
+    def close(self, zheader_ofs):
+        if len(self._buffer) > 0:
+            self._compress_(bytes(self._buffer))
+            self._buffer.clear()
+
+        ztrailer_ofs = self._out.tell()
+        self._out.write(struct.pack('<qqii', -_BIAS, 0, _ZLIB_BLOCK, len(self._blocks)))
+        for uncompressed_ofs, compressed_ofs, uncompressed_size, compressed_size in self._blocks:
+            # Uncompressed offsets are those the data would have in an equivalent bytecode compressed file
+            self._out.write(struct.pack('<qqii', zheader_ofs + uncompressed_ofs, compressed_ofs,
+                                        uncompressed_size, compressed_size))
+
+        return ztrailer_ofs, self._out.tell() - ztrailer_ofs
+
+
+class SavWriter(object):
+
+    def __init__(self, path: Path, variables: Iterable[Variable], value_labels: Mapping[str, Mapping] = None,
+                 labels: Mapping[str, str] = None, compression=BYTECODE, file_label=''):
+        """
+        Creates a new SavWriter, which writes an SPSS system file (.sav) one case at a time.
+        The dictionary is written immediately and the number of cases is recorded when the writer is closed
+        :param path: Path through which to write the file
+        :param variables: Variables of the file, in order
+        :param value_labels: dict mapping variable name to dict of value -> label. Labels of string variables are
+        not written. Default None
+        :param labels: dict mapping variable name to variable label. Default None (the label of each Variable)
+        :param compression: UNCOMPRESSED, BYTECODE or ZLIB (.zsav). Default BYTECODE
+        :param file_label: Label of the file. Default ''
+        """
+        if compression not in _COMPRESSION_CODES:
+            raise ValueError(f"Unknown compression '{compression}'. Specify compression as one of "
+                             f"{', '.join(str(c) for c in _COMPRESSION_CODES)}")
+
+        self._columns = self._columns_(variables)
+        if len(self._columns) == 0:
+            raise ValueError("A system file must contain at least one variable")
+
+        self._compression = compression
+        self._ncases = 0
+        self._path = Path(path)
+        self._out = self._path.open('wb')
+        self._zlib = None
+        self._zheader_ofs = None
+
+        try:
+            self._write_dictionary_(value_labels or {}, labels, file_label)
+        except BaseException:
+            self._out.close()
+            raise
+
+        if compression == ZLIB:
+            self._zheader_ofs = self._out.tell()
+            self._out.write(struct.pack('<qqq', 0, 0, 0))
+            self._zlib = _ZlibBlocks(self._out)
+            self._compressor = _BytecodeCompressor(self._zlib.write)
+        elif compression == BYTECODE:
+            self._compressor = _BytecodeCompressor(self._out.write)
+        else:
+            self._compressor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def ncases(self) -> int:
+        return self._ncases
+
+    @staticmethod
+    def _columns_(variables: Iterable[Variable]) -> List[_Column]:
+        columns, used = [], set()
+
+        def short_name(name):
+            candidate = _SHORT_NAME_RE.sub('', name.upper())[:8]
+            if candidate == '' or not candidate[0].isalpha() or candidate in used:
+                i = len(used) + 1
+                while f"V{i}" in used:
+                    i += 1
+                candidate = f"V{i}"
+            used.add(candidate)
+            return candidate
+
+        for v in variables:
+            n = 1 if v.type == NUMERIC else len(_segments_(min(v.width, 32767)))
+            names = [short_name(v.name)] + [short_name(f"{v.name[:5]}{i}") for i in range(1, n)]
+            columns.append(_Column(v, names))
+
+        return columns
+
+    def _write_dictionary_(self, value_labels, labels, file_label):
+        out = self._out
+        now = datetime.now()
+        nominal_case_size = sum(_slots_(w) for c in self._columns for w in c.segments)
+
+        out.write(b'$FL3' if self._compression == ZLIB else b'$FL2')
+        out.write(_pad_(b'@(#) SPSS DATA FILE qsfdecode', 60))
+        out.write(struct.pack('<iiiii', 2, nominal_case_size, _COMPRESSION_CODES[self._compression], 0, -1))
+        out.write(struct.pack('<d', float(_BIAS)))
+        out.write(now.strftime('%d %b %y').encode('ascii'))
+        out.write(now.strftime('%H:%M:%S').encode('ascii'))
+        out.write(_pad_(_truncate_(file_label, 64), 64))
+        out.write(b'\x00' * 3)
+
+        # Value labels refer to variables by the 1-based index of their first slot within a case
+        indexes, index = {}, 1
+        for c in self._columns:
+            indexes[c.variable.name] = index
+            label = labels.get(c.variable.name, c.variable.label) if labels is not None else c.variable.label
+            for i, (short_name, width) in enumerate(zip(c.short_names, c.segments)):
+                self._write_variable_(short_name, 0 if c.numeric else width, label if i == 0 else None,
+                                      (_FMT_F, min(c.variable.width, 40), c.variable.decimals) if c.numeric
+                                      else (_FMT_A, width, 0))
+                index += _slots_(width)
+
+        for c in self._columns:
+            var_value_labels = value_labels.get(c.variable.name) if c.numeric else None
+            if var_value_labels:
+                self._write_value_labels_(var_value_labels, indexes[c.variable.name])
+
+        # Machine integer info: version, machine code, IEEE 754 floats, compression, little-endian, UTF-8
+        self._write_extension_(3, 4, struct.pack('<8i', 1, 0, 0, -1, 1, 1, 2, 65001))
+        self._write_extension_(4, 8, struct.pack('<3d', _SYSMIS, _HIGHEST, _LOWEST))
+        self._write_extension_(13, 1, '\t'.join(f"{c.short_names[0]}={c.variable.name}"
+                                                for c in self._columns).encode('utf-8'))
+        very_long = ''.join(f"{c.short_names[0]}={c.width:05d}\x00\t" for c in self._columns if len(c.segments) > 1)
+        if very_long:
+            self._write_extension_(14, 1, very_long.encode('utf-8'))
+        self._write_extension_(20, 1, b'UTF-8')
+
+        out.write(struct.pack('<ii', 999, 0))
+
+    def _write_variable_(self, short_name, type_, label, format_):
+        fmt = (format_[0] << 16) | (format_[1] << 8) | format_[2]
+        self._out.write(struct.pack('<iiiiii', 2, type_, 1 if label else 0, 0, fmt, fmt))
+        self._out.write(_pad_(short_name.encode('ascii'), 8))
+        if label:
+            data = _truncate_(label, _MAX_LABEL)
+            self._out.write(struct.pack('<i', len(data)))
+            self._out.write(_pad_(data, (len(data) + 3) // 4 * 4))
+
+        # String variables wider than 8 bytes occupy one continuation record per additional slot
+        for _ in range(_slots_(type_) - 1):
+            self._out.write(struct.pack('<iiiiii', 2, -1, 0, 0, 0, 0))
+            self._out.write(b' ' * 8)
+
+    def _write_value_labels_(self, value_labels: Mapping, index: int):
+        entries = []
+        for value, label in value_labels.items():
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+            data = _truncate_(str(label), _MAX_VALUE_LABEL)
+            entries.append(struct.pack('<d', value) + _pad_(bytes([len(data)]) + data, (len(data) + 8) // 8 * 8))
+
+        if len(entries) == 0:
+            return
+
+        self._out.write(struct.pack('<ii', 3, len(entries)))
+        self._out.write(b''.join(entries))
+        self._out.write(struct.pack('<iii', 4, 1, index))
+
+    def _write_extension_(self, subtype, size, data: bytes):
+        self._out.write(struct.pack('<iiii', 7, subtype, size, len(data) // size))
+        self._out.write(data)
+
+    def write_row(self, row: Sequence):
+        """
+        w.write_row(row) -> None
+        Writes a single case. Missing numeric values may be None or NaN
+        :param row: sequence of values, one per variable, in the order in which the variables were specified
+        :return: None
+        """
+        compressor = self._compressor
+        if compressor is None:
+            data = []
+            for c, value in zip(self._columns, row):
+                if c.numeric:
+                    data.append(struct.pack('<d', _SYSMIS if value is None or math.isnan(value) else value))
+                else:
+                    data.append(c.encode_string(value))
+            self._out.write(b''.join(data))
+        else:
+            for c, value in zip(self._columns, row):
+                if c.numeric:
+                    compressor.number(None if value is None else float(value))
+                else:
+                    compressor.string(c.encode_string(value))
+
+        self._ncases += 1
+
+    def write_rows(self, rows: Iterable[Sequence]):
+        """
+        w.write_rows(rows) -> None
+        Writes each of rows as a case. Rows may be supplied lazily
+        :param rows: iterable of sequences of values
+        :return: None
+        """
+        for row in rows:
+            self.write_row(row)
+
+    def close(self):
+        """
+        w.close() -> None
+        Completes the file, recording the number of cases in its header
+        :return: None
+        """
+        if self._out.closed:
+            return
+
+        try:
+            if self._compressor is not None:
+                self._compressor.flush()
+
+            if self._zlib is not None:
+                ztrailer_ofs, ztrailer_len = self._zlib.close(self._zheader_ofs)
+                self._out.seek(self._zheader_ofs)
+                self._out.write(struct.pack('<qqq', self._zheader_ofs, ztrailer_ofs, ztrailer_len))
+
+            self._out.seek(_NCASES_OFFSET)
+            self._out.write(struct.pack('<i', self._ncases))
+        finally:
+            self._out.close()
+
+
+def translate_to_sav(
+        data,
+        responses: Path,
+        path: Path,
+        compression=BYTECODE,
+        format=None,
+        batch_size=10000,
+        string_width=255,
+        lbl_include_question=False,
+        lbl_include_answer=False,
+        fit_widths=False
+) -> int:
+    """
+    Writes an SPSS system file directly from a response export and the variables of a QSF survey definition,
+    without the need to run syntax in SPSS. Responses are streamed, so memory use does not grow with their number
+    :param data: text that contains json QSF, or an already decoded Survey
+    :param responses: Path of a CSV, TSV or NDJSON response export, exported without useLabels
+    :param path: Path through which to write the system file
+    :param compression: UNCOMPRESSED, BYTECODE or ZLIB (.zsav). Default BYTECODE
+    :param format: constants.Format of the response export. Default None (inferred from the suffix of responses)
+    :param batch_size: Number of responses to read at a time. Default 10000
+    :param string_width: Width of columns in the export that do not belong to any question, e.g. ResponseId.
+    Default 255
+    :param lbl_include_question: Whether labels of matrix variables should include base question text. Default False
+    :param lbl_include_answer: Whether labels of matrix variables should include answer text. Default False
+    :param fit_widths: Whether to read the responses twice, narrowing each variable to its widest value before the
+    cases are written. Default False
+    :return: number of cases written
+    """
+    survey = data if isinstance(data, Survey) else Survey.from_json(data)
+    known: Dict[str, Variable] = {}
+    labels, value_labels = {}, {}
+    for q in survey.exported_questions():
+        try:
+            table = q.variable_table()
+        except NotImplementedError:
+            continue
+        known.update((v.column, v) for v in table)
+        # Labels are stored as they are, without the escaping of SPSS syntax. Value label sets are shared among
+        # variables, so each is converted once
+        labels.update((name, raw_label(label))
+                      for name, label in table.labels(lbl_include_question, lbl_include_answer).items())
+        sets = {key: {value: raw_label(label) for value, label in value_label_set.items()}
+                for key, value_label_set in table.value_label_sets.items()}
+        value_labels.update((v.name, sets[v.value_label_set]) for v in table if v.value_label_set in sets)
+
+    reader = ResponseReader(responses, survey, format=format, batch_size=batch_size)
+    batches = iter(reader)
+    first = next(batches, None)
+    columns = reader.columns
+    variables = [known[name] if name in known else Variable.string(name, '', width=string_width)
+                 for name in columns]
+
+    # Strings are stored at their declared width, so narrower strings make a smaller file which is faster to read
+    if fit_widths:
+        widths = measure_widths(responses, survey, format=format, batch_size=batch_size)
+        variables = [v.fitted(*widths[v.column]) if v.column in widths else v for v in variables]
+
+    with SavWriter(path, variables, value_labels, labels, compression=compression) as writer:
+        for batch in chain((first,), batches) if first is not None else ():
+            writer.write_rows(zip(*(batch[name] for name in columns)))
+
+        return writer.ncases
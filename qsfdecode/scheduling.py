@@ -0,0 +1,260 @@
+from contextlib import contextmanager
+from enum import IntEnum
+from heapq import heappush, heapify
+from itertools import count
+from pathlib import Path
+from typing import Optional, Tuple
+import os
+import struct
+import threading
+import time
+
+__all__ = ['Priority', 'TokenBucket', 'RequestScheduler']
+
+# Tokens, and the time at which they were counted, of a bucket shared through a file
+_STATE = struct.Struct('<dd')
+
+# Locks taken by this process, numbered so that each lock file holds a token unique to the lock
+_LOCK_IDS = count()
+
+
+class Priority(IntEnum):
+    # Lower values are served first
+    INTERACTIVE = 0
+    BULK = 10
+
+
+class TokenBucket(object):
+
+    def __init__(self, rate: float, capacity: float = None, path: Path = None, stale_after=5.0):
+        """
+        Creates a new TokenBucket, which allows requests at an average of rate per second, in bursts of up to capacity.
+        A bucket created with a path is shared by every bucket, in any process, created with the same path
+        :param rate: Number of tokens added to the bucket per second
+        :param capacity: Greatest number of tokens the bucket holds. Default None (rate, i.e. one second's worth)
+        :param path: Path of the file through which the bucket is shared. Its state is guarded by a lock file beside
+        it, created exclusively, so no locking primitives beyond those of the file system are required.
+        Default None (the bucket is private to this process)
+        :param stale_after: Age, in seconds, after which a lock file is taken to have been left by a process which
+        died while holding it, and is removed. Default 5.0
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+
+        self._rate = float(rate)
+        self._capacity = float(capacity if capacity is not None else rate)
+        self._path = Path(path) if path is not None else None
+        self._lock_path = self._path.with_name(f"{self._path.name}.lock") if path is not None else None
+        self._stale_after = stale_after
+        self._mutex = threading.Lock()
+        self._state = (self._capacity, time.time())
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    @property
+    def capacity(self) -> float:
+        return self._capacity
+
+    def try_acquire(self, n=1, reserve=0.0) -> float:
+        """
+        b.try_acquire(n=1, reserve=0.0) -> float
+        Takes n tokens from the bucket if, once they are taken, at least reserve tokens remain
+        :param n: Number of tokens to take. Default 1
+        :param reserve: Number of tokens which must be left for other callers, no more than the bucket can hold
+        besides the n taken. Default 0.0
+        :return: 0.0 if the tokens were taken, otherwise the number of seconds until they can be
+        """
+        # A bucket too small to hold the reserve as well as n tokens would otherwise never allow them to be taken
+        reserve = min(reserve, max(0.0, self._capacity - n))
+        with self._locked_():
+            tokens, updated = self._read_()
+            now = time.time()
+            tokens = min(self._capacity, tokens + max(0.0, now - updated) * self._rate)
+            if tokens - n >= reserve:
+                self._write_(tokens - n, now)
+                return 0.0
+
+            self._write_(tokens, now)
+            return (n + reserve - tokens) / self._rate
+
+    def acquire(self, n=1, reserve=0.0, timeout: float = None) -> float:
+        """
+        b.acquire(n=1, reserve=0.0, timeout=None) -> float
+        Waits until n tokens can be taken from the bucket, then takes them
+        :param n: Number of tokens to take. Default 1
+        :param reserve: Number of tokens which must be left for other callers. Default 0.0
+        :param timeout: Greatest number of seconds to wait. Default None (no limit)
+        :return: Number of seconds spent waiting
+        """
+        start = time.monotonic()
+        while True:
+            delay = self.try_acquire(n, reserve)
+            if delay == 0.0:
+                return time.monotonic() - start
+            if timeout is not None and time.monotonic() - start + delay > timeout:
+                raise TimeoutError(f"Unable to acquire {n} tokens within {timeout} seconds")
+            time.sleep(delay)
+
+    def penalize(self, seconds: float):
+        """
+        b.penalize(seconds) -> None
+        Empties the bucket and holds it empty for the specified number of seconds, such as when the server has asked
+        for requests to be retried later. Every process sharing the bucket backs off
+        :param seconds: Number of seconds before tokens are added again
+        :return: None
+        """
+        with self._locked_():
+            tokens, updated = self._read_()
+            self._write_(min(0.0, tokens) - seconds * self._rate, time.time())
+
+    @contextmanager
+    def _locked_(self):
+        with self._mutex:
+            if self._path is None:
+                yield
+                return
+
+            token = self._lock_file_()
+            try:
+                yield
+            finally:
+                # A lock held for so long that it was taken to be stale may since have been taken by another process,
+                # whose lock must not be removed
+                self._remove_lock_(token)
+
+    def _lock_file_(self) -> bytes:
+        token = f"{os.getpid()}:{next(_LOCK_IDS)}".encode('ascii')
+        while True:
+            try:
+                fd = os.open(self._lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                pass
+            else:
+                try:
+                    os.write(fd, token)
+                finally:
+                    os.close(fd)
+                return token
+
+            # The lock is held only while the state is read and written, so a lock much older than that was left by a
+            # process which died while holding it. It is removed only if it is still the lock that was found stale
+            try:
+                held = self._lock_token_()
+                if held is not None and time.time() - os.path.getmtime(self._lock_path) > self._stale_after:
+                    self._remove_lock_(held)
+            except FileNotFoundError:
+                continue
+
+            time.sleep(0.0005)
+
+    def _remove_lock_(self, token: bytes):
+        # The lock file is renamed aside, which only one process can do, before its token is compared, so that a lock
+        # taken by another process between the comparison and the removal is never removed
+        aside = self._lock_path.with_name(f"{self._lock_path.name}.{os.getpid()}.{next(_LOCK_IDS)}")
+        try:
+            os.rename(self._lock_path, aside)
+        except FileNotFoundError:
+            return
+
+        try:
+            if aside.read_bytes() != token:
+                # The lock of another process is put back, unless yet another lock has been taken in the meantime
+                try:
+                    os.link(aside, self._lock_path)
+                except FileExistsError:
+                    pass
+        finally:
+            os.remove(aside)
+
+    def _lock_token_(self) -> Optional[bytes]:
+        try:
+            with open(self._lock_path, 'rb') as lock_file:
+                return lock_file.read()
+        except FileNotFoundError:
+            return None
+
+    def _read_(self) -> Tuple[float, float]:
+        if self._path is None:
+            return self._state
+
+        try:
+            return _STATE.unpack(self._path.read_bytes())
+        except (FileNotFoundError, struct.error):
+            # A bucket which does not exist yet, or was never completely written, starts full
+            return self._capacity, time.time()
+
+    def _write_(self, tokens: float, updated: float):
+        if self._path is None:
+            self._state = (tokens, updated)
+        else:
+            self._path.write_bytes(_STATE.pack(tokens, updated))
+
+
+class RequestScheduler(object):
+
+    def __init__(self, bucket: TokenBucket, bulk_reserve: float = None):
+        """
+        Creates a new RequestScheduler, which admits the requests of the threads of this process in order of priority,
+        each once the bucket allows it. Interactive requests go ahead of every waiting bulk request. Across processes,
+        bulk requests leave bulk_reserve tokens in the bucket, so that interactive requests in other processes are not
+        kept waiting behind them
+        :param bucket: TokenBucket which limits the rate of requests, which may be shared with other processes
+        :param bulk_reserve: Number of tokens that bulk requests leave in the bucket.
+        Default None (a fifth of the capacity of the bucket)
+        """
+        bulk_reserve = bulk_reserve if bulk_reserve is not None else bucket.capacity / 5
+        if bulk_reserve >= bucket.capacity:
+            raise ValueError("bulk_reserve must be less than the capacity of the bucket")
+
+        self._bucket = bucket
+        self._bulk_reserve = bulk_reserve
+        self._condition = threading.Condition()
+        self._queue = []
+        self._tickets = count()
+
+    @property
+    def bucket(self) -> TokenBucket:
+        return self._bucket
+
+    def acquire(self, priority=Priority.INTERACTIVE) -> float:
+        """
+        s.acquire(priority=Priority.INTERACTIVE) -> float
+        Waits until a request of the specified priority may be made
+        :param priority: Priority of the request. Default Priority.INTERACTIVE
+        :return: Number of seconds spent waiting
+        """
+        start = time.monotonic()
+        ticket = (int(priority), next(self._tickets))
+        reserve = self._bulk_reserve if priority >= Priority.BULK else 0.0
+
+        with self._condition:
+            heappush(self._queue, ticket)
+            # Waiters re-examine the head of the queue, so a request of higher priority takes over from one waiting
+            self._condition.notify_all()
+            try:
+                while True:
+                    if self._queue[0] != ticket:
+                        self._condition.wait()
+                        continue
+
+                    delay = self._bucket.try_acquire(1, reserve)
+                    if delay == 0.0:
+                        break
+                    self._condition.wait(delay)
+            finally:
+                self._queue.remove(ticket)
+                heapify(self._queue)
+                self._condition.notify_all()
+
+        return time.monotonic() - start
+
+    def penalize(self, seconds: float):
+        """
+        s.penalize(seconds) -> None
+        Holds back every request, in every process sharing the bucket, for the specified number of seconds
+        :param seconds: Number of seconds
+        :return: None
+        """
+        self._bucket.penalize(seconds)
@@ -1,6 +1,10 @@
 from . import constants
 from . import utils
 from . import exceptions
+from .instrumentation import Stats
+from .scheduling import Priority, RequestScheduler
+from contextlib import nullcontext
+import codecs
 import datetime
 import getpass
 import logging
@@ -13,6 +17,9 @@ import time
 _QDC = 'Q_DATA_CENTER'
 _QAT = 'Q_API_TOKEN'
 
+# Qualtrics answers requests beyond the rate limit of a brand with 429 Too Many Requests
+_TOO_MANY_REQUESTS = 429
+
 
 logging.getLogger('exportclient').addHandler(logging.NullHandler())
 
@@ -24,7 +31,8 @@ class SurveyExporter(object):
                               r'(?P<day>[0-3]((?<=3)[0-1]|(?<=[0-2])[0-9]))' +
                               r'(?P<time>T[0-9]{2}:[0-9]{2}:[0-9]{2}Z)$')
 
-    def __init__(self, data_center=None, token=None, **kwargs):
+    def __init__(self, data_center=None, token=None, stats: Stats = None, scheduler: RequestScheduler = None,
+                 base_url: str = None, max_retries=3, **kwargs):
         """
         Creates a new instance of ExportClient class
         :param data_center: string. Can specify either your qualtrics data center or the OS environment variable at
@@ -33,6 +41,13 @@ class SurveyExporter(object):
         :param token: string. Can specify either your qualtrics API key or the OS environment variable at which
         this data is stored. Optional
         Omittign will cause a search for the OS environment variable 'Q_API_KEY'
+        :param stats: Stats object in which to record request timings and counters. Optional
+        :param scheduler: RequestScheduler which admits each request, so that exporters in several threads or processes
+        share the rate limit of a brand. Time spent waiting is recorded in stats as 'queue_wait'. Optional
+        :param base_url: URL of the API, such as that of a local stand-in server.
+        Default None (https://<data_center>.qualtrics.com/API/v3/)
+        :param max_retries: Number of times a request answered with 429 Too Many Requests is retried, after the delay
+        given by its Retry-After header. Default 3
         :param kwargs:
         """
 
@@ -65,33 +80,95 @@ class SurveyExporter(object):
             "content-type": "application/json",
         }
 
-        self._url_base = f'https://{self._data_center}.qualtrics.com/API/v3/'
+        self._url_base = base_url if base_url is not None else f'https://{self._data_center}.qualtrics.com/API/v3/'
+        if not self._url_base.endswith('/'):
+            self._url_base += '/'
+        self._stats = stats
+        self._scheduler = scheduler
+        self._max_retries = max_retries
+
+    def _timed_(self, stage):
+        return nullcontext() if self._stats is None else self._stats.timer(stage)
+
+    def _count_(self, counter, n=1):
+        if self._stats is not None:
+            self._stats.add(counter, n)
 
     @staticmethod
-    def _await_export_(url, headers, survey_name=None, report_progress=True, update_every=0.5):
+    def _retry_after_(response) -> float:
+        try:
+            return max(0.0, float(response.headers.get('Retry-After', 1)))
+        except ValueError:
+            return 1.0
+
+    def _request_(self, stage, url, headers, priority=Priority.INTERACTIVE, method='GET', **kwargs) -> requests.Response:
+        """
+        ec._request_(stage, url, headers, priority=Priority.INTERACTIVE, method='GET', **kwargs) -> requests.Response
+        Makes a request once the scheduler admits it, retrying requests which exceed the rate limit
+        :param stage: name under which the time taken by the request is recorded
+        :param url: URL of the request
+        :param headers: Headers for the request
+        :param priority: Priority of the request. Default Priority.INTERACTIVE
+        :param method: HTTP method of the request. Default 'GET'
+        :param kwargs: keyword arguments passed to requests.request
+        :return: requests.Response
         """
-        ec._await_export_(url, headers, report_progress=True) -> str
+        attempt = 0
+        while True:
+            if self._scheduler is not None:
+                with self._timed_('queue_wait'):
+                    self._scheduler.acquire(priority)
+
+            with self._timed_(stage):
+                response = requests.request(method, url, headers=headers, **kwargs)
+            self._count_('requests')
+
+            if response.status_code != _TOO_MANY_REQUESTS or attempt >= self._max_retries:
+                return response
+
+            # Every exporter sharing the scheduler backs off, rather than only the one that was refused
+            attempt += 1
+            self._count_('throttled')
+            delay = self._retry_after_(response)
+            response.close()
+            if self._scheduler is not None:
+                self._scheduler.penalize(delay)
+            else:
+                time.sleep(delay)
+
+    def _await_export_(self, url, headers, survey_name=None, report_progress=True, update_every=0.5,
+                       priority=Priority.INTERACTIVE):
+        """
+        ec._await_export_(url, headers, survey_name=None, report_progress=True, update_every=0.5,
+                          priority=Priority.INTERACTIVE) -> dict
         :param url: the qualtrics request check URL for the survey responses export
         :param headers: Headers for the request
+        :param survey_name: Name of the survey, displayed with the progress of the export. Optional
         :param report_progress: Whether to display the progress of the export process. Default True
         :param update_every: How often (in seconds) to check status of the export. Default 0.5
+        :param priority: Priority of the requests, when requests are scheduled. Default Priority.INTERACTIVE
         :return: json object containing the request response
         """
 
         status = None
         prefix = f"Exporting {survey_name}: " if survey_name is not None else 'Export Progress: '
         # Periodically check the update of the export
-        while status not in ('complete', 'failed'):
-            response = requests.get(url, headers=headers)
+        while True:
+            response = self._request_('export_responses.progress', url, headers, priority)
+            if not response.ok:
+                raise exceptions.ExportException('Unable to check progress of export', response.reason)
+
             response_json = response.json()
             progress = response_json['result']['percentComplete']
             if report_progress:
                 utils._progress_bar_(progress, 100, prefix=prefix)
             status = response_json['result']['status']
+            if status in ('complete', 'failed'):
+                break
             time.sleep(update_every)
 
         if status == 'failed':
-            raise exceptions.ExportException('Export Failed', response.reason)
+            raise exceptions.ExportException('Export Failed', status)
 
         return response_json
 
@@ -201,31 +278,43 @@ class SurveyExporter(object):
 
         return survey_id
 
-    def get_surveys(self):
+    def get_surveys(self, priority=Priority.INTERACTIVE):
         """
-        ec.list_surveys() -> dict[str: str]
+        ec.list_surveys(priority=Priority.INTERACTIVE) -> dict[str: str]
         Queries the qualtrics List Surveys API for surveys owned by the current user and returns a dictonary
         whose keys are survey ID and whose values are survey names
+        :param priority: Priority of the request, when requests are scheduled. Default Priority.INTERACTIVE
         :return: dict
         """
         url = f'{self._url_base}surveys'
         headers = {'x-api-token': self._token,
                    "content-type": "multipart/form-data"}
-        response = requests.get(url, headers=headers)
+        surveys = {}
 
-        if not response.ok:
-            raise exceptions.ExportException("Unable to retrieve list of surveys", response.reason)
+        # The list is paginated, each page giving the URL of the next
+        while url:
+            response = self._request_('get_surveys', url, headers, priority)
+            self._count_('bytes_received', len(response.content))
+
+            if not response.ok:
+                raise exceptions.ExportException("Unable to retrieve list of surveys", response.reason)
+
+            result = response.json()['result']
+            surveys.update((itm.get('id'), itm.get('name')) for itm in result['elements'])
+            url = result.get('nextPage')
 
-        data = response.json()['result']['elements']
-        return {itm.get('id'): itm.get('name') for itm in data}
+        return surveys
 
-    def export(self, survey_id=None, locator=None, format=constants.Format.JSON):
+    def export(self, survey_id=None, locator=None, format=constants.Format.JSON, priority=Priority.INTERACTIVE):
         """
-        ec.export_survey_definition(survey_id=None, locator=None, format=constants.Format.JSON) -> object
+        ec.export_survey_definition(survey_id=None, locator=None, format=constants.Format.JSON,
+                                     priority=Priority.INTERACTIVE) -> object
         Exports the survey definition (qsf) associated with the survey specified by survey_id or located by locator
         :param survey_id: The ID of the survey whose definition is to be exported
         :param locator: Callable which returns the ID of the survey to be exported when survey_id is None
         :param format: constants.Format that specifies output type. Format.JSON or Format.TXT
+        :param priority: Priority of the request, when requests are scheduled. Bulk jobs should pass Priority.BULK.
+        Default Priority.INTERACTIVE
         :return: text or JSON data, as specified by format
         """
         locator = self._prompt_for_survey_ if locator is None or not callable(locator) else locator
@@ -234,7 +323,8 @@ class SurveyExporter(object):
         url = f'{self._url_base}survey-definitions/{survey_id}?format=qsf'
         headers = {'x-api-token': self._token}
 
-        response = requests.get(url, headers=headers)
+        response = self._request_('export', url, headers, priority)
+        self._count_('bytes_received', len(response.content))
 
         if not response.ok:
             raise exceptions.ExportException(f"Unable to export definition for survey {survey_id}. " +
@@ -242,4 +332,74 @@ class SurveyExporter(object):
 
         return response.json() if format == constants.Format.JSON else response.text
 
+    def export_stream(self, survey_id=None, locator=None, chunk_size=65536, priority=Priority.INTERACTIVE):
+        """
+        ec.export_stream(survey_id=None, locator=None, chunk_size=65536, priority=Priority.INTERACTIVE) -> Iterator[str]
+        Exports the survey definition (qsf) associated with the survey specified by survey_id or located by locator,
+        yielding the text of the definition in chunks as it is received rather than buffering the entire body
+        :param survey_id: The ID of the survey whose definition is to be exported
+        :param locator: Callable which returns the ID of the survey to be exported when survey_id is None
+        :param chunk_size: Maximum number of bytes to read from the response at a time. Default 65536
+        :param priority: Priority of the request, when requests are scheduled. Default Priority.INTERACTIVE
+        :return: generator of str
+        """
+        locator = self._prompt_for_survey_ if locator is None or not callable(locator) else locator
+        survey_id = locator() if survey_id is None else survey_id
+
+        url = f'{self._url_base}survey-definitions/{survey_id}?format=qsf'
+        headers = {'x-api-token': self._token}
+
+        response = self._request_('export_stream.connect', url, headers, priority, stream=True)
+
+        with response:
+            if not response.ok:
+                raise exceptions.ExportException(f"Unable to export definition for survey {survey_id}. " +
+                                                 "Check result for details", response.reason)
+
+            # JSON responses are not required to declare a charset, in which case UTF-8 is implied
+            decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                self._count_('bytes_received', len(chunk))
+                yield decoder.decode(chunk)
+            yield decoder.decode(b'', final=True)
+
+    def export_responses(self, survey_id=None, locator=None, format=constants.Format.CSV, survey_name=None,
+                         report_progress=False, update_every=0.5, priority=Priority.INTERACTIVE, **kwargs) -> bytes:
+        """
+        ec.export_responses(survey_id=None, locator=None, format=constants.Format.CSV, survey_name=None,
+                            report_progress=False, update_every=0.5, priority=Priority.INTERACTIVE, **kwargs) -> bytes
+        Exports the responses to the survey specified by survey_id or located by locator. The export is started, its
+        progress checked until it is complete, and then its file is downloaded
+        :param survey_id: The ID of the survey whose responses are to be exported
+        :param locator: Callable which returns the ID of the survey to be exported when survey_id is None
+        :param format: constants.Format of the exported file. Default Format.CSV
+        :param survey_name: Name of the survey, displayed with the progress of the export. Optional
+        :param report_progress: Whether to display the progress of the export. Default False
+        :param update_every: How often (in seconds) to check the progress of the export. Default 0.5
+        :param priority: Priority of the requests, when requests are scheduled. Default Priority.INTERACTIVE
+        :param kwargs: Options of the export. See SurveyExporter._create_cre_body_
+        :return: bytes of the exported file, which is a zip archive unless compress=False is specified
+        """
+        locator = self._prompt_for_survey_ if locator is None or not callable(locator) else locator
+        survey_id = locator() if survey_id is None else survey_id
+
+        url = f'{self._url_base}surveys/{survey_id}/export-responses'
+        headers = {'x-api-token': self._token, **self._headers}
+        body = {'format': str(format), **self._create_cre_body_(**kwargs)}
+
+        response = self._request_('export_responses.start', url, headers, priority, method='POST', json=body)
+        if not response.ok:
+            raise exceptions.ExportException(f"Unable to start export of responses to survey {survey_id}",
+                                             response.reason)
+
+        progress_id = response.json()['result']['progressId']
+        result = self._await_export_(f'{url}/{progress_id}', headers, survey_name=survey_name,
+                                     report_progress=report_progress, update_every=update_every, priority=priority)
+
+        response = self._request_('export_responses.file', f"{url}/{result['result']['fileId']}/file", headers,
+                                  priority)
+        self._count_('bytes_received', len(response.content))
+        if not response.ok:
+            raise exceptions.ExportException(f"Unable to download responses to survey {survey_id}", response.reason)
 
+        return response.content
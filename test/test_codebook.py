@@ -0,0 +1,77 @@
+import csv
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from qsfdecode.jsondecode import Survey, translate_to_codebook
+
+QSF_PATH = Path(__file__).parent / 'test_data' / 'test_data.qsf'
+
+
+class CodebookTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._survey = Survey.from_json(QSF_PATH.read_text(encoding='utf-8'))
+        self._dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self._dir.cleanup()
+
+    def _expected_names_(self):
+        return [name for q in self._survey.exported_questions() for name in q.variable_names()]
+
+    def test_csv(self):
+        path = Path(self._dir.name) / 'codebook.csv'
+        result = translate_to_codebook(self._survey, path)
+        self.assertTrue(result.ok)
+        self.assertEqual(len(result.emitted), 39)
+
+        with path.open(encoding='utf-8', newline='') as in_file:
+            rows = list(csv.DictReader(in_file))
+
+        self.assertEqual([row['name'] for row in rows], self._expected_names_())
+        row = next(row for row in rows if row['name'] == 'SBS_RecAll.Statement1_Col1Label')
+        self.assertEqual(row['question_id'], 'QID45')
+        self.assertEqual(row['format'], 'F1.0')
+        self.assertEqual(json.loads(row['value_labels']), {'9': 'Col2Ans1VN', '8': 'Col1Ans2VN'})
+
+    def test_jsonl(self):
+        path = Path(self._dir.name) / 'codebook.jsonl'
+        translate_to_codebook(self._survey, path, lbl_include_question=True)
+
+        with path.open(encoding='utf-8') as in_file:
+            records = [json.loads(line) for line in in_file]
+
+        self.assertEqual([record['name'] for record in records], self._expected_names_())
+        text = next(record for record in records if record['type'] == 'STRING')
+        self.assertIsNone(text['value_labels'])
+        self.assertIsNone(text['value_label_set'])
+
+    def test_quotes(self):
+        data = json.loads(QSF_PATH.read_text(encoding='utf-8'))
+        elements = data['SurveyElements'] if 'SurveyElements' in data else data['result']['SurveyElements']
+        payload = next(e for e in elements if e.get('PrimaryAttribute') == 'QID1')['Payload']
+        payload['QuestionText'] = payload['QuestionDescription'] = "Isn't it?"
+        payload['Choices']['1']['Display'] = "Don't know"
+
+        path = Path(self._dir.name) / 'codebook.csv'
+        translate_to_codebook(json.dumps(data), path)
+        with path.open(encoding='utf-8', newline='') as in_file:
+            row = next(row for row in csv.DictReader(in_file) if row['name'] == 'SurveyQuestionName')
+
+        self.assertEqual(row['label'], "Isn't it? - SelectedChoice")
+        self.assertEqual(json.loads(row['value_labels'])['1'], "Don't know")
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            translate_to_codebook(self._survey, Path(self._dir.name) / 'codebook.txt')
+
+    def test_parquet(self):
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            self.skipTest("pyarrow is not installed")
+
+        path = Path(self._dir.name) / 'codebook.parquet'
+        translate_to_codebook(self._survey, path)
+        self.assertEqual(pyarrow.parquet.read_table(str(path)).column('name').to_pylist(), self._expected_names_())
@@ -2,6 +2,7 @@ import json
 import unittest
 from qsfdecode.jsondecode.surveyobjectdecoder import SurveyObjectDecoder
 from qsfdecode.jsondecode.questions import *
+from qsfdecode.jsondecode.survey import extract_blocks, flow_blocks
 
 SAMC_JSON = '{"SurveyID": "SV_6llqAsI32tDsPSl", "Element": "SQ", "PrimaryAttribute": "QID1", "SecondaryAttribute": "Click to write Question Text", "TertiaryAttribute": null, "Payload": {"QuestionText": "Click to write Question Text", "DataExportTag": "SurveyQuestionName", "QuestionType": "MC", "Selector": "SAVR", "SubSelector": "TX", "Configuration": {"QuestionDescriptionOption": "UseText"}, "QuestionDescription": "Click to write Question Text", "Choices": {"1": {"Display": "Choice1"}, "2": {"Display": "Choice2"}, "3": {"Display": "Choice3"}, "4": {"Display": "TextEntryChoice", "TextEntry": "true", "TextEntryValidation": "ValidUSState"}}, "ChoiceOrder": ["1", "2", "3", "4"], "Validation": {"Settings": {"ForceResponse": "OFF", "ForceResponseType": "ON", "Type": "None"}}, "Language": [], "NextChoiceId": 5, "NextAnswerId": 1, "QuestionID": "QID1", "DataVisibility": {"Private": false, "Hidden": false}}}'
 
@@ -42,3 +43,33 @@ class DecoderTest(unittest.TestCase):
 
         # Test that TextEntry question is decoded correctly
         self.assertIsInstance(json.loads(TE_JSON, cls=SurveyObjectDecoder), TextEntryQuestion)
+
+
+class FlowTest(unittest.TestCase):
+
+    FLOW = [{'Type': 'Block', 'ID': 'BL_1', 'FlowID': 'FL_2'},
+            {'Type': 'Randomizer', 'FlowID': 'FL_3', 'Flow': [
+                {'Type': 'Standard', 'ID': 'BL_2', 'FlowID': 'FL_4'},
+                {'Type': 'Block', 'ID': 'BL_1', 'FlowID': 'FL_5'}]},
+            {'Type': 'BlockRandomizer', 'FlowID': 'FL_6', 'Flow': [{'Type': 'Block', 'ID': 'BL_3', 'FlowID': 'FL_7'}]},
+            {'Type': 'EmbeddedData', 'FlowID': 'FL_8', 'EmbeddedData': [], 'Flow': [
+                {'Type': 'Branch', 'FlowID': 'FL_9', 'Flow': [{'Type': 'Block', 'ID': 'BL_4', 'FlowID': 'FL_10'}]}]},
+            {'Type': 'EndSurvey', 'FlowID': 'FL_11'}]
+
+    def test_flow_blocks(self):
+        blocks = list(flow_blocks(self.FLOW))
+        self.assertEqual([b.id for b in blocks], ['BL_1', 'BL_2', 'BL_3', 'BL_4'])
+        self.assertEqual(blocks[3].path, ('FL_8', 'FL_9'))
+        self.assertEqual(blocks[0].path, ())
+        self.assertEqual(extract_blocks(self.FLOW, branches=['FL_3']), ['BL_2', 'BL_1'])
+        self.assertEqual(extract_blocks(self.FLOW, branches=['FL_9', 'FL_7']), ['BL_3', 'BL_4'])
+
+    def test_deep_flow(self):
+        # Nesting far beyond the recursion limit is walked without error
+        flow = [{'Type': 'Block', 'ID': 'BL_deep', 'FlowID': 'FL_0'}]
+        for i in range(1, 5000):
+            flow = [{'Type': 'Group', 'FlowID': f'FL_{i}', 'Flow': flow}]
+
+        blocks = list(flow_blocks(flow))
+        self.assertEqual([b.id for b in blocks], ['BL_deep'])
+        self.assertEqual(len(blocks[0].path), 4999)
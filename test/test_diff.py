@@ -0,0 +1,54 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from qsfdecode.jsondecode import Survey, diff_surveys
+from qsfdecode.jsondecode.diff import fingerprint
+
+QSF_PATH = Path(__file__).parent / 'test_data' / 'test_data.qsf'
+
+
+class DiffSurveysTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._text = QSF_PATH.read_text(encoding='utf-8')
+
+    def _edited_(self):
+        data = json.loads(self._text)
+        elements = data['SurveyElements'] if 'SurveyElements' in data else data['result']['SurveyElements']
+        questions = {e['Payload']['QuestionID']: e for e in elements if e['Element'] == 'SQ'}
+
+        # Relabel one choice of QID45 and remove QID30 from its block
+        questions['QID45']['Payload']['AdditionalQuestions']['1']['VariableNaming']['1'] = 'Edited'
+        blocks = next(e for e in elements if e['Element'] == 'BL')['Payload']
+        for block in (blocks.values() if isinstance(blocks, dict) else blocks):
+            block['BlockElements'] = [x for x in block.get('BlockElements', []) if x.get('QuestionID') != 'QID30']
+        return json.dumps(data)
+
+    def test_identical(self):
+        diff = diff_surveys(self._text, self._text)
+        self.assertTrue(diff.empty)
+        self.assertEqual(diff.affected_variables, [])
+
+    def test_changes(self):
+        diff = diff_surveys(self._text, self._edited_())
+        self.assertEqual(diff.changed, ['QID45'])
+        self.assertEqual(diff.removed, ['QID30'])
+        self.assertEqual(diff.added, [])
+        self.assertEqual(diff.changed_variables, ['SBS_RecAll.Statement1_Col1Label', 'SBS_RecAll.Statement2_Col1Label',
+                                                  'SBS_RecAll.Statement3_Col1Label'])
+        self.assertEqual(diff.removed_variables, ['TextEntry_CharRange'])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'delta.sps'
+            result = diff.write_sps(path)
+            self.assertEqual(result.emitted, ['QID45'])
+            text = path.read_text(encoding='utf-8')
+            self.assertIn("SBS_RecAll_TextEntry", text)
+            self.assertIn("TextEntry_CharRange", text.splitlines()[-1])
+
+    def test_fingerprint_ignores_key_order(self):
+        survey = Survey.from_json(self._text)
+        question = survey.get_question('QID1')
+        reordered = json.loads(json.dumps(question), object_pairs_hook=lambda pairs: dict(reversed(pairs)))
+        self.assertEqual(fingerprint(question), fingerprint(reordered))
@@ -0,0 +1,52 @@
+import tempfile
+import unittest
+from pathlib import Path
+from qsfdecode.jsondecode import Survey, translate_to_sps, translate_to_syntax
+
+QSF_PATH = Path(__file__).parent / 'test_data' / 'test_data.qsf'
+
+
+class EmittersTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._survey = Survey.from_json(QSF_PATH.read_text(encoding='utf-8'))
+        self._dir = Path(tempfile.mkdtemp())
+        self._paths = {name: self._dir / f"out.{name}" for name in ('spss', 'stata', 'r', 'sas')}
+        self._results = translate_to_syntax(self._survey, self._paths, include_declarations=True)
+
+    def _text_(self, name):
+        return self._paths[name].read_text(encoding='utf-8')
+
+    def test_results(self):
+        self.assertEqual(set(self._results), set(self._paths))
+        for result in self._results.values():
+            self.assertTrue(result.ok)
+            self.assertEqual(len(result.emitted), 39)
+
+    def test_spss(self):
+        path = self._dir / 'expected.sps'
+        translate_to_sps(self._survey, path, include_declarations=True)
+        self.assertEqual(self._text_('spss'), path.read_text(encoding='utf-8'))
+
+    def test_stata(self):
+        text = self._text_('stata')
+        self.assertIn("label define SBS_RecAll_TextEntry_1 9 `\"Col2Ans1VN\"' 8 `\"Col1Ans2VN\"', replace", text)
+        self.assertIn("label values SBS_RecAll_Statement2_Col1Label SBS_RecAll_TextEntry_1", text)
+
+        # Names which are identical once truncated to 32 characters are still unique
+        names = [line.split()[2] for line in text.splitlines() if line.startswith('label variable')]
+        self.assertEqual(len(names), len(set(names)))
+
+    def test_r(self):
+        self.assertIn('data[["SBS_RecAll.Statement1_Col1Label"]] <- haven::labelled(data[["SBS_RecAll.Statement1_Col1Label"]], '
+                      'labels = c("Col2Ans1VN" = 9, "Col1Ans2VN" = 8), label = "Statement1")', self._text_('r'))
+
+    def test_sas(self):
+        text = self._text_('sas')
+        self.assertEqual(text.count('DATA responses;'), 1)
+        self.assertIn("SBS_RecAll_Statement1_Col1Label = 'Statement1'", text)
+        self.assertTrue(text.rstrip().endswith('RUN;'))
+
+    def test_unknown_target(self):
+        with self.assertRaises(ValueError):
+            translate_to_syntax(self._survey, {'spsss': self._dir / 'out.sps'})
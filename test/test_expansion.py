@@ -0,0 +1,95 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from qsfdecode.jsondecode import Survey, translate_to_sps
+
+QSF_PATH = Path(__file__).parent / 'test_data' / 'test_data.qsf'
+
+
+class ExpansionTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        data = json.loads(QSF_PATH.read_text(encoding='utf-8'))
+        elements = data['SurveyElements'] if 'SurveyElements' in data else data['result']['SurveyElements']
+        questions = {e['Payload']['QuestionID']: e['Payload'] for e in elements if e['Element'] == 'SQ'}
+        blocks = next(e for e in elements if e['Element'] == 'BL')['Payload']
+        flow = next(e for e in elements if e['Element'] == 'FL')['Payload']
+
+        # Move the text entry questions into a Loop & Merge block with two iterations
+        default = next(b for b in (blocks.values() if isinstance(blocks, dict) else blocks) if b['Type'] == 'Default')
+        looped = [x for x in default['BlockElements'] if x.get('QuestionID') in ('QID27', 'QID28')]
+        default['BlockElements'] = [x for x in default['BlockElements'] if x not in looped]
+        block = {'Type': 'Standard', 'ID': 'BL_loop', 'Description': 'Loop', 'BlockElements': looped,
+                 'Options': {'Looping': 'Static', 'LoopingOptions': {'Static': {'1': {'1': 'a'}, '2': {'1': 'b'}}}}}
+        if isinstance(blocks, dict):
+            blocks['99'] = block
+        else:
+            blocks.append(block)
+        flow['Flow'].append({'Type': 'Block', 'ID': 'BL_loop', 'FlowID': 'FL_9'})
+
+        # Carry forward the choices of QID1 to a multiple answer question and to the statements of a matrix
+        carry = {'Type': 'ChoiceGroup', 'Locator': 'q://QID1/ChoiceGroup/SelectedChoices'}
+        questions['QID17']['DynamicChoices'] = carry
+        questions['QID19']['DynamicChoices'] = carry
+        self._text = json.dumps(data)
+        self._dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self._dir.cleanup()
+
+    def test_loop(self):
+        survey = Survey.from_json(self._text)
+        table = survey.get_question('QID27').variable_table()
+        # Copies are given valid SPSS names, but keep the columns under which Qualtrics exports them
+        self.assertEqual(list(table.names), ['X1_TextEntry_NoVal', 'X2_TextEntry_NoVal'])
+        self.assertEqual([v.column for v in table], ['1_TextEntry_NoVal', '2_TextEntry_NoVal'])
+        self.assertIn('X1_TextEntry_NoVal', survey.naming)
+        self.assertEqual(list(survey.get_question('QID29').variable_table().names), ['TextEntry_MaxLen'])
+
+    def test_carry_forward(self):
+        survey = Survey.from_json(self._text)
+        table = survey.get_question('QID17').variable_table()
+        names = list(table.names)
+        self.assertEqual(names[:4], [f'MC_MAVR_Both_x{i}' for i in range(1, 5)])
+        self.assertIn(' Choice1', table['MC_MAVR_Both_x1'].label)
+        self.assertEqual(len(names), len(Survey.from_json(QSF_PATH.read_text(encoding='utf-8'))
+                                         .get_question('QID17').variable_table().names) + 4)
+
+        matrix = list(survey.get_question('QID19').variable_table().names)
+        self.assertEqual(matrix[:4], [f'M_Bipolar_Noecode_x{i}' for i in range(1, 5)])
+
+        # Expanding again neither carries the choices forward twice nor discards the computed table
+        question = survey.get_question('QID17')
+        survey._expand_(question)
+        self.assertIs(question.variable_table(), table)
+
+        lazy = Survey.from_json(self._text, lazy=True)
+        self.assertEqual(list(lazy.get_question('QID17').variable_table().names), names)
+
+    def test_workers(self):
+        expected, actual = Path(self._dir.name) / 'expected.sps', Path(self._dir.name) / 'actual.sps'
+        translate_to_sps(self._text, expected, include_declarations=True)
+        translate_to_sps(self._text, actual, include_declarations=True, workers=2, chunk_size=5)
+        self.assertEqual(actual.read_text(encoding='utf-8'), expected.read_text(encoding='utf-8'))
+        text = expected.read_text(encoding='utf-8')
+        self.assertIn('STRING X1_TextEntry_NoVal (A2000).', text)
+        self.assertNotRegex(text, r'(?m)^\s*1_TextEntry_NoVal')
+
+    def test_responses(self):
+        from qsfdecode.responses import ResponseReader
+
+        survey = Survey.from_json(self._text)
+        path = Path(self._dir.name) / 'responses.csv'
+        path.write_text('1_TextEntry_NoVal,2_TextEntry_NoVal\nText,Text\na,b\n', encoding='utf-8')
+        batch = next(iter(ResponseReader(path, survey)))
+        self.assertEqual(batch['2_TextEntry_NoVal'], ['b'])
+
+    def test_widths(self):
+        # Widths are measured by export column, which is not the SPSS name of a looped variable
+        responses, path = Path(self._dir.name) / 'responses.csv', Path(self._dir.name) / 'out.sps'
+        responses.write_text('1_TextEntry_NoVal,2_TextEntry_NoVal\nText,Text\nabc,b\n', encoding='utf-8')
+        translate_to_sps(self._text, path, include_declarations=True, responses=responses)
+        text = path.read_text(encoding='utf-8')
+        self.assertIn('STRING X1_TextEntry_NoVal (A3).', text)
+        self.assertIn('STRING X2_TextEntry_NoVal (A1).', text)
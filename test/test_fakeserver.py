@@ -0,0 +1,86 @@
+import tempfile
+import unittest
+from pathlib import Path
+from qsfdecode import constants
+from qsfdecode.exceptions import ExportException
+from qsfdecode.fakeserver import FakeQualtrics, load_test
+from qsfdecode.instrumentation import Stats
+from qsfdecode.jsondecode import translate_to_sps
+from qsfdecode.scheduling import RequestScheduler, TokenBucket
+from qsfdecode.surveyexporter import SurveyExporter
+
+QSF_PATH = Path(__file__).parent / 'test_data' / 'test_data.qsf'
+
+
+class FakeServerTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._text = QSF_PATH.read_text(encoding='utf-8')
+        self._surveys = {f'SV_{i}': self._text for i in range(5)}
+
+    def _exporter_(self, server, **kwargs):
+        return SurveyExporter('local', 'token', base_url=server.base_url, **kwargs)
+
+    def test_surveys(self):
+        with FakeQualtrics(self._surveys, page_size=2) as server:
+            surveys = self._exporter_(server).get_surveys()
+
+        self.assertEqual(list(surveys), list(self._surveys))
+        self.assertEqual(server.stats.counters['surveys'], 3)
+
+    def test_export(self):
+        with FakeQualtrics(self._surveys) as server, tempfile.TemporaryDirectory() as temp_dir:
+            exporter = self._exporter_(server)
+            definition = exporter.export('SV_0', format=constants.Format.TXT)
+            self.assertEqual(''.join(exporter.export_stream('SV_0', chunk_size=1024)), definition)
+
+            result = translate_to_sps(definition, Path(temp_dir) / 'out.sps')
+            self.assertEqual(len(result.emitted), 39)
+
+            with self.assertRaises(ExportException):
+                exporter.export('SV_missing')
+
+    def test_export_responses(self):
+        stats = Stats()
+        with FakeQualtrics(self._surveys, responses={'SV_1': b'Q1\n1\n'}, export_polls=3) as server:
+            content = self._exporter_(server, stats=stats).export_responses('SV_1', update_every=0.0,
+                                                                            compress=False)
+
+        self.assertEqual(content, b'Q1\n1\n')
+        self.assertEqual(stats.calls['export_responses.progress'], 3)
+        self.assertEqual(server.stats.counters['export-responses.file'], 1)
+
+    def test_injection(self):
+        with FakeQualtrics(self._surveys, token='secret') as server:
+            with self.assertRaises(ExportException):
+                self._exporter_(server).get_surveys()
+            self.assertEqual(server.stats.counters['unauthorized'], 1)
+
+        with FakeQualtrics(self._surveys, failure_rate=1.0) as server:
+            with self.assertRaises(ExportException):
+                self._exporter_(server).export('SV_0')
+
+        stats = Stats()
+        with FakeQualtrics(self._surveys, rate_limit=1, burst=1, retry_after=0) as server:
+            exporter = self._exporter_(server, stats=stats, max_retries=0)
+            exporter.export('SV_0')
+            with self.assertRaises(ExportException):
+                exporter.export('SV_0')
+        self.assertEqual(server.stats.counters['throttled'], 1)
+        self.assertNotIn('throttled', stats.counters)
+
+    def test_load(self):
+        with FakeQualtrics(self._surveys, rate_limit=200, burst=10, retry_after=0) as server:
+            for path in ('single', 'bulk', 'async'):
+                scheduler = RequestScheduler(TokenBucket(200, capacity=10))
+                result = load_test(server, path, requests=20, workers=4, scheduler=scheduler)
+                self.assertEqual(result.errors, 0, path)
+                self.assertGreater(result.throughput, 0.0)
+                self.assertGreaterEqual(result.stats.counters['requests'], 20)
+
+            with self.assertRaises(ValueError):
+                load_test(server, 'other')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import subprocess
+import sys
+import unittest
+
+# Modules which translating a local QSF file must not import
+HEAVY_MODULES = ('requests', 'bs4', 'lxml', 'concurrent.futures', 'qsfdecode.surveyexporter',
+                 'qsfdecode.jsondecode.emitters', 'qsfdecode.jsondecode.codebook')
+
+
+def _run_(code: str) -> str:
+    return subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                          check=True).stderr
+
+
+class ImportTest(unittest.TestCase):
+
+    def test_lazy_imports(self):
+        output = _run_("import sys, qsfdecode\n"
+                       "from qsfdecode import translate_to_sps\n"
+                       f"loaded = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+                       "assert loaded == [], loaded")
+        self.assertIn('qsfdecode.jsondecode', output)
+
+    def test_import_time(self):
+        # -X importtime reports the cumulative import time of each module in microseconds. The bound is generous so as
+        # not to fail on slow machines; test_lazy_imports guards against importing the heavy modules themselves
+        output = _run_("import qsfdecode.jsondecode")
+        line = next(line for line in output.splitlines() if line.rstrip().endswith('| qsfdecode.jsondecode'))
+        cumulative = int(line.split('|')[1])
+        self.assertLess(cumulative, 250000)
+
+    def test_attributes(self):
+        import qsfdecode
+        import qsfdecode.jsondecode as jsondecode
+
+        for name in qsfdecode.__all__ + jsondecode.__all__:
+            module = qsfdecode if name in qsfdecode.__all__ else jsondecode
+            self.assertTrue(callable(getattr(module, name)), name)
+        with self.assertRaises(AttributeError):
+            getattr(qsfdecode, 'missing')
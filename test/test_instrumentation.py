@@ -0,0 +1,37 @@
+import logging
+import tempfile
+import unittest
+from pathlib import Path
+from qsfdecode import translate_to_sps
+from qsfdecode.instrumentation import Stats, current
+
+QSF_PATH = Path(__file__).parent / 'test_data' / 'test_data.qsf'
+
+
+class InstrumentationTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._text = QSF_PATH.read_text(encoding='utf-8')
+        self._dir = tempfile.TemporaryDirectory()
+        self._path = Path(self._dir.name) / 'out.sps'
+
+    def tearDown(self) -> None:
+        self._dir.cleanup()
+
+    def test_translate_stats(self):
+        stats = Stats()
+        translate_to_sps(self._text, self._path, include_declarations=True, stats=stats)
+
+        self.assertIsNone(current())
+        self.assertEqual(stats.counters['questions_decoded'], 42)
+        self.assertEqual(stats.counters['questions_emitted'], 39)
+        self.assertEqual(stats.counters['bytes_written'], len(self._path.read_bytes()))
+        for stage in ('decode', 'flow', 'emit', 'html', 'construct.MatrixQuestion', 'emit.SideBySideQuestion'):
+            self.assertIn(stage, stats.timings)
+        self.assertEqual(stats.calls['construct.MultiChoiceQuestion'], 8)
+
+    def test_log_events(self):
+        with self.assertLogs('exportclient', level=logging.DEBUG) as logs:
+            translate_to_sps(self._text, self._path, stats=Stats(log=True))
+
+        self.assertTrue(any(getattr(record, 'stage', None) == 'decode' for record in logs.records))
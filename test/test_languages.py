@@ -0,0 +1,73 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from qsfdecode.instrumentation import Stats
+from qsfdecode.jsondecode import Survey, translate_to_sps
+
+QSF_PATH = Path(__file__).parent / 'test_data' / 'test_data.qsf'
+
+
+class LanguageTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        data = json.loads(QSF_PATH.read_text(encoding='utf-8'))
+        elements = data['SurveyElements'] if 'SurveyElements' in data else data['result']['SurveyElements']
+        questions = {e['Payload']['QuestionID']: e['Payload'] for e in elements if e['Element'] == 'SQ'}
+        questions['QID1']['Language'] = {'ES': {'QuestionText': '<p>Escriba la pregunta</p>',
+                                                'Choices': {'1': {'Display': 'Opción 1'}, '2': {'Display': "L'autre"}}}}
+        questions['QID26']['Language'] = {'ES': {'QuestionText': 'Matriz', 'Choices': {'1': {'Display': 'Afirmación'}},
+                                                 'Answers': {'1': {'Display': 'Punto'}}}}
+        questions['QID32']['Language'] = {'ES': {'Choices': {'1': {'Display': 'Deslizador'}}}}
+        questions['QID37']['Language'] = {'ES': {'Choices': {'1': {'Display': 'Enunciado'}},
+                                                 'AdditionalQuestions': {'1': {'Answers': {'1': {'Display': 'R1'}}}}}}
+        self._text = json.dumps(data)
+        self._dir = tempfile.TemporaryDirectory()
+        self._path = Path(self._dir.name) / 'survey.sps'
+
+    def tearDown(self) -> None:
+        self._dir.cleanup()
+
+    def test_labels(self):
+        survey = Survey.from_json(self._text)
+        mc = survey.get_question('QID1')
+        self.assertEqual(mc.languages(), ('ES',))
+        self.assertEqual(mc.variable_table('ES')['SurveyQuestionName'].label,
+                         'Escriba la pregunta - SelectedChoice')
+        self.assertEqual(mc.value_labels()['SurveyQuestionName'][1], 'Choice1')
+        self.assertEqual(mc.translated('ES').value_labels()['SurveyQuestionName'][1], 'Opción 1')
+        self.assertEqual(mc.translated('ES').value_labels()['SurveyQuestionName'][2], "L''autre")
+        self.assertIs(mc.translated('ES'), mc.translated('ES'))
+        self.assertIs(mc.translated('FR'), mc)
+
+        matrix = survey.get_question('QID26').variable_table('ES')
+        self.assertEqual(matrix['M_Lik_SA_QET.1'].label, 'Afirmacin')
+        self.assertEqual(matrix['M_Lik_SA_QET.1'].stem, 'Matriz')
+        # VariableNaming, where it exists, is not translated
+        self.assertEqual(matrix.value_labels['M_Lik_SA_QET.1'][4], 'ScalePoint.1')
+
+        self.assertEqual(survey.get_question('QID32').variable_table('ES')['Slider_1'].label, 'Deslizador')
+        sbs = survey.get_question('QID37').variable_table('ES')
+        self.assertEqual(sbs['SBS_RecodeAll_1_Col1Label'].label, 'Enunciado')
+        self.assertEqual(sbs['SBS_RecodeAll_2_Col1Label'].label, 'Click to write Statement 2')
+
+    def test_translate(self):
+        stats = Stats()
+        results = translate_to_sps(self._text, self._path, languages=['EN', 'ES'], stats=stats)
+        self.assertEqual(set(results), {'EN', 'ES'})
+        self.assertEqual(stats.calls['decode'], 1)
+
+        expected = Path(self._dir.name) / 'expected.sps'
+        translate_to_sps(self._text, expected)
+        english = self._path.with_name('survey_EN.sps').read_text(encoding='utf-8')
+        spanish = self._path.with_name('survey_ES.sps').read_text(encoding='utf-8')
+        self.assertEqual(english, expected.read_text(encoding='utf-8'))
+        self.assertIn("'Escriba la pregunta - SelectedChoice'", spanish)
+        self.assertEqual(len(spanish.splitlines()), len(english.splitlines()))
+
+        translate_to_sps(self._text, self._path, languages=['ES'], workers=2, chunk_size=10)
+        self.assertEqual(self._path.with_name('survey_ES.sps').read_text(encoding='utf-8'), spanish)
+
+        translate_to_sps(self._text, self._path, languages=['EN', 'ES'], combine_languages=True)
+        self.assertEqual(self._path.read_text(encoding='utf-8'),
+                         f"* Language: EN.\n\n{english}* Language: ES.\n\n{spanish}")
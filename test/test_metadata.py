@@ -0,0 +1,86 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from qsfdecode.jsondecode import Survey, translate_to_sps
+from qsfdecode.jsondecode.questions import MetadataQuestion
+from qsfdecode.jsondecode.survey import EmbeddedField, extract_blocks
+from qsfdecode.jsondecode.surveyobjectdecoder import SurveyObjectDecoder
+
+QSF_PATH = Path(__file__).parent / 'test_data' / 'test_data.qsf'
+
+
+class MetadataTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        data = json.loads(QSF_PATH.read_text(encoding='utf-8'))
+        elements = data['SurveyElements'] if 'SurveyElements' in data else data['result']['SurveyElements']
+        flow = next(e for e in elements if e['Element'] == 'FL')['Payload']
+        flow['Flow'].insert(0, {'Type': 'EmbeddedData', 'FlowID': 'FL_5', 'EmbeddedData': [
+            {'Description': 'group', 'Type': 'Custom', 'Field': 'group', 'VariableType': 'String', 'Value': 'A'},
+            {'Description': 'RecipientEmail', 'Type': 'Recipient', 'Field': 'RecipientEmail'}]})
+        flow['Flow'].append({'Type': 'Branch', 'FlowID': 'FL_6', 'Flow': [
+            {'Type': 'EmbeddedData', 'FlowID': 'FL_7', 'EmbeddedData': [
+                {'Field': 'score', 'VariableType': 'Scale', 'Value': '1'},
+                {'Field': 'visited', 'VariableType': 'Date'},
+                {'Field': 'group', 'VariableType': 'Scale'}]}]})
+        self._flow = flow['Flow']
+        self._text = json.dumps(data)
+        self._dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self._dir.cleanup()
+
+    def test_fields(self):
+        survey = Survey.from_json(self._text)
+        self.assertEqual(survey.embedded_fields(),
+                         [EmbeddedField('group', 'String', 'FL_5'), EmbeddedField('RecipientEmail', 'String', 'FL_5'),
+                          EmbeddedField('score', 'Scale', 'FL_7'), EmbeddedField('visited', 'Date', 'FL_7')])
+        self.assertEqual(extract_blocks(self._flow), ['BL_eytQAQnbOvJEiVv'])
+
+        questions = survey.exported_questions(metadata=True)
+        self.assertEqual(len(questions), 41)
+        metadata, embedded = questions[0].variable_table(), questions[-1].variable_table()
+        self.assertEqual(metadata.names[:3], ('StartDate', 'EndDate', 'Status'))
+        self.assertEqual(metadata['StartDate'].format, 'DATETIME20')
+        self.assertEqual(metadata.value_labels['Finished'], {0: 'False', 1: 'True'})
+        self.assertEqual(embedded.names, ('group', 'score', 'visited'))
+        self.assertEqual([v.format for v in embedded], ['A2000', 'F40.0', 'SDATE10'])
+
+    def test_translate(self):
+        expected, actual = Path(self._dir.name) / 'expected.sps', Path(self._dir.name) / 'actual.sps'
+        result = translate_to_sps(self._text, expected, include_declarations=True, include_metadata=True)
+        self.assertEqual(result.emitted[0], 'Metadata')
+        self.assertEqual(result.emitted[-1], 'EmbeddedData')
+        text = expected.read_text(encoding='utf-8')
+        self.assertIn('NUMERIC StartDate (DATETIME20).', text)
+        self.assertIn('NUMERIC visited (SDATE10).', text)
+        self.assertIn("Duration__in_seconds_ 'Duration (in seconds)'", text)
+
+        translate_to_sps(self._text, actual, include_declarations=True, include_metadata=True, workers=2,
+                         chunk_size=10)
+        self.assertEqual(actual.read_text(encoding='utf-8'), text)
+
+    def test_meta_info_question(self):
+        # A Meta Info question records the browser and operating system of the respondent, and is not survey metadata
+        meta_info = {'SurveyID': 'SV_1', 'Element': 'SQ', 'PrimaryAttribute': 'QID90',
+                     'SecondaryAttribute': 'Browser Meta Info',
+                     'Payload': {'QuestionID': 'QID90', 'DataExportTag': 'Q90', 'QuestionType': 'Meta',
+                                 'Selector': 'Browser', 'QuestionText': 'Browser Meta Info',
+                                 'QuestionDescription': 'Browser Meta Info',
+                                 'Configuration': {'QuestionDescriptionOption': 'UseText'},
+                                 'Choices': {'1': {'Display': 'Browser', 'TextEntry': 1},
+                                             '2': {'Display': 'Version', 'TextEntry': 1}}}}
+        question = json.loads(json.dumps(meta_info), cls=SurveyObjectDecoder)
+        self.assertNotIsInstance(question, MetadataQuestion)
+
+        data = json.loads(self._text)
+        elements = data['SurveyElements'] if 'SurveyElements' in data else data['result']['SurveyElements']
+        elements.append(meta_info)
+        blocks = next(e for e in elements if e['Element'] == 'BL')['Payload']
+        default = next(b for b in (blocks.values() if isinstance(blocks, dict) else blocks) if b['Type'] == 'Default')
+        default['BlockElements'].append({'Type': 'Question', 'QuestionID': 'QID90'})
+
+        path = Path(self._dir.name) / 'out.sps'
+        translate_to_sps(json.dumps(data), path, include_declarations=True)
+        self.assertNotIn('StartDate', path.read_text(encoding='utf-8'))
@@ -0,0 +1,71 @@
+import json
+import threading
+import unittest
+from pathlib import Path
+from qsfdecode.jsondecode import Survey
+from qsfdecode.jsondecode.abc import SurveyObjectBase
+from qsfdecode.jsondecode.naming import NamingContext
+
+QSF_PATH = Path(__file__).parent / 'test_data' / 'test_data.qsf'
+
+
+class NamingContextTest(unittest.TestCase):
+
+    def test_claim(self):
+        naming = NamingContext(['StartDate'])
+        self.assertEqual(naming.claim('startdate'), 'startdate_2')
+        self.assertEqual(naming.claim('Q1', 'a'), 'Q1')
+        self.assertEqual(naming.claim('q1', 'b'), 'q1_2')
+        self.assertEqual(naming.claim('Q1', 'c'), 'Q1_3')
+        # The same owner is given the same name again
+        self.assertEqual(naming.claim('q1', 'b'), 'q1_2')
+        self.assertEqual(naming.claim('x' * 64), 'x' * 64)
+        self.assertEqual(naming.claim('x' * 64), 'x' * 62 + '_2')
+        self.assertIn('Q1_3', naming)
+
+    def test_generate(self):
+        naming = NamingContext(['VAR_1'])
+        self.assertEqual(naming.generate('a'), 'VAR_2')
+        self.assertEqual(naming.generate('a'), 'VAR_2')
+        self.assertEqual(naming.claim('VAR_2', 'a'), 'VAR_2')
+        self.assertEqual(naming.generate(), 'VAR_3')
+
+        # Names minted without a context do not depend on anything minted before
+        self.assertEqual(SurveyObjectBase._sanitize_for_spss_('123'), 'VAR_1')
+        self.assertEqual(SurveyObjectBase._sanitize_for_spss_('___'), 'VAR_1')
+
+    def test_threads(self):
+        naming = NamingContext()
+        names = []
+
+        def claim():
+            for i in range(200):
+                names.append(naming.claim('Q1'))
+                names.append(naming.generate())
+
+        threads = [threading.Thread(target=claim) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(set(names)), 1600)
+
+    def test_embedded_data(self):
+        data = json.loads(QSF_PATH.read_text(encoding='utf-8'))
+        elements = data['SurveyElements'] if 'SurveyElements' in data else data['result']['SurveyElements']
+        flow = next(e for e in elements if e['Element'] == 'FL')['Payload']
+        flow['Flow'].append({'Type': 'EmbeddedData', 'FlowID': 'FL_5', 'EmbeddedData': [
+            {'Field': 'my field'}, {'Field': 'my_field'}, {'Field': '1 2'}, {'Field': 'startDate'},
+            {'Field': '1abc'}, {'Field': 'abc'}, {'Field': 'SurveyQuestionName'}]})
+        text = json.dumps(data)
+
+        # Valid field names, and then the names of question variables, win over names made valid
+        names = Survey.from_json(text).embedded_data_question().variable_names()
+        self.assertEqual(names, ('my_field_2', 'my_field', 'VAR_1', 'startDate_2', 'abc_2', 'abc',
+                                 'SurveyQuestionName_2'))
+        question = Survey.from_json(text).embedded_data_question()
+        self.assertEqual([v.column for v in question.variable_table()],
+                         ['my field', 'my_field', '1 2', 'startDate', '1abc', 'abc', 'SurveyQuestionName'])
+        # Each survey has a context of its own
+        self.assertEqual(Survey.from_json(text).embedded_data_question().variable_names(), names)
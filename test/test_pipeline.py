@@ -0,0 +1,56 @@
+import tempfile
+import unittest
+from pathlib import Path
+from qsfdecode import translate_to_sps
+from qsfdecode.pipeline import Pipeline, replace
+
+QSF_PATH = Path(__file__).parent / 'test_data' / 'test_data.qsf'
+
+
+class ChunkedExporter(object):
+
+    def __init__(self, text, chunk_size):
+        self._text = text
+        self._chunk_size = chunk_size
+
+    def export_stream(self, survey_id):
+        for i in range(0, len(self._text), self._chunk_size):
+            yield self._text[i:i + self._chunk_size]
+
+
+class ReplaceTransformTest(unittest.TestCase):
+
+    def test_replace_across_chunks(self):
+        text = "a99.1b99.1c999.1d99.11"
+        expected = text.replace('99.1', '99')
+        for size in range(1, len(text) + 1):
+            chunks = [text[i:i + size] for i in range(0, len(text), size)]
+            self.assertEqual(''.join(replace('99.1', '99')(chunks)), expected)
+
+    def test_replacement_not_rescanned(self):
+        chunks = ['xx9', '9', '.1', '.1']
+        self.assertEqual(''.join(replace('99.1', '99')(chunks)), 'xx99.1')
+
+
+class PipelineTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._text = QSF_PATH.read_text(encoding='utf-8')
+        self._dir = tempfile.TemporaryDirectory()
+        self._out = Path(self._dir.name)
+
+    def tearDown(self) -> None:
+        self._dir.cleanup()
+
+    def test_run_matches_translate(self):
+        translate_to_sps(self._text.replace('99.1', '99'), self._out / 'expected.sps', include_declarations=True)
+
+        pipeline = Pipeline(ChunkedExporter(self._text, 1000), include_declarations=True)
+        pipeline.add_transform(replace('99.1', '99'))
+        results = list(pipeline.run(['SV_1', 'SV_2', 'SV_3'], self._out))
+
+        self.assertEqual([r.survey_id for r in results], ['SV_1', 'SV_2', 'SV_3'])
+        expected = (self._out / 'expected.sps').read_text(encoding='utf-8')
+        for result in results:
+            self.assertEqual(result.path.read_text(encoding='utf-8'), expected)
+            self.assertTrue({'fetch', 'wait', 'decode', 'emit', 'total'} <= set(result.timings))
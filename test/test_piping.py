@@ -0,0 +1,73 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from qsfdecode.jsondecode import Survey, translate_to_sps
+from qsfdecode.jsondecode.piping import PipeResolver
+
+QSF_PATH = Path(__file__).parent / 'test_data' / 'test_data.qsf'
+
+
+class PipeResolverTest(unittest.TestCase):
+
+    QUESTIONS = {
+        'QID1': {'Payload': {'QuestionText': '<b>Don\'t</b> ${q://QID2/QuestionText}', 'DataExportTag': 'Q1'}},
+        'QID2': {'Payload': {'QuestionText': 'Back to ${q://QID1/QuestionText}', 'DataExportTag': 'Q2',
+                             'Choices': {'1': {'Display': 'Yes'}}}},
+    }
+
+    def test_resolve(self):
+        resolver = PipeResolver(self.QUESTIONS)
+        self.assertEqual(resolver.resolve('No pipes'), 'No pipes')
+        self.assertEqual(resolver.resolve('Rate ${q://QID2/ChoiceDescription/1} for ${e://Field/brand}'),
+                         'Rate Yes for [brand]')
+        self.assertEqual(resolver.resolve('You chose ${q://QID2/ChoiceGroup/SelectedChoices}'), 'You chose [Q2]')
+        self.assertEqual(resolver.resolve('${q://QID99/QuestionText} ${gr://SC_1/Score}'),
+                         '${q://QID99/QuestionText} ${gr://SC_1/Score}')
+
+    def test_cycle(self):
+        # QID1 and QID2 pipe each other's text. The pipe which closes the cycle is left in place
+        resolver = PipeResolver(self.QUESTIONS)
+        self.assertEqual(resolver.resolve('${q://QID1/QuestionText}'),
+                         "Don''t Back to ${q://QID1/QuestionText}")
+        self.assertEqual(resolver.resolve('${q://QID2/QuestionText}'),
+                         "Back to Don''t ${q://QID2/QuestionText}")
+
+
+class PipedLabelsTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        data = json.loads(QSF_PATH.read_text(encoding='utf-8'))
+        elements = data['SurveyElements'] if 'SurveyElements' in data else data['result']['SurveyElements']
+        questions = {e['Payload']['QuestionID']: e['Payload'] for e in elements if e['Element'] == 'SQ'}
+        questions['QID26']['Choices']['1']['Display'] = 'Statement about ${q://QID1/ChoiceDescription/2}'
+        questions['QID26']['VariableNaming']['1'] = 'Agree with ${q://QID1/ChoiceGroup/SelectedChoices}'
+        self._text = json.dumps(data)
+        self._dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self._dir.cleanup()
+
+    def test_labels(self):
+        question = Survey.from_json(self._text).get_question('QID26')
+        self.assertEqual(question.variable_table()['M_Lik_SA_QET.1'].label, 'Statement about Choice2')
+        self.assertEqual(question.value_labels()['M_Lik_SA_QET.1'][4], 'Agree with [SurveyQuestionName]')
+
+    def test_side_by_side(self):
+        data = json.loads(self._text)
+        elements = data['SurveyElements'] if 'SurveyElements' in data else data['result']['SurveyElements']
+        question = next(e['Payload'] for e in elements if e['Element'] == 'SQ' and e['Payload']['QuestionID'] == 'QID45')
+        question['AdditionalQuestions']['1']['Choices']['1']['Display'] = 'Rate ${q://QID1/ChoiceDescription/2}'
+        question['AdditionalQuestions']['1']['Answers']['1']['Display'] = 'Like ${q://QID1/ChoiceDescription/3}'
+        path = Path(self._dir.name) / 'sbs.sps'
+        translate_to_sps(json.dumps(data), path)
+        text = path.read_text(encoding='utf-8')
+        self.assertIn("SBS_RecAll.Statement1_Col1Label 'Rate Choice2'", text)
+        self.assertNotIn('${q://', text)
+
+    def test_workers(self):
+        expected, path = Path(self._dir.name) / 'expected.sps', Path(self._dir.name) / 'out.sps'
+        translate_to_sps(self._text, expected)
+        translate_to_sps(self._text, path, workers=2, chunk_size=5)
+        self.assertIn('Statement about Choice2', path.read_text(encoding='utf-8'))
+        self.assertEqual(path.read_text(encoding='utf-8'), expected.read_text(encoding='utf-8'))
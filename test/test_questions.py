@@ -2,6 +2,7 @@ import json
 import unittest
 from qsfdecode.jsondecode.surveyobjectdecoder import SurveyObjectDecoder
 from qsfdecode.jsondecode.questions import *
+from qsfdecode.jsondecode.variables import VariableTable
 
 
 SAMC_JSON = ('{"SurveyID": "SV_6llqAsI32tDsPSl", "Element": "SQ", "PrimaryAttribute": "QID1", "SecondaryAttribute": ' +
@@ -95,3 +96,28 @@ class MultiChoiceQuestionTest(unittest.TestCase):
         print(self._teq.create_spss_code(include_declarations=True, lbl_include_questions=True))
 
 
+    def test_variable_table(self):
+        table = self._sbs.variable_table()
+        self.assertIs(table, self._sbs.variable_table())
+        self.assertEqual(table.names, self._sbs.variable_names())
+        self.assertIn('SBS_RecAll.Statement3_Col1Label_TEXT', table)
+        self.assertEqual(self._sbs.value_labels()['SBS_RecAll.Statement1_Col1Label'], {'9': 'Col2Ans1VN', '8': 'Col1Ans2VN'})
+        self.assertIs(self._sbs.variable_labels(), self._sbs.variable_labels())
+        with self.assertRaises(TypeError):
+            self._sbs.value_labels()['SBS_RecAll.Statement1_Col1Label']['9'] = 'changed'
+
+        for column in self._sbs2._columns.values():
+            self.assertIsNotNone(column.variable_names())
+
+        self.assertEqual(len(table.names), len(table))
+        with self.assertRaises(ValueError):
+            VariableTable(list(table) + [table.variables[0]])
+
+    def test_looped_spss_code(self):
+        # Side by side syntax is built from the question's own table, so loop prefixes apply to every column
+        self._sbs.expand(loop=('1', '2'))
+        code = self._sbs.create_spss_code(include_declarations=True)
+        declared = [line.split()[1] for line in code.splitlines() if line.startswith(('NUMERIC ', 'STRING '))]
+        self.assertEqual(tuple(declared), self._sbs.variable_names())
+        self.assertIn("X2_SBS_RecAll.Statement3_Col3Label_TEXT 'Statement3 - Text'", code)
+        self.assertNotIn('\n    SBS_RecAll.Statement1_Col1Label', code)
@@ -0,0 +1,192 @@
+import csv
+import importlib.util
+import json
+import math
+import tempfile
+import unittest
+from pathlib import Path
+from qsfdecode.jsondecode import Survey
+from array import array
+from qsfdecode.responses import ResponseReader, label_responses, measure_widths
+
+QSF_PATH = Path(__file__).parent / 'test_data' / 'test_data.qsf'
+
+
+class LabelResponsesTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._survey = Survey.from_json(QSF_PATH.read_text(encoding='utf-8'))
+        self._dir = tempfile.TemporaryDirectory()
+        self._in = Path(self._dir.name) / 'responses.csv'
+        self._out = Path(self._dir.name) / 'labelled.csv'
+
+        header = ['ResponseId', 'SBS_RecAll.Statement1_Col1Label', 'SBS_RecAll.Statement1_Col1Label_TEXT']
+        with self._in.open('w', encoding='utf-8', newline='') as out_file:
+            writer = csv.writer(out_file)
+            writer.writerows([header, ['Response ID', 'Statement1, "quoted"\nsecond line', 'Statement1 - Text'],
+                              ['{"ImportId":"_recordId"}', '{"ImportId":"QID45#1_1"}', '{"ImportId":"QID45#1_1_TEXT"}'],
+                              ['R_1', '9', '8'], ['R_2', '8', 'free text'], ['R_3', '', '9'], ['R_4', '3', '']])
+
+    def tearDown(self) -> None:
+        self._dir.cleanup()
+
+    def _check_(self, engine):
+        rows = label_responses(self._survey, self._in, self._out, chunk_size=3, engine=engine)
+        self.assertEqual(rows, 4)
+
+        with self._in.open(encoding='utf-8', newline='') as in_file, \
+                self._out.open(encoding='utf-8', newline='') as out_file:
+            expected, actual = list(csv.reader(in_file)), list(csv.reader(out_file))
+
+        self.assertEqual(actual[:3], expected[:3])
+        # Every record, header or response, ends in CRLF. The only bare line break is within a quoted header cell
+        content = self._out.read_bytes()
+        self.assertEqual(content.count(b'\r\n'), 7)
+        self.assertEqual(content.count(b'\n'), 8)
+        self.assertEqual([row[1] for row in actual[3:]], ['Col2Ans1VN', 'Col1Ans2VN', '', '3'])
+        self.assertEqual([row[2] for row in actual[3:]], ['8', 'free text', '9', ''])
+
+    def test_quotes(self):
+        data = json.loads(QSF_PATH.read_text(encoding='utf-8'))
+        elements = data['SurveyElements'] if 'SurveyElements' in data else data['result']['SurveyElements']
+        payload = next(e for e in elements if e.get('PrimaryAttribute') == 'QID1')['Payload']
+        payload['Choices']['1']['Display'] = "Don't know"
+        self._in.write_text('SurveyQuestionName\nQuestion\n1\n2\n', encoding='utf-8')
+
+        for engine in ('python', 'pandas'):
+            if engine == 'pandas' and importlib.util.find_spec('pandas') is None:
+                continue
+            label_responses(Survey.from_json(json.dumps(data)), self._in, self._out, engine=engine)
+            with self._out.open(encoding='utf-8', newline='') as out_file:
+                self.assertEqual([row[0] for row in csv.reader(out_file)][2:], ["Don't know", 'Choice2'])
+
+    def test_python(self):
+        self._check_('python')
+
+    def test_pandas(self):
+        if importlib.util.find_spec('pandas') is None:
+            self.skipTest("pandas is not installed")
+        self._check_('pandas')
+
+
+class ResponseReaderTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._survey = Survey.from_json(QSF_PATH.read_text(encoding='utf-8'))
+        self._dir = tempfile.TemporaryDirectory()
+        self._header = ['ResponseId', 'SBS_RecAll.Statement1_Col1Label', 'SBS_RecAll.Statement1_Col1Label_TEXT']
+        self._rows = [['R_1', '9', '8'], ['R_2', '8', 'free text'], ['R_3', '', '9'], ['R_4', '3', '']]
+
+    def tearDown(self) -> None:
+        self._dir.cleanup()
+
+    def _write_(self, name, rows, delimiter=','):
+        path = Path(self._dir.name) / name
+        with path.open('w', encoding='utf-8', newline='') as out_file:
+            csv.writer(out_file, delimiter=delimiter).writerows(rows)
+        return path
+
+    def _check_(self, reader):
+        batches = list(reader)
+        self.assertEqual([len(batch['ResponseId']) for batch in batches], [3, 1])
+        self.assertEqual(reader.columns, self._header)
+
+        values = [v for batch in batches for v in batch['SBS_RecAll.Statement1_Col1Label']]
+        self.assertIsInstance(batches[0]['SBS_RecAll.Statement1_Col1Label'], array)
+        self.assertEqual(values[:2], [9.0, 8.0])
+        self.assertTrue(math.isnan(values[2]))
+        self.assertEqual([v for batch in batches for v in batch['SBS_RecAll.Statement1_Col1Label_TEXT']],
+                         ['8', 'free text', '9', ''])
+
+    def test_import_id_header(self):
+        path = self._write_('responses.tsv', [self._header, ['Response ID', 'Statement1', 'Statement1 - Text'],
+                                              ['{"ImportId":"_recordId"}', '{"ImportId":"QID45#1_1"}',
+                                               '{"ImportId":"QID45#1_1_TEXT"}']] + self._rows, delimiter='\t')
+        reader = ResponseReader(path, self._survey, batch_size=3)
+        self._check_(reader)
+        self.assertEqual(len(reader.headers), 3)
+
+    def test_legacy_header(self):
+        path = self._write_('responses.csv', [self._header, ['Response ID', 'Statement1', 'Statement1 - Text']] +
+                            self._rows)
+        reader = ResponseReader(path, self._survey, batch_size=3)
+        self._check_(reader)
+        self.assertEqual(len(reader.headers), 2)
+
+    def test_ndjson(self):
+        path = Path(self._dir.name) / 'responses.ndjson'
+        with path.open('w', encoding='utf-8') as out_file:
+            for row in self._rows:
+                values = dict(zip(self._header, row))
+                values['SBS_RecAll.Statement1_Col1Label'] = int(row[1]) if row[1] else None
+                out_file.write(json.dumps({'responseId': row[0], 'values': values}) + "\n")
+
+        self._check_(ResponseReader(path, self._survey, batch_size=3))
+
+    def test_ragged(self):
+        path = Path(self._dir.name) / 'responses.csv'
+        with path.open('w', encoding='utf-8', newline='') as out_file:
+            csv.writer(out_file).writerows([self._header, ['Response ID', 'Statement1', 'Statement1 - Text'],
+                                            ['R_1', '9', '8'], ['R_2', '8']])
+            out_file.write('\r\n')
+            csv.writer(out_file).writerows([['R_3', '', '9'], ['R_4']])
+
+        batches = list(ResponseReader(path, self._survey, batch_size=3))
+        self.assertEqual([len(batch) for batch in batches], [3, 3])
+        self.assertEqual([v for batch in batches for v in batch['SBS_RecAll.Statement1_Col1Label_TEXT']],
+                         ['8', '', '9', ''])
+        self.assertEqual([v for batch in batches for v in batch['ResponseId']], ['R_1', 'R_2', 'R_3', 'R_4'])
+
+        out = Path(self._dir.name) / 'labelled.csv'
+        self.assertEqual(label_responses(self._survey, path, out, chunk_size=3, engine='python'), 4)
+
+        long = self._write_('long.csv', [self._header, ['Response ID', 'Statement1', 'Statement1 - Text'],
+                                         ['R_1', '9', '8', 'extra']])
+        with self.assertRaises(ValueError):
+            list(ResponseReader(long))
+
+    def test_ndjson_missing(self):
+        path = Path(self._dir.name) / 'responses.ndjson'
+        with path.open('w', encoding='utf-8') as out_file:
+            out_file.write(json.dumps({'values': {'ResponseId': 'R_1', 'SBS_RecAll.Statement1_Col1Label': 9}}) + "\n")
+            out_file.write(json.dumps({'values': {'ResponseId': 'R_2', 'Other': 'x'}}) + "\n")
+
+        reader = ResponseReader(path, self._survey)
+        batch = next(iter(reader))
+        self.assertEqual(reader.columns, ['ResponseId', 'SBS_RecAll.Statement1_Col1Label', 'Other'])
+        self.assertEqual(batch['Other'], ['', 'x'])
+        self.assertTrue(math.isnan(batch['SBS_RecAll.Statement1_Col1Label'][1]))
+
+    def test_metadata(self):
+        header = ['StartDate', 'RecordedDate', 'Status', 'Duration (in seconds)', 'Finished',
+                  'SBS_RecAll.Statement1_Col1Label']
+        path = self._write_('responses.csv', [header, ['Start Date', 'Recorded Date', 'Response Type',
+                                                      'Duration (in seconds)', 'Finished', 'Statement1'],
+                                              ['2024-01-02 10:11:12', '2024-01-02 10:15:00', '0', '228', '1', '9']])
+        batch = next(iter(ResponseReader(path, self._survey.exported_questions(metadata=True))))
+        # Dates are exported as text, while the other metadata columns are numeric
+        self.assertEqual(batch['StartDate'], ['2024-01-02 10:11:12'])
+        self.assertEqual(list(batch['Status']), [0.0])
+        # Columns whose names are not valid SPSS names are matched to their variables by their export column
+        self.assertEqual(list(batch['Duration (in seconds)']), [228.0])
+        self.assertEqual(list(batch['SBS_RecAll.Statement1_Col1Label']), [9.0])
+
+    def test_untyped(self):
+        path = self._write_('responses.csv', [self._header, ['Response ID', 'Statement1', 'Statement1 - Text']] +
+                            self._rows)
+        batch = next(iter(ResponseReader(path)))
+        self.assertEqual(batch['SBS_RecAll.Statement1_Col1Label'], ['9', '8', '', '3'])
+
+    def test_widths(self):
+        rows = [['R_1', '12', 'abc'], ['R_2', '', ''], ['R_3', '3', 'x'], ['R_100', '-1.25', 'caf\u00e9']]
+        path = self._write_('responses.csv', [self._header, ['Response ID', 'Statement1', 'Statement1 - Text']] + rows)
+        widths = measure_widths(path, self._survey, batch_size=3)
+        # The widest integer part and the most decimals are in different batches
+        self.assertEqual(widths, {'ResponseId': (5, 0), 'SBS_RecAll.Statement1_Col1Label': (5, 2),
+                                  'SBS_RecAll.Statement1_Col1Label_TEXT': (5, 0)})
+
+        table = self._survey.get_question('QID45').variable_table()
+        variable = table['SBS_RecAll.Statement1_Col1Label'].fitted(*widths['SBS_RecAll.Statement1_Col1Label'])
+        self.assertEqual(variable.format, 'F5.2')
+        self.assertIs(table['SBS_RecAll.Statement1_Col1Label'].fitted(0), table['SBS_RecAll.Statement1_Col1Label'])
+
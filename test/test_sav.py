@@ -0,0 +1,101 @@
+import csv
+import importlib.util
+import json
+import struct
+import tempfile
+import unittest
+from pathlib import Path
+from qsfdecode.jsondecode import Survey
+from qsfdecode.jsondecode.variables import Variable
+from qsfdecode.sav import BYTECODE, UNCOMPRESSED, ZLIB, SavWriter, translate_to_sav
+
+QSF_PATH = Path(__file__).parent / 'test_data' / 'test_data.qsf'
+
+VARIABLES = [Variable.numeric('q1', 'Question one'), Variable.numeric('amount', 'Amount'),
+             Variable.string('code', 'Code', width=5), Variable.string('comment', 'Comment', width=2000)]
+ROWS = [[1, 1234.5, 'abc', 'x' * 600 + 'end'], [None, -3, '', None], [float('nan'), 151, 'abcdefgh', 'short']]
+
+
+class SavWriterTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self._dir.cleanup()
+
+    def _write_(self, compression):
+        path = Path(self._dir.name) / 'out.sav'
+        with SavWriter(path, VARIABLES, {'q1': {1: 'One', '2': 'Two'}}, compression=compression) as writer:
+            writer.write_rows(iter(ROWS))
+        return path
+
+    def test_header(self):
+        for compression, magic in ((UNCOMPRESSED, b'$FL2'), (BYTECODE, b'$FL2'), (ZLIB, b'$FL3')):
+            data = self._write_(compression).read_bytes()
+            self.assertEqual(data[:4], magic)
+            self.assertEqual(struct.unpack_from('<i', data, 72)[0], (compression is not None) + (compression == ZLIB))
+            self.assertEqual(struct.unpack_from('<i', data, 80)[0], len(ROWS))
+
+    def test_round_trip(self):
+        if importlib.util.find_spec('pyreadstat') is None:
+            self.skipTest("pyreadstat is not installed")
+        import pyreadstat
+
+        for compression in (UNCOMPRESSED, BYTECODE, ZLIB):
+            df, meta = pyreadstat.read_sav(str(self._write_(compression)))
+            self.assertEqual(list(df.columns), ['q1', 'amount', 'code', 'comment'])
+            self.assertEqual(meta.column_labels, ['Question one', 'Amount', 'Code', 'Comment'])
+            self.assertEqual(meta.variable_value_labels, {'q1': {1.0: 'One', 2.0: 'Two'}})
+            self.assertEqual(df['amount'].tolist(), [1234.5, -3.0, 151.0])
+            self.assertEqual(df['code'].tolist(), ['abc', '', 'abcde'])
+            self.assertEqual(df['comment'].tolist(), ['x' * 600 + 'end', '', 'short'])
+            self.assertEqual(meta.original_variable_types['comment'], 'A2000')
+
+    def test_translate(self):
+        responses = Path(self._dir.name) / 'responses.csv'
+        with responses.open('w', encoding='utf-8', newline='') as out_file:
+            csv.writer(out_file).writerows([
+                ['ResponseId', 'SBS_RecAll.Statement1_Col1Label', 'SBS_RecAll.Statement1_Col1Label_TEXT'],
+                ['Response ID', 'Statement1', 'Statement1 - Text'],
+                ['{"ImportId":"_recordId"}', '{"ImportId":"QID45#1_1"}', '{"ImportId":"QID45#1_1_TEXT"}'],
+                ['R_1', '9', 'text'], ['R_2', '', '']])
+
+        path = Path(self._dir.name) / 'out.zsav'
+        survey = Survey.from_json(QSF_PATH.read_text(encoding='utf-8'))
+        self.assertEqual(translate_to_sav(survey, responses, path, compression=ZLIB), 2)
+
+        if importlib.util.find_spec('pyreadstat') is not None:
+            import pyreadstat
+            df, meta = pyreadstat.read_sav(str(path))
+            self.assertEqual(df['ResponseId'].tolist(), ['R_1', 'R_2'])
+            self.assertEqual(meta.variable_value_labels['SBS_RecAll.Statement1_Col1Label'],
+                             {9.0: 'Col2Ans1VN', 8.0: 'Col1Ans2VN'})
+
+            translate_to_sav(survey, responses, path, compression=ZLIB, fit_widths=True)
+            df, meta = pyreadstat.read_sav(str(path))
+            self.assertEqual(meta.original_variable_types['SBS_RecAll.Statement1_Col1Label_TEXT'], 'A4')
+            self.assertEqual(df['SBS_RecAll.Statement1_Col1Label_TEXT'].tolist(), ['text', ''])
+
+    def test_quotes(self):
+        data = json.loads(QSF_PATH.read_text(encoding='utf-8'))
+        elements = data['SurveyElements'] if 'SurveyElements' in data else data['result']['SurveyElements']
+        payload = next(e for e in elements if e.get('PrimaryAttribute') == 'QID1')['Payload']
+        payload['QuestionText'] = payload['QuestionDescription'] = "Isn't it?"
+        payload['Choices']['1']['Display'] = "Don't know"
+
+        responses = Path(self._dir.name) / 'responses.csv'
+        responses.write_text('SurveyQuestionName\nQuestion\n1\n', encoding='utf-8')
+        path = Path(self._dir.name) / 'out.sav'
+        translate_to_sav(json.dumps(data), responses, path, compression=UNCOMPRESSED)
+
+        content = path.read_bytes()
+        self.assertIn(b"Isn't it?", content)
+        self.assertIn(b"Don't know", content)
+        self.assertNotIn(b"''", content)
+
+        if importlib.util.find_spec('pyreadstat') is not None:
+            import pyreadstat
+            df, meta = pyreadstat.read_sav(str(path))
+            self.assertEqual(meta.column_labels, ["Isn't it? - SelectedChoice"])
+            self.assertEqual(meta.variable_value_labels['SurveyQuestionName'][1.0], "Don't know")
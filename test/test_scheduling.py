@@ -0,0 +1,159 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from qsfdecode.instrumentation import Stats
+from qsfdecode.scheduling import Priority, RequestScheduler, TokenBucket
+
+
+def _take_(path, n):
+    bucket = TokenBucket(50, capacity=5, path=path)
+    for _ in range(n):
+        bucket.acquire()
+
+
+class _ThrottlingHandler(BaseHTTPRequestHandler):
+    # Refuses the first request of each server, then lists a single survey
+    def do_GET(self):
+        if not self.server.refused:
+            self.server.refused = True
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        body = json.dumps({'result': {'elements': [{'id': 'SV_1', 'name': 'Survey'}]}}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_burst(self):
+        bucket = TokenBucket(10, capacity=3)
+        self.assertEqual([bucket.try_acquire() for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertGreater(bucket.try_acquire(), 0.0)
+
+        waited = bucket.acquire()
+        self.assertGreater(waited, 0.05)
+
+    def test_reserve(self):
+        bucket = TokenBucket(1, capacity=4)
+        self.assertEqual(bucket.try_acquire(reserve=2), 0.0)
+        self.assertEqual(bucket.try_acquire(reserve=2), 0.0)
+        self.assertGreater(bucket.try_acquire(reserve=2), 0.0)
+        self.assertEqual(bucket.try_acquire(), 0.0)
+
+    def test_penalize(self):
+        bucket = TokenBucket(100, capacity=100)
+        bucket.penalize(0.2)
+        self.assertAlmostEqual(bucket.try_acquire(), 0.21, delta=0.02)
+        with self.assertRaises(TimeoutError):
+            bucket.acquire(timeout=0.05)
+
+    def test_shared(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'bucket'
+            start = time.monotonic()
+            processes = [multiprocessing.Process(target=_take_, args=(path, 10)) for _ in range(3)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+
+            # 30 tokens at 50 per second, 5 of them available at once
+            self.assertGreaterEqual(time.monotonic() - start, 0.45)
+            self.assertTrue(all(process.exitcode == 0 for process in processes))
+            self.assertFalse(path.with_name('bucket.lock').exists())
+
+    def test_stale_lock(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'bucket'
+            lock = path.with_name('bucket.lock')
+            bucket = TokenBucket(10, path=path, stale_after=1.0)
+
+            # A lock left by a process which died is removed
+            lock.write_bytes(b'0:0')
+            os.utime(lock, (time.time() - 10, time.time() - 10))
+            self.assertEqual(bucket.try_acquire(), 0.0)
+            self.assertFalse(lock.exists())
+
+            # A holder whose lock was taken over leaves the new holder's lock in place
+            with bucket._locked_():
+                lock.write_bytes(b'other')
+            self.assertEqual(lock.read_bytes(), b'other')
+
+            # A stale lock which another process replaced before it could be removed is kept
+            bucket._remove_lock_(b'0:0')
+            self.assertEqual(lock.read_bytes(), b'other')
+            self.assertEqual(sorted(p.name for p in Path(temp_dir).iterdir()), ['bucket', 'bucket.lock'])
+
+
+class RequestSchedulerTest(unittest.TestCase):
+
+    def test_priority(self):
+        scheduler = RequestScheduler(TokenBucket(20, capacity=1), bulk_reserve=0)
+        scheduler.acquire()
+        order = []
+
+        def request(priority):
+            scheduler.acquire(priority)
+            order.append(priority)
+
+        threads = [threading.Thread(target=request, args=(Priority.BULK,)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.01)
+        interactive = threading.Thread(target=request, args=(Priority.INTERACTIVE,))
+        interactive.start()
+        for thread in threads + [interactive]:
+            thread.join()
+
+        self.assertIn(Priority.INTERACTIVE, order[:2])
+        self.assertEqual(len(order), 4)
+
+    def test_small_bucket(self):
+        # A bucket holding a single token still serves bulk requests
+        scheduler = RequestScheduler(TokenBucket(1))
+        self.assertLess(scheduler.acquire(Priority.BULK), 0.1)
+        self.assertLess(scheduler.acquire(Priority.BULK), 1.1)
+
+        with self.assertRaises(ValueError):
+            RequestScheduler(TokenBucket(1), bulk_reserve=1)
+
+    def test_exporter(self):
+        from qsfdecode.surveyexporter import SurveyExporter
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _ThrottlingHandler)
+        server.refused = False
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            stats = Stats()
+            exporter = SurveyExporter('local', 'token', stats=stats, scheduler=RequestScheduler(TokenBucket(100)),
+                                      base_url=f'http://127.0.0.1:{server.server_port}/API/v3')
+            self.assertEqual(exporter.get_surveys(), {'SV_1': 'Survey'})
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(stats.counters['requests'], 2)
+        self.assertEqual(stats.counters['throttled'], 1)
+        self.assertEqual(stats.calls['queue_wait'], 2)
+        self.assertIn('get_surveys', stats.timings)
+
+
+if __name__ == '__main__':
+    unittest.main()
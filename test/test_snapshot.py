@@ -0,0 +1,81 @@
+import pickle
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+from qsfdecode.jsondecode import Survey, load_snapshot, load_survey, save_snapshot, translate_to_sps
+from qsfdecode.jsondecode import snapshot
+
+QSF_PATH = Path(__file__).parent / 'test_data' / 'test_data.qsf'
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._text = QSF_PATH.read_text(encoding='utf-8')
+        self._dir = tempfile.TemporaryDirectory()
+        self._path = Path(self._dir.name) / 'survey.snapshot'
+
+    def tearDown(self) -> None:
+        self._dir.cleanup()
+
+    def _sps_(self, survey, name):
+        path = Path(self._dir.name) / name
+        translate_to_sps(survey, path, include_declarations=True, lbl_include_question=True)
+        return path.read_text(encoding='utf-8')
+
+    def test_round_trip(self):
+        survey = Survey.from_json(self._text)
+        save_snapshot(survey, self._path, self._text)
+
+        # Loading a snapshot must not decode the QSF or parse question text
+        with mock.patch('qsfdecode.jsondecode.abc.html_text', side_effect=AssertionError), \
+                mock.patch.object(Survey, 'from_json', side_effect=AssertionError):
+            loaded = load_snapshot(self._path, self._text)
+            self.assertIsNotNone(loaded)
+            self.assertEqual(self._sps_(loaded, 'loaded.sps'), self._sps_(survey, 'decoded.sps'))
+
+        self.assertTrue(all(q.survey is loaded for q in loaded.exported_questions()))
+
+    def test_invalidation(self):
+        save_snapshot(Survey.from_json(self._text), self._path, self._text)
+        self.assertIsNone(load_snapshot(self._path, self._text + ' '))
+
+        with mock.patch.object(snapshot, 'SNAPSHOT_VERSION', snapshot.SNAPSHOT_VERSION + 1):
+            self.assertIsNone(load_snapshot(self._path, self._text))
+
+        self._path.write_bytes(b'not a snapshot' * 4)
+        with self.assertRaises(ValueError):
+            load_snapshot(self._path)
+
+    def test_load_survey(self):
+        survey = load_survey(self._text, self._path)
+        self.assertTrue(self._path.exists())
+
+        with mock.patch.object(Survey, 'from_json', side_effect=AssertionError):
+            reloaded = load_survey(self._text, self._path)
+        self.assertEqual([q['Payload']['QuestionID'] for q in reloaded.exported_questions()],
+                         [q['Payload']['QuestionID'] for q in survey.exported_questions()])
+
+
+class PickleTest(unittest.TestCase):
+
+    def test_questions(self):
+        survey = Survey.from_json(QSF_PATH.read_text(encoding='utf-8'))
+        questions = survey.exported_questions(metadata=True)
+        for q in questions:
+            q.variable_table()
+            q.translated('ES')
+
+        # Unpickling must not construct questions again or parse question text
+        with mock.patch('qsfdecode.jsondecode.abc.html_text', side_effect=AssertionError):
+            loaded = pickle.loads(pickle.dumps(questions, protocol=pickle.HIGHEST_PROTOCOL))
+
+        for original, q in zip(questions, loaded):
+            self.assertIs(type(q), type(original))
+            self.assertEqual(q, original)
+            self.assertIsNone(q.survey)
+            self.assertIsNone(q._translations)
+            self.assertEqual(q.variable_table().variables, original.variable_table().variables)
+            self.assertEqual(q.create_spss_code(include_declarations=True),
+                             original.create_spss_code(include_declarations=True))
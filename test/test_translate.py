@@ -0,0 +1,126 @@
+import json
+import pickle
+import tempfile
+import unittest
+from pathlib import Path
+from qsfdecode.exceptions import TranslationException
+from qsfdecode.instrumentation import Stats
+from qsfdecode.jsondecode import Survey, TranslationResult, translate_to_sps
+
+QSF_PATH = Path(__file__).parent / 'test_data' / 'test_data.qsf'
+
+
+def _broken_(**kwargs):
+    raise ValueError("broken question")
+
+
+class TranslateTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._text = QSF_PATH.read_text(encoding='utf-8')
+        self._dir = tempfile.TemporaryDirectory()
+        self._path = Path(self._dir.name) / 'out.sps'
+
+    def tearDown(self) -> None:
+        self._dir.cleanup()
+
+    def _branched_(self):
+        # Move QID30 onwards into a second block, shown only beneath a branch of the flow
+        data = json.loads(self._text)
+        elements = data['SurveyElements'] if 'SurveyElements' in data else data['result']['SurveyElements']
+        blocks = next(e for e in elements if e['Element'] == 'BL')['Payload']
+        flow = next(e for e in elements if e['Element'] == 'FL')['Payload']
+        default = next(b for b in (blocks.values() if isinstance(blocks, dict) else blocks) if b['Type'] == 'Default')
+        split = next(i for i, x in enumerate(default['BlockElements']) if x.get('QuestionID') == 'QID30')
+        block = {'Type': 'Standard', 'ID': 'BL_second', 'Description': 'Second',
+                 'BlockElements': default['BlockElements'][split:]}
+        default['BlockElements'] = default['BlockElements'][:split]
+        self._second = {x['QuestionID'] for x in block['BlockElements'] if x['Type'] == 'Question'}
+        if isinstance(blocks, dict):
+            blocks['99'] = block
+        else:
+            blocks.append(block)
+        flow['Flow'].append({'Type': 'Branch', 'FlowID': 'FL_3', 'Flow': [{'Type': 'Block', 'ID': 'BL_second',
+                                                                           'FlowID': 'FL_4'}]})
+        return json.dumps(data)
+
+    def _broken_survey_(self):
+        survey = Survey.from_json(self._text)
+        survey.get_question('QID26').create_spss_code = _broken_
+        return survey
+
+    def test_result(self):
+        result = translate_to_sps(self._text, self._path)
+        self.assertTrue(result.ok)
+        self.assertEqual(len(result.emitted), 39)
+        self.assertEqual(result.emitted[0], 'QID1')
+
+    def test_continue_on_error(self):
+        with self.assertLogs('exportclient'):
+            result = translate_to_sps(self._broken_survey_(), self._path)
+
+        self.assertFalse(result.ok)
+        self.assertEqual(len(result.emitted), 38)
+        self.assertEqual(result.failed_ids, ['QID26'])
+        self.assertEqual(result.failed[0].error_type, 'ValueError')
+        self.assertIn('broken question', result.failed[0].traceback)
+
+        combined = TranslationResult.combine([result, pickle.loads(pickle.dumps(result))])
+        self.assertEqual(combined.failed_ids, ['QID26', 'QID26'])
+
+    def test_fail_fast(self):
+        with self.assertRaises(TranslationException) as ctx:
+            translate_to_sps(self._broken_survey_(), self._path, fail_fast=True)
+
+        self.assertEqual(ctx.exception.result.failed_ids, ['QID26'])
+        self.assertIsInstance(ctx.exception.__cause__, ValueError)
+
+    def test_workers(self):
+        expected = Path(self._dir.name) / 'expected.sps'
+        translate_to_sps(self._text, expected, include_declarations=True)
+
+        stats = Stats()
+        result = translate_to_sps(self._text, self._path, include_declarations=True, stats=stats, workers=2,
+                                  chunk_size=7)
+        self.assertEqual(self._path.read_text(encoding='utf-8'), expected.read_text(encoding='utf-8'))
+        self.assertEqual(len(result.emitted), 39)
+        self.assertEqual(result.emitted[0], 'QID1')
+        self.assertEqual(stats.counters['questions_emitted'], 39)
+
+    def test_selection(self):
+        text = self._branched_()
+        tags = {q['Payload']['QuestionID']: q['Payload']['DataExportTag']
+                for q in Survey.from_json(text).exported_questions()}
+        second = [qid for qid in tags if qid in self._second]
+
+        stats = Stats()
+        result = translate_to_sps(text, self._path, branches=['FL_3'], stats=stats)
+        self.assertEqual(sorted(result.emitted + result.skipped), sorted(second))
+        # Only the selected questions are constructed
+        self.assertEqual(stats.counters['questions_decoded'], len(second))
+
+        result = translate_to_sps(text, self._path, blocks=['BL_second'], questions=['QID3?', 'TextEntry_*'])
+        expected = [qid for qid in second if qid[:4] == 'QID3' and len(qid) == 5 or tags[qid].startswith('TextEntry_')]
+        self.assertEqual(sorted(result.emitted + result.skipped), sorted(expected))
+        self.assertEqual(translate_to_sps(text, self._path, blocks=['BL_other']).emitted, [])
+        self.assertEqual(translate_to_sps(text, self._path, questions=[]).emitted, [])
+        self.assertEqual(Survey.from_json(text).exported_questions(questions=iter([])), [])
+
+    def test_declarations(self):
+        translate_to_sps(self._text, self._path, include_declarations=True)
+        text = self._path.read_text(encoding='utf-8')
+        # Widths are inferred from recode values, slider ranges and text entry validation
+        self.assertIn('NUMERIC SBS_RecAll.Statement1_Col1Label (F1.0).', text)
+        self.assertIn('NUMERIC Slider_1 (F3.0).', text)
+        self.assertIn('STRING TextEntry_CharRange (A40).', text)
+        self.assertIn('STRING TextEntry_ContentVal (A20).', text)
+        self.assertIn('STRING TextEntry_NoVal (A2000).', text)
+
+        responses = Path(self._dir.name) / 'responses.csv'
+        responses.write_text('TextEntry_NoVal,Slider_1\nText,Slider\nabcdef,12.5\n,\n', encoding='utf-8')
+        translate_to_sps(self._text, self._path, include_declarations=True, responses=responses)
+        text = self._path.read_text(encoding='utf-8')
+        self.assertIn('STRING TextEntry_NoVal (A6).', text)
+        self.assertIn('NUMERIC Slider_1 (F4.1).', text)
+        self.assertIn('STRING TextEntry_MaxLen (A2000).', text)
+